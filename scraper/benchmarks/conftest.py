@@ -0,0 +1,57 @@
+import pytest
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim.database import KolibriDB
+
+# with a fanout of 10, depth 3 to 6 gives channels of ~1k to ~1M nodes
+FANOUT = 10
+DEFAULT_DEPTHS = "3,4,5,6"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("kolibridb", "KolibriDB benchmarks")
+    group.addoption(
+        "--db-depths",
+        default=DEFAULT_DEPTHS,
+        help="Comma-separated depths of benchmarked channels (fanout is "
+        f"{FANOUT}, so depth 6 is ~1M nodes). Default: {DEFAULT_DEPTHS}",
+    )
+    group.addoption(
+        "--db-threads",
+        type=int,
+        default=4,
+        help="Number of threads for concurrent benchmarks. Default: 4",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "db_depth" in metafunc.fixturenames:
+        depths = [
+            int(depth) for depth in metafunc.config.getoption("db_depths").split(",")
+        ]
+        metafunc.parametrize(
+            "db_depth",
+            depths,
+            ids=[
+                f"{sum(FANOUT**level for level in range(depth + 1))}nodes"
+                for depth in depths
+            ],
+            scope="session",
+        )
+    if "nb_threads" in metafunc.fixturenames:
+        metafunc.parametrize(
+            "nb_threads",
+            sorted({1, metafunc.config.getoption("db_threads")}),
+            ids=lambda value: f"{value}threads",
+        )
+
+
+@pytest.fixture(scope="session")
+def kolibri_db(tmp_path_factory, db_depth):
+    channel = generate_channel(
+        tmp_path_factory.mktemp(f"channel-{db_depth}"),
+        depth=db_depth,
+        fanout=FANOUT,
+        with_files=False,
+    )
+    return KolibriDB(channel.db_path)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" end-to-end benchmark of kolibri2zim on a synthetic channel, offline
+
+    Generates a synthetic channel (see synthetic.py), serves it with a local HTTP
+    server acting as Studio (STUDIO_URL) and runs kolibri2zim on it in a
+    subprocess. Reports nodes/s, peak RSS, ZIM size and write rate as JSON, along
+    with main figures from scraper's --metrics-filename.
+
+    With --local, channel is read from disk (--content-dir) instead.
+
+    Requires kolibri2zim's web deps to be installed (as for any run). ZIM UI is
+    not needed: an empty folder is used unless --zimui-dist is passed.
+
+    python -m benchmarks.e2e --depth 3 --fanout 8 --threads 4 -- --dedup-html-files
+"""
+
+import argparse
+import functools
+import http.server
+import json
+import logging
+import os
+import pathlib
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import (
+    DEFAULT_KINDS,
+    SyntheticChannel,
+    generate_channel,
+    parse_kinds,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("benchmark")
+
+SRC_DIR = pathlib.Path(__file__).resolve().parent.parent / "src"
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):  # noqa: ARG002
+        return
+
+
+def histogram_sum(summary: dict, name: str) -> float:
+    """sum of name histograms in a --metrics-filename summary, whatever labels"""
+    return sum(
+        item["sum"] for item in summary.get("histograms", []) if item["name"] == name
+    )
+
+
+def serve(root: pathlib.Path) -> http.server.ThreadingHTTPServer:
+    """serve root on a random local port, from a daemon thread"""
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root))
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_scraper(
+    channel: SyntheticChannel,
+    workdir: pathlib.Path,
+    studio_url: str | None,
+    scraper_args: list[str],
+) -> dict:
+    """run kolibri2zim on channel, returning its measurements"""
+    output_dir = workdir / "output"
+    shutil.rmtree(output_dir, ignore_errors=True)
+    metrics_path = workdir / "metrics.json"
+    log_path = workdir / "scraper.log"
+    args = [
+        sys.executable,
+        "-m",
+        "kolibri2zim.entrypoint",
+        "--channel-id",
+        channel.channel_id,
+        "--name",
+        "benchmark",
+        "--output",
+        str(output_dir),
+        "--tmp-dir",
+        str(workdir / "tmp"),
+        "--metrics-filename",
+        str(metrics_path),
+        *scraper_args,
+    ]
+    if "--zimui-dist" not in scraper_args:
+        (workdir / "zimui").mkdir(exist_ok=True)
+        args += ["--zimui-dist", str(workdir / "zimui")]
+
+    if studio_url:
+        env = dict(os.environ, STUDIO_URL=studio_url)
+    else:
+        env = dict(os.environ)
+        args += ["--content-dir", str(channel.root)]
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(SRC_DIR), env.get("PYTHONPATH")])
+    )
+
+    logger.info(f"Running kolibri2zim on {channel.nb_nodes} nodes, logs in {log_path}")
+    started_on = time.perf_counter()
+    with open(log_path, "w") as log_fh:
+        process = subprocess.run(
+            args, env=env, stdout=log_fh, stderr=subprocess.STDOUT, check=False
+        )
+    duration = time.perf_counter() - started_on
+    # max RSS of the largest process amongst waited children, in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+    zim_size = sum(fpath.stat().st_size for fpath in output_dir.glob("*.zim"))
+    summary = json.loads(metrics_path.read_text()) if metrics_path.exists() else {}
+    return {
+        "returncode": process.returncode,
+        "nodes": channel.nb_nodes,
+        "files": channel.nb_files,
+        "source_bytes": channel.total_bytes,
+        "duration": duration,
+        "nodes_per_second": channel.nb_nodes / duration,
+        "peak_rss": peak_rss,
+        "zim_size": zim_size,
+        "zim_write_rate": zim_size / duration,
+        "creator_lock_wait": histogram_sum(summary, "creator_lock_wait_seconds"),
+        "db_queries": histogram_sum(summary, "db_query_seconds"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark kolibri2zim on a synthetic channel, offline",
+        epilog="Arguments after -- are passed to kolibri2zim",
+    )
+    parser.add_argument("--depth", type=int, default=3, help="Levels of topics")
+    parser.add_argument("--fanout", type=int, default=5, help="Children per topic")
+    parser.add_argument(
+        "--kinds",
+        type=parse_kinds,
+        default=DEFAULT_KINDS,
+        help="Leaves' kinds mix, as kind=weight pairs",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workdir",
+        type=pathlib.Path,
+        help="Folder for channel, ZIM and logs. Default: a temporary one, removed",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Read channel from disk (--content-dir) instead of over HTTP",
+    )
+    parser.add_argument("--report", type=pathlib.Path, help="Write JSON report there")
+    args, scraper_args = parser.parse_known_args()
+    scraper_args = [arg for arg in scraper_args if arg != "--"]
+
+    workdir = args.workdir or pathlib.Path(tempfile.mkdtemp(prefix="k2z-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    report = {"returncode": 1}
+    try:
+        logger.info(f"Generating channel in {workdir}")
+        channel = generate_channel(
+            workdir / "studio",
+            depth=args.depth,
+            fanout=args.fanout,
+            kinds=args.kinds,
+            seed=args.seed,
+        )
+        if args.local:
+            report = run_scraper(channel, workdir, None, scraper_args)
+        else:
+            server = serve(channel.root)
+            try:
+                report = run_scraper(
+                    channel,
+                    workdir,
+                    f"http://127.0.0.1:{server.server_address[1]}",
+                    scraper_args,
+                )
+            finally:
+                server.shutdown()
+    finally:
+        # temporary workdir is kept on failure, for scraper.log
+        if not args.workdir and report["returncode"] == 0:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.report:
+        args.report.write_text(output)
+    print(output)  # noqa: T201
+    sys.exit(report["returncode"])
+
+
+if __name__ == "__main__":
+    main()
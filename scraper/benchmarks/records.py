@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" memory and throughput of KolibriDB records compared to per-row dicts
+
+    Materializes all nodes and files of a synthetic channel (see synthetic.py)
+    both as dicts (as KolibriDB used to) and as its Node/File records, reporting
+    for each the time taken and the memory held by the records, as JSON.
+
+    Imports kolibri2zim: it must be installed (pip install -e .) or in PYTHONPATH.
+
+    PYTHONPATH=src python -m benchmarks.records --depth 5 --fanout 10
+"""
+
+import argparse
+import gc
+import json
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim.database import File, KolibriDB, Node
+
+# columns in records' fields order
+NODES_QUERY = (
+    "SELECT id, title, kind, description, lft, rght, "
+    "author, level, license_name, license_owner FROM content_contentnode"
+)
+FILES_QUERY = (
+    "SELECT id, local_file_id, extension, priority, "
+    "supplementary, checksum, lang_id, preset FROM content_file"
+)
+
+
+def as_dicts(db: KolibriDB, query: str) -> list[dict]:
+    return [dict(row) for row in db.get_rows(query)]
+
+
+def as_records(db: KolibriDB, query: str, record_type) -> list:
+    return list(db.get_rows(query, factory=record_type))
+
+
+def measure(func) -> dict:
+    """time to build all records with func, and their size"""
+    gc.collect()
+    started_on = time.perf_counter()
+    records = func()
+    duration = time.perf_counter() - started_on
+
+    # measured apart as tracing slows allocations down
+    del records
+    gc.collect()
+    tracemalloc.start()
+    records = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "records": len(records),
+        "seconds": duration,
+        "records_per_second": len(records) / duration,
+        "bytes": size,
+        "bytes_per_record": size / len(records),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare KolibriDB records to per-row dicts on a synthetic channel"
+    )
+    parser.add_argument("--depth", type=int, default=5, help="Levels of topics")
+    parser.add_argument("--fanout", type=int, default=10, help="Children per topic")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="k2z-records-") as workdir:
+        channel = generate_channel(
+            pathlib.Path(workdir),
+            depth=args.depth,
+            fanout=args.fanout,
+            with_files=False,
+        )
+        db = KolibriDB(channel.db_path)
+        report = {
+            "nodes": {
+                "dict": measure(lambda: as_dicts(db, NODES_QUERY)),
+                "record": measure(lambda: as_records(db, NODES_QUERY, Node)),
+            },
+            "files": {
+                "dict": measure(lambda: as_dicts(db, FILES_QUERY)),
+                "record": measure(lambda: as_records(db, FILES_QUERY, File)),
+            },
+        }
+    print(json.dumps(report, indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" generate synthetic Kolibri channels for benchmarks
+
+    Channels are a Studio-shaped SQLite DB (MPTT tree of content nodes with their
+    files) and optionally fake storage files, laid out like a Studio mirror (see
+    kolibri2zim-mirror):
+
+    {root}/content/databases/{channel_id}.sqlite3
+    {root}/content/storage/{a}/{b}/{abcd…}.{ext}
+
+    Topics are internal nodes: tree has `depth` levels of topics each with `fanout`
+    children. Leaves' kinds are drawn from `kinds` (a kind to weight mapping).
+    Exercises are not generated (they require perseus assessment items).
+
+    python -m benchmarks.synthetic --depth 3 --fanout 10 /tmp/channel """
+
+import argparse
+import base64
+import dataclasses
+import hashlib
+import io
+import pathlib
+import random
+import sqlite3
+import zipfile
+
+DEFAULT_KINDS = {"video": 4, "document": 2, "audio": 1, "html5": 1}
+
+SCHEMA = """
+CREATE TABLE content_channelmetadata (
+    id char(32) PRIMARY KEY, name varchar(200), description varchar(400),
+    author varchar(400), version integer, thumbnail text, last_updated datetime,
+    min_schema_version varchar(50), root_id char(32), lang_id varchar(14)
+);
+CREATE TABLE content_contentnode (
+    id char(32) PRIMARY KEY, parent_id char(32), channel_id char(32),
+    content_id char(32), title varchar(200), description text, author varchar(200),
+    kind varchar(200), available bool, sort_order real, license_name varchar(50),
+    license_owner varchar(200), lft integer, rght integer, tree_id integer,
+    level integer, lang_id varchar(14)
+);
+CREATE INDEX content_contentnode_parent_id ON content_contentnode (parent_id);
+CREATE INDEX content_contentnode_lft ON content_contentnode (lft);
+CREATE INDEX content_contentnode_rght ON content_contentnode (rght);
+CREATE INDEX content_contentnode_tree_id ON content_contentnode (tree_id);
+CREATE INDEX content_contentnode_level ON content_contentnode (level);
+CREATE TABLE content_localfile (
+    id varchar(32) PRIMARY KEY, extension varchar(40), available bool,
+    file_size integer
+);
+CREATE TABLE content_file (
+    id char(32) PRIMARY KEY, local_file_id varchar(32), contentnode_id char(32),
+    lang_id varchar(14), supplementary bool, thumbnail bool, priority integer,
+    preset varchar(150), available bool, checksum varchar(400),
+    extension varchar(40)
+);
+CREATE INDEX content_file_contentnode_id ON content_file (contentnode_id);
+CREATE INDEX content_file_local_file_id ON content_file (local_file_id);
+"""
+
+# (preset, extension, size in bytes) of files for each kind of leaf
+FILES_FOR_KIND = {
+    "video": [("high_res_video", "mp4", 2**18)],
+    "audio": [("audio", "mp3", 2**17)],
+    "document": [("document", "pdf", 2**17)],
+    "html5": [("html5_zip", "zip", 2**16)],
+}
+MAGIC_FOR_EXT = {
+    "mp4": b"\x00\x00\x00\x18ftypmp42",
+    "mp3": b"ID3",
+    "pdf": b"%PDF-1.4\n",
+}
+
+
+@dataclasses.dataclass
+class SyntheticChannel:
+    channel_id: str
+    root: pathlib.Path
+    nb_nodes: int
+    nb_files: int
+    total_bytes: int
+
+    @property
+    def db_path(self) -> pathlib.Path:
+        return self.root / "content" / "databases" / f"{self.channel_id}.sqlite3"
+
+    def storage_path(self, local_file_id: str, ext: str) -> pathlib.Path:
+        return (
+            self.root
+            / "content"
+            / "storage"
+            / local_file_id[0]
+            / local_file_id[1]
+            / f"{local_file_id}.{ext}"
+        )
+
+
+def png_bytes(rng: random.Random, width: int = 400, height: int = 225) -> bytes:
+    """PNG image with random pixels (needs Pillow)"""
+    from PIL import Image
+
+    image = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    data = io.BytesIO()
+    image.save(data, "PNG")
+    return data.getvalue()
+
+
+def html5_zip_bytes(rng: random.Random, size: int) -> bytes:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as ark:
+        ark.writestr("index.html", "<html><script src='app.js'></script></html>")
+        ark.writestr("app.js", "var data = '" + "x" * (size // 4) + "';")
+        ark.writestr("img/background.png", png_bytes(rng, 64, 64))
+        ark.writestr("media/sound.mp3", b"ID3" + rng.randbytes(size // 2))
+    return data.getvalue()
+
+
+def file_content(rng: random.Random, ext: str, size: int) -> bytes:
+    if ext == "png":
+        return png_bytes(rng)
+    if ext == "zip":
+        return html5_zip_bytes(rng, size)
+    magic = MAGIC_FOR_EXT.get(ext, b"")
+    return magic + rng.randbytes(size - len(magic))
+
+
+def generate_channel(
+    root: pathlib.Path,
+    depth: int = 3,
+    fanout: int = 5,
+    kinds: dict[str, int] | None = None,
+    seed: int = 0,
+    *,
+    with_files: bool = True,
+    with_thumbnails: bool = True,
+) -> SyntheticChannel:
+    """generate a channel of 1 + fanout + … + fanout**depth nodes in root
+
+    Without files, only the DB is written (files' size and checksums are still
+    recorded). Same seed gives same channel."""
+    rng = random.Random(seed)
+    kinds = kinds or DEFAULT_KINDS
+    kind_names, kind_weights = zip(*kinds.items(), strict=True)
+
+    def new_id() -> str:
+        return f"{rng.getrandbits(128):032x}"
+
+    channel = SyntheticChannel(
+        channel_id=new_id(), root=root, nb_nodes=0, nb_files=0, total_bytes=0
+    )
+    channel.db_path.parent.mkdir(parents=True, exist_ok=True)
+    channel.db_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(channel.db_path)
+    conn.executescript(SCHEMA)
+
+    nodes, files, localfiles = [], [], []
+
+    def add_file(node_id: str, preset: str, ext: str, size: int, *, thumbnail=False):
+        if with_files:
+            content = file_content(rng, ext, size)
+            local_file_id = hashlib.md5(content).hexdigest()  # nosec # noqa: S324
+            fpath = channel.storage_path(local_file_id, ext)
+            fpath.parent.mkdir(parents=True, exist_ok=True)
+            fpath.write_bytes(content)
+            size = len(content)
+        else:
+            local_file_id = new_id()
+        localfiles.append((local_file_id, ext, True, size))
+        files.append(
+            (
+                new_id(),
+                local_file_id,
+                node_id,
+                None,
+                False,
+                thumbnail,
+                1,
+                preset,
+                True,
+                local_file_id,
+                ext,
+            )
+        )
+        channel.nb_files += 1
+        channel.total_bytes += size
+
+    def add_node(parent_id: str | None, level: int, lft: int, index: int) -> int:
+        """add node and its descendants, returning node's rght"""
+        node_id = new_id()
+        kind = "topic" if level < depth else rng.choices(kind_names, kind_weights)[0]
+        rght = lft + 1
+        if kind == "topic":
+            for child_index in range(fanout):
+                rght = add_node(node_id, level + 1, rght, child_index) + 1
+        nodes.append(
+            (
+                node_id,
+                parent_id,
+                channel.channel_id,
+                new_id(),
+                f"{kind.title()} {level}.{index}",
+                f"Synthetic {kind} node",
+                "",
+                kind,
+                True,
+                index,
+                "CC BY",
+                "Synthetic",
+                lft,
+                rght,
+                1,
+                level,
+                None,
+            )
+        )
+        channel.nb_nodes += 1
+        for preset, ext, size in FILES_FOR_KIND.get(kind, []):
+            add_file(node_id, preset, ext, size)
+        if with_thumbnails and kind != "topic":
+            add_file(node_id, f"{kind}_thumbnail", "png", 2**15, thumbnail=True)
+        return rght
+
+    add_node(None, 0, 1, 0)
+    # root is the last node added (post-order)
+    root_id = nodes[-1][0]
+    conn.execute(
+        "INSERT INTO content_channelmetadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            channel.channel_id,
+            "Synthetic channel",
+            f"Synthetic channel of {channel.nb_nodes} nodes",
+            "kolibri2zim benchmarks",
+            1,
+            "data:image/png;base64,"
+            + base64.standard_b64encode(png_bytes(rng, 96, 96)).decode(),
+            "2024-01-01T00:00:00",
+            "1",
+            root_id,
+            "en",
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO content_contentnode "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        nodes,
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO content_localfile VALUES (?, ?, ?, ?)", localfiles
+    )
+    conn.executemany(
+        "INSERT INTO content_file VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", files
+    )
+    conn.commit()
+    conn.close()
+    return channel
+
+
+def parse_kinds(value: str) -> dict[str, int]:
+    """kinds mix from a video=4,document=2 string"""
+    kinds = {}
+    for item in value.split(","):
+        kind, weight = item.split("=", 1)
+        if kind not in FILES_FOR_KIND:
+            raise ValueError(f"Unsupported kind: {kind}")
+        kinds[kind.strip()] = int(weight)
+    return kinds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic channel")
+    parser.add_argument("root", type=pathlib.Path, help="Folder to generate into")
+    parser.add_argument("--depth", type=int, default=3, help="Levels of topics")
+    parser.add_argument("--fanout", type=int, default=5, help="Children per topic")
+    parser.add_argument(
+        "--kinds",
+        type=parse_kinds,
+        default=DEFAULT_KINDS,
+        help="Leaves' kinds mix, as kind=weight pairs. Default: "
+        + ",".join(f"{kind}={weight}" for kind, weight in DEFAULT_KINDS.items()),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db-only", action="store_true", help="Don't write storage files"
+    )
+    args = parser.parse_args()
+    channel = generate_channel(
+        args.root,
+        depth=args.depth,
+        fanout=args.fanout,
+        kinds=args.kinds,
+        seed=args.seed,
+        with_files=not args.db_only,
+    )
+    print(  # noqa: T201
+        f"Generated channel {channel.channel_id} in {channel.root}: "
+        f"{channel.nb_nodes} nodes, {channel.nb_files} files "
+        f"({channel.total_bytes / 2**20:.1f}MiB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
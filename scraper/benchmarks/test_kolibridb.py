@@ -0,0 +1,100 @@
+""" micro-benchmarks of KolibriDB queries on synthetic channels of 1k to 1M nodes
+
+    Requires pytest-benchmark (`pip install -e .[benchmark]`). Each round runs
+    the query for a batch of nodes, sequentially or from a pool of threads
+    sharing the DB connection (as the scraper's nodes workers do).
+
+    pytest benchmarks/ --db-depths 3,4 --db-threads 8 --benchmark-autosave
+    pytest-benchmark compare """
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+BATCH_SIZE = 100
+
+
+def sample(db, query, size=BATCH_SIZE):
+    """random sample of IDs returned by query"""
+    ids = [row["id"] for row in db.get_rows(query)]
+    return random.Random(0).sample(ids, min(size, len(ids)))
+
+
+@pytest.fixture(scope="session")
+def leaves_ids(kolibri_db):
+    return sample(
+        kolibri_db, "SELECT id FROM content_contentnode WHERE kind != 'topic'"
+    )
+
+
+@pytest.fixture(scope="session")
+def topics_ids(kolibri_db):
+    # topics right above leaves (with FANOUT children), whatever channel's size
+    return sample(
+        kolibri_db,
+        "SELECT id FROM content_contentnode "
+        "WHERE kind = 'topic' AND rght - lft < 30",
+    )
+
+
+@pytest.fixture
+def run_batch(nb_threads):
+    """function calling func for each of node_ids, from nb_threads threads"""
+    if nb_threads == 1:
+        yield lambda func, node_ids: [func(node_id) for node_id in node_ids]
+        return
+    with ThreadPoolExecutor(nb_threads) as executor:
+        yield lambda func, node_ids: list(executor.map(func, node_ids))
+
+
+def test_get_node(benchmark, kolibri_db, leaves_ids, run_batch):
+    benchmark(run_batch, kolibri_db.get_node, leaves_ids)
+
+
+def test_get_node_with_parents_and_children(
+    benchmark, kolibri_db, topics_ids, run_batch
+):
+    def get_node(node_id):
+        node = kolibri_db.get_node(node_id, with_parents=True, with_children=True)
+        node.parents = list(node.parents)
+        node.children = list(node.children)
+        return node
+
+    benchmark(run_batch, get_node, topics_ids)
+
+
+def test_get_node_children(benchmark, kolibri_db, topics_ids, run_batch):
+    benchmark(
+        run_batch,
+        lambda node_id: list(kolibri_db.get_node_children(node_id)),
+        topics_ids,
+    )
+
+
+def test_get_node_parents(benchmark, kolibri_db, leaves_ids, run_batch):
+    benchmark(
+        run_batch,
+        lambda node_id: list(kolibri_db.get_node_parents(node_id)),
+        leaves_ids,
+    )
+
+
+def test_get_node_descendants(benchmark, kolibri_db, topics_ids, run_batch):
+    benchmark(
+        run_batch,
+        lambda node_id: list(kolibri_db.get_node_descendants(node_id)),
+        topics_ids,
+    )
+
+
+def test_get_node_files(benchmark, kolibri_db, leaves_ids, run_batch):
+    benchmark(
+        run_batch,
+        lambda node_id: list(kolibri_db.get_node_files(node_id)),
+        leaves_ids,
+    )
+
+
+def test_get_thumbnail_name(benchmark, kolibri_db, leaves_ids, run_batch):
+    benchmark(run_batch, kolibri_db.get_thumbnail_name, leaves_ids)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" build ZIMs of several channels in one process, sharing costly resources
+
+    Config is a JSON file listing channels with their kolibri2zim options (long
+    names, without dashes). Options in defaults apply to all channels:
+
+    {
+        "defaults": {"output": "/output", "threads": 4},
+        "channels": [
+            {"channel-id": "xxx", "name": "channel_a"},
+            {"channel-id": "yyy", "name": "channel_b", "root-id": "zzz"}
+        ]
+    }
+
+    A true value is passed as a flag, false or null ones are omitted.
+
+    ZIMs share the optimization processes (and CPU budget), the optimization cache
+    client and the download limiter. With an optimization cache, a video used by
+    several channels is encoded once: other ZIMs add it from the cache once it's
+    there, their nodes not waiting for it.
+
+    Each ZIM has its own metrics (--metrics-filename…), aggregated for the batch
+    summary. Other content is not shared: each ZIM adds its own assets, zimui
+    files (both read from disk) and favicon (from its channel's thumbnail). """
+
+import argparse
+import concurrent.futures as cf
+import json
+import pathlib
+import sys
+import threading
+
+from kolibri2zim.cache import get_optimization_cache
+from kolibri2zim.constants import JS_DEPS, NAME, ROOT_DIR, logger
+from kolibri2zim.debug import download_limiter
+from kolibri2zim.entrypoint import parse_args
+from kolibri2zim.metrics import Metrics
+from kolibri2zim.pipeline import CPUBudget
+from kolibri2zim.scraper import Kolibri2Zim
+
+# options set once for the batch, overriding channels' ones
+BATCH_OPTIONS = ("processes", "cpu-budget", "optimization-cache")
+
+
+def channel_argv(defaults: dict, channel: dict) -> list[str]:
+    """kolibri2zim arguments for channel, merged over defaults"""
+    argv = []
+    for key, value in {**defaults, **channel}.items():
+        if key in BATCH_OPTIONS:
+            raise ValueError(f"{key} is set for the batch, not per channel")
+        if value is None or value is False:
+            continue
+        argv.append(f"--{key}")
+        if value is not True:
+            argv.append(str(value))
+    return argv
+
+
+def read_config(fpath: pathlib.Path) -> list[argparse.Namespace]:
+    """parsed kolibri2zim arguments of each channel in config"""
+    config = json.loads(fpath.read_text())
+    if not config.get("channels"):
+        raise ValueError(f"No channels in {fpath}")
+    return [
+        parse_args(channel_argv(config.get("defaults", {}), channel))
+        for channel in config["channels"]
+    ]
+
+
+class BatchResources:
+    """Resources shared by ZIMs built in the same process"""
+
+    def __init__(
+        self,
+        nb_processes: int,
+        cpu_budget: int | None = None,
+        s3_url_with_credentials: str | None = None,
+    ):
+        self.images_executor = cf.ProcessPoolExecutor(max_workers=nb_processes)
+        self.videos_executor = cf.ProcessPoolExecutor(max_workers=nb_processes)
+        self.cpu_budget = CPUBudget(
+            budget=cpu_budget or nb_processes, nb_slots=nb_processes
+        )
+        self.optimization_cache = None
+        if s3_url_with_credentials:
+            logger.info("testing Optimization Cache credentials")
+            self.optimization_cache = get_optimization_cache(s3_url_with_credentials)
+            if not self.optimization_cache.check():
+                raise ValueError(
+                    "Unable to connect to Optimization Cache. Check its URL."
+                )
+
+        # aggregate of ZIMs' metrics
+        self.metrics = Metrics()
+
+        # in-cache key of videos being produced to the ZIM producing it
+        self.videos: dict[str, cf.Future] = {}
+        self.videos_lock = threading.Lock()
+
+    def claim_video(self, cache_key: str) -> tuple[cf.Future, bool]:
+        """future resolved once video is in cache, and whether caller produces it
+
+        Owner must resolve the future, whatever the outcome: others then get the
+        video from cache or produce it themselves should it be missing"""
+        with self.videos_lock:
+            if cache_key in self.videos:
+                return self.videos[cache_key], False
+            future = self.videos[cache_key] = cf.Future()
+            return future, True
+
+    def shutdown(self):
+        self.images_executor.shutdown()
+        self.videos_executor.shutdown()
+
+
+def run_channel(args: argparse.Namespace, resources: BatchResources) -> int:
+    """return code of kolibri2zim for a channel (1 on failure)"""
+    try:
+        return Kolibri2Zim(**dict(args._get_kwargs()), resources=resources).run() or 0
+    except Exception as exc:
+        logger.error(f"FAILED {args.name}. An error occurred: {exc}")
+        if args.debug:
+            logger.exception(exc)
+        return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=f"{NAME}-batch",
+        description="Build ZIMs of several Kolibri channels in a single process, "
+        "sharing optimization processes and cache",
+    )
+    parser.add_argument(
+        "config", type=pathlib.Path, help="JSON file listing channels and options"
+    )
+    parser.add_argument(
+        "--parallel",
+        help="Number of ZIMs to build at once. Default: 1",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--processes",
+        help="Number of processes to optimize videos, thumbnails and documents, "
+        "shared by all ZIMs. Default: 1",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        help="Number of CPU threads to share among video compression processes. "
+        "Default: same as --processes",
+        type=int,
+    )
+    parser.add_argument(
+        "--optimization-cache",
+        help="URL with credentials to S3 (or local directory) for use as "
+        "optimization cache, shared by all ZIMs",
+        dest="s3_url_with_credentials",
+    )
+    parser.add_argument(
+        "--debug", help="Enable verbose output", action="store_true", default=False
+    )
+    args = parser.parse_args()
+    if args.debug:
+        for handler in logger.handlers:
+            handler.setLevel("DEBUG")
+
+    channels = read_config(args.config)
+    for channel_args in channels:
+        channel_args.s3_url_with_credentials = args.s3_url_with_credentials
+        channel_args.processes = args.processes
+        channel_args.cpu_budget = args.cpu_budget
+        channel_args.debug |= args.debug
+
+    for dep in JS_DEPS:
+        if not ROOT_DIR.joinpath("templates", "assets", dep).exists():
+            raise ValueError(
+                f"It looks like web deps have not been installed, {dep} is missing"
+            )
+
+    resources = BatchResources(
+        nb_processes=args.processes,
+        cpu_budget=args.cpu_budget,
+        s3_url_with_credentials=args.s3_url_with_credentials,
+    )
+    download_limiter.set_maximum(
+        min(args.parallel, len(channels))
+        * max(
+            channel_args.threads + channel_args.download_segments - 1
+            for channel_args in channels
+        )
+    )
+    logger.info(
+        f"Building {len(channels)} ZIMs, {args.parallel} at once, "
+        f"using {args.processes} processes"
+    )
+    try:
+        with cf.ThreadPoolExecutor(max_workers=args.parallel) as executor:
+            returncodes = list(
+                executor.map(
+                    lambda channel_args: run_channel(channel_args, resources), channels
+                )
+            )
+    finally:
+        resources.shutdown()
+
+    failed = [
+        channel_args.name
+        for channel_args, returncode in zip(channels, returncodes, strict=True)
+        if returncode
+    ]
+    logger.info(f"All ZIMs: {resources.metrics.describe()}")
+    if resources.cpu_budget.nb_encodes:
+        logger.info(f"Video encoders: {resources.cpu_budget.summary()}")
+    if failed:
+        logger.error(f"{len(failed)}/{len(channels)} ZIMs failed: {', '.join(failed)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import abc
+import json
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import threading
+import urllib.parse
+
+from kolibri2zim.constants import logger
+
+SIZE_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+# share of max_size local cache is reduced to once it exceeds it
+EVICTION_TARGET = 0.9
+
+
+def parse_size(value: str) -> int:
+    """bytes from a human size like 500M, 50G or 50GiB"""
+    match = re.fullmatch(r"\s*(\d+)\s*([KMGT]?)(?:i?B)?\s*", value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+
+
+def link_or_copy(src: pathlib.Path, dst: pathlib.Path):
+    """hard link src to dst if on same filesystem, copy otherwise"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class OptimizationCache(abc.ABC):
+    """Storage for optimized (re-encoded) files, reused across builds
+
+    Objects are stored under keys (see Kolibri2Zim.cache_key_for) along with
+    metadata (source checksum and encoder version) to check they are still valid."""
+
+    @abc.abstractmethod
+    def check(self) -> bool:
+        """whether cache is reachable with read and write permissions"""
+
+    @abc.abstractmethod
+    def has_object_matching(self, key: str, meta: dict[str, str]) -> bool:
+        """whether object exists with all of meta matching"""
+
+    @abc.abstractmethod
+    def download_file(self, key: str, fpath: pathlib.Path): ...
+
+    @abc.abstractmethod
+    def upload_file(self, fpath: pathlib.Path, key: str, meta: dict[str, str]): ...
+
+    def __str__(self):
+        return type(self).__name__
+
+
+class S3Cache(OptimizationCache):
+    """Cache on S3-compatible object storage, through KiwixStorage"""
+
+    def __init__(self, url_with_credentials: str):
+        # boto3 is slow to import: only loaded when an S3 cache is used
+        from kiwixstorage import KiwixStorage
+
+        self.storage = KiwixStorage(url_with_credentials)
+
+    def check(self) -> bool:
+        if not self.storage.check_credentials(
+            list_buckets=True, bucket=True, write=True, read=True, failsafe=True
+        ):
+            logger.error("S3 cache connection error testing permissions.")
+            logger.error(f"  Server: {self.storage.url.netloc}")
+            logger.error(f"  Bucket: {self.storage.bucket_name}")
+            logger.error(f"  Key ID: {self.storage.params.get('keyid')}")
+            from pif import get_public_ip
+
+            logger.error(f"  Public IP: {get_public_ip()}")
+            return False
+        return True
+
+    def has_object_matching(self, key: str, meta: dict[str, str]) -> bool:
+        return self.storage.has_object_matching(key, meta=meta)
+
+    def download_file(self, key: str, fpath: pathlib.Path):
+        self.storage.download_file(key, fpath)
+
+    def upload_file(self, fpath: pathlib.Path, key: str, meta: dict[str, str]):
+        self.storage.upload_file(fpath, key, meta=meta)
+
+    def __str__(self):
+        return f"{self.storage.url.netloc} with bucket: {self.storage.bucket_name}"
+
+
+class LocalCache(OptimizationCache):
+    """Cache in a local (or NFS) directory
+
+    Each object is stored at {root}/{key} with its metadata in a {key}.meta.json
+    sidecar, written last so its presence means object is complete. Sidecars' mtime
+    is updated on each hit and least recently used objects are evicted once
+    total size is above max_size (if set), down to EVICTION_TARGET of it.
+
+    Total size is tracked in memory as objects are uploaded: cache is only scanned
+    on first upload and when evicting (which also accounts for other writers)."""
+
+    meta_suffix = ".meta.json"
+
+    def __init__(self, root: pathlib.Path, max_size: int | None = None):
+        self.root = root.expanduser().resolve()
+        self.max_size = max_size
+        # total size of objects, None until first scan
+        self.total_size: int | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str) -> "LocalCache":
+        """cache from a file:///path/to/dir?max_size=50G URL"""
+        parsed = urllib.parse.urlparse(url)
+        params = urllib.parse.parse_qs(parsed.query)
+        max_size = params.get("max_size", [None])[0]
+        return cls(
+            root=pathlib.Path(urllib.parse.unquote(parsed.path)).expanduser(),
+            max_size=parse_size(max_size) if max_size else None,
+        )
+
+    def _path(self, key: str) -> pathlib.Path:
+        path = self.root.joinpath(key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid cache key: {key}")
+        return path
+
+    def _meta_path(self, key: str) -> pathlib.Path:
+        return self._path(key).with_name(self._path(key).name + self.meta_suffix)
+
+    def check(self) -> bool:
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.root) as fh:
+                fh.write(b"check")
+        except OSError as exc:
+            logger.error(f"Local cache at {self.root} is not writable: {exc}")
+            return False
+        return True
+
+    def has_object_matching(self, key: str, meta: dict[str, str]) -> bool:
+        meta_path = self._meta_path(key)
+        try:
+            stored = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return False
+        if any(
+            stored.get("meta", {}).get(name) != value for name, value in meta.items()
+        ):
+            return False
+        # record access for LRU eviction
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return self._path(key).exists()
+
+    def download_file(self, key: str, fpath: pathlib.Path):
+        fpath.unlink(missing_ok=True)
+        link_or_copy(self._path(key), fpath)
+
+    def upload_file(self, fpath: pathlib.Path, key: str, meta: dict[str, str]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._meta_path(key).unlink(missing_ok=True)
+        try:
+            replaced_size = path.stat().st_size
+        except OSError:
+            replaced_size = 0
+
+        # write to a temp name then rename so readers never see partial objects
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        link_or_copy(fpath, tmp_path)
+        tmp_path.replace(path)
+        self._meta_path(key).write_text(
+            json.dumps({"meta": meta, "size": path.stat().st_size})
+        )
+        if not self.max_size:
+            return
+        with self._lock:
+            if self.total_size is None:
+                self.total_size = sum(size for _, size, _, _ in self.scan())
+            else:
+                self.total_size += path.stat().st_size - replaced_size
+            if self.total_size > self.max_size:
+                self.evict()
+
+    def scan(self) -> list[tuple[float, int, pathlib.Path, pathlib.Path]]:
+        """(last access, size, sidecar path, path) of all objects in cache"""
+        entries = []
+        for meta_path in self.root.rglob(f"*{self.meta_suffix}"):
+            path = meta_path.with_name(meta_path.name[: -len(self.meta_suffix)])
+            try:
+                entries.append(
+                    (meta_path.stat().st_mtime, path.stat().st_size, meta_path, path)
+                )
+            except OSError:
+                continue
+        return entries
+
+    def evict(self):
+        """remove least recently used objects until total size is EVICTION_TARGET
+        of max_size ; to be called with lock held"""
+        if self.max_size is None:
+            return
+        entries = self.scan()
+        total = sum(size for _, size, _, _ in entries)
+        target = self.max_size * EVICTION_TARGET
+        for _, size, meta_path, path in sorted(entries):
+            if total <= target:
+                break
+            logger.debug(f"Evicting {path.relative_to(self.root)} from cache")
+            meta_path.unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            total -= size
+        self.total_size = total
+
+    def __str__(self):
+        max_size = f" (max {self.max_size} bytes)" if self.max_size else ""
+        return f"{self.root}{max_size}"
+
+
+def get_optimization_cache(url: str) -> OptimizationCache:
+    """cache backend for an --optimization-cache URL
+
+    file:// URLs (or plain paths) are local directories, S3 URLs otherwise"""
+    if url.startswith("file://"):
+        return LocalCache.from_url(url)
+    if "://" not in url:
+        return LocalCache(pathlib.Path(url).expanduser())
+    return S3Cache(url)
@@ -1,9 +1,15 @@
 #!/usr/bin/env python
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+import collections.abc
+import dataclasses
+import itertools
 import logging
 import pathlib
 import sqlite3
+import time
+
+from kolibri2zim.metrics import Metrics
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +21,50 @@ def dict_factory(cursor, row):
     return d
 
 
+@dataclasses.dataclass(slots=True)
+class Node:
+    """A content node, with the columns its query selected (others are None)
+
+    Queries select columns in fields' order, records being built from positional
+    rows. slug, parents and children are set by callers needing them"""
+
+    id: str
+    title: str | None = None
+    kind: str | None = None
+    description: str | None = None
+    left: int | None = None
+    right: int | None = None
+    author: str | None = None
+    level: int | None = None
+    license: str | None = None
+    license_owner: str | None = None
+    slug: str | None = None
+    parents: collections.abc.Iterable["Node"] | None = None
+    parents_count: int | None = None
+    children: collections.abc.Iterable["Node"] | None = None
+    children_count: int | None = None
+
+    def as_dict(self) -> dict:
+        """fields as a (shallow) dict, to be passed as templates' context"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+@dataclasses.dataclass(slots=True)
+class File:
+    """A node's file: fid is the file ID, id its local file ID (content's MD5)"""
+
+    fid: str
+    id: str
+    ext: str
+    prio: int
+    supp: int
+    checksum: str
+    lang: str | None
+    preset: str
+    # URL of file's viewer, set for documents
+    target: str | None = None
+
+
 class KolibriDB:
     """Shortcuts to common Kolibri-database queries
 
@@ -22,7 +72,14 @@ class KolibriDB:
     Kolibri uses the Modified Preorder Tree Traversal model, from django-mptt
     https://gist.github.com/tmilos/f2f999b5839e2d42d751"""
 
-    def __init__(self, fpath: pathlib.Path, root_id: str | None = None):
+    def __init__(
+        self,
+        fpath: pathlib.Path,
+        root_id: str | None = None,
+        metrics: Metrics | None = None,
+    ):
+        # time spent in queries is recorded into metrics (own registry if not set)
+        self.metrics = metrics or Metrics()
         self.conn = sqlite3.connect(
             f"file:{fpath.expanduser().resolve()}?mode=ro",
             uri=True,
@@ -48,33 +105,64 @@ class KolibriDB:
 
     @property
     def root_id(self):
-        return self.root["id"]
+        return self.root.id
 
     @property
     def root_left(self):
-        return self.root["left"]
+        return self.root.left
 
     @property
     def root_right(self):
-        return self.root["right"]
+        return self.root.right
 
     def get_conn(self):
         return self.conn
 
     def get_row(self, query, *args, **kwargs):
-        with self.get_conn() as conn:
+        with self.get_conn() as conn, self.metrics.timer("db_query_seconds"):
             return conn.execute(query, *args, **kwargs).fetchone()
 
     def get_cell(self, query, *args, **kwargs):
         return self.get_row(query, *args, **kwargs)[0]
 
-    def get_rows(self, query, *args, **kwargs):
-        with self.get_conn() as conn:
-            cursor = conn.execute(query, *args, **kwargs)
-            rows = cursor.fetchmany()
-            while rows:
-                yield from rows
+    def get_rows(self, query, *args, factory=None, **kwargs):
+        """rows of query, or records built by factory from each row's columns"""
+        # only time spent in SQLite is measured, not the one consuming rows
+        elapsed = 0.0
+        try:
+            with self.get_conn() as conn:
+                started_on = time.perf_counter()
+                cursor = conn.cursor()
+                if factory:
+                    # plain tuples, not to build a sqlite3.Row per record
+                    cursor.row_factory = None
+                cursor.execute(query, *args, **kwargs)
                 rows = cursor.fetchmany()
+                elapsed += time.perf_counter() - started_on
+                while rows:
+                    if factory:
+                        yield from itertools.starmap(factory, rows)
+                    else:
+                        yield from rows
+                    started_on = time.perf_counter()
+                    rows = cursor.fetchmany()
+                    elapsed += time.perf_counter() - started_on
+        finally:
+            self.metrics.observe("db_query_seconds", elapsed)
+
+    def get_channel_language(self):
+        """language code of the channel, inherited by nodes without one
+
+        From channel metadata, or root node on older DBs without it"""
+        try:
+            row = self.get_row("SELECT lang_id FROM content_channelmetadata")
+        except sqlite3.OperationalError:
+            row = None
+        if row and row[0]:
+            return row[0]
+        return self.get_cell(
+            "SELECT lang_id FROM content_contentnode WHERE id=?", (self.root.id,)
+        )
 
     def get_channel_metadata(self, channel_id):
         return self.get_row(
@@ -84,70 +172,81 @@ class KolibriDB:
     def get_node_descendants(self, node_id, left=None, right=None):
         if left is None or right is None:
             node = self.get_node(node_id, with_parents=False, with_children=False)
-            left = node["left"]
-            right = node["right"]
+            left = node.left
+            right = node.right
 
-        for row in self.get_rows(
+        yield from self.get_rows(
             "SELECT id, title, kind "
             "FROM content_contentnode WHERE lft > ? AND rght < ? "
             "ORDER BY level ASC",
             (left, right),
-        ):
-            yield dict(row)
+            factory=Node,
+        )
+
+    def get_selected_descendants(self, where, params):
+        """root's descendants matching where (SQL clause with params) by level
 
-    def get_node_children(self, node_id, left=None, right=None):
+        where must only hold placeholders, no values"""
+        yield from self.get_rows(
+            "SELECT id, title, kind "  # nosec # noqa: S608
+            "FROM content_contentnode WHERE lft > ? AND rght < ? "
+            f"AND ({where}) "
+            "ORDER BY level ASC",
+            (self.root_left, self.root_right, *params),
+            factory=Node,
+        )
+
+    def get_node_children(self, node_id, left=None, right=None, where="1", params=()):
+        """node's children matching where (SQL clause with params, see
+        get_selected_descendants)"""
         if left is None or right is None:
             node = self.get_node(node_id, with_parents=False, with_children=False)
-            left = node["left"]
-            right = node["right"]
+            left = node.left
+            right = node.right
 
-        for row in self.get_rows(
-            "SELECT id, title, description, kind, lft as left, rght as right "
+        yield from self.get_rows(
+            "SELECT id, title, kind, description, lft, rght "  # nosec # noqa: S608
             "FROM content_contentnode WHERE lft > ? AND rght < ? "
-            "AND parent_id=?"
+            f"AND parent_id=? AND ({where}) "
             "ORDER BY level ASC",
-            (left, right, node_id),
-        ):
-            rowdict = dict(row)
-            rowdict.update(
-                {
-                    "thumbnail": self.get_thumbnail_name(rowdict["id"]),
-                }
-            )
-            yield rowdict
+            (left, right, node_id, *params),
+            factory=Node,
+        )
 
-    def get_node_children_count(self, node_id, left=None, right=None):
+    def get_node_children_count(
+        self, node_id, left=None, right=None, where="1", params=()
+    ):
         if left is None or right is None:
             node = self.get_node(node_id, with_parents=False, with_children=False)
-            left = node["left"]
-            right = node["right"]
+            left = node.left
+            right = node.right
 
         return self.get_cell(
-            "SELECT COUNT(*) FROM content_contentnode WHERE lft > ? AND rght < ? "
-            "AND parent_id=?",
-            (left, right, node_id),
+            "SELECT COUNT(*) FROM content_contentnode "  # nosec # noqa: S608
+            f"WHERE lft > ? AND rght < ? AND parent_id=? AND ({where})",
+            (left, right, node_id, *params),
         )
 
     def get_node_parents(self, node_id, left=None, right=None):
         if left is None or right is None:
             node = self.get_node(node_id, with_parents=False, with_children=False)
-            left = node["left"]
-            right = node["right"]
+            left = node.left
+            right = node.right
 
-        for row in self.get_rows(
+        yield from self.get_rows(
             "SELECT id, title FROM content_contentnode "
             "WHERE lft < ? AND rght > ? "
             "AND lft >= ? AND rght <= ? "
             "ORDER BY Lft ASC",
             (left, right, self.root_left, self.root_right),
-        ):
-            yield dict(row)
+            factory=Node,
+        )
 
     def get_node_parents_count(self, node_id, left=None, right=None):
         if left is None or right is None:
             node = self.get_node(node_id, with_parents=False, with_children=False)
-            left = node["left"]
-            right = node["right"]
+            left = node.left
+            right = node.right
 
         return self.get_cell(
             "SELECT COUNT(*) FROM content_contentnode "
@@ -157,39 +256,34 @@ class KolibriDB:
             (left, right, self.root_left, self.root_right),
         )
 
-    def get_node(self, node_id, *, with_parents=False, with_children=False):
-        node = self.get_row(
-            "SELECT id, title, description, author, level, kind, "
-            "license_name as license, license_owner, "
-            "lft as left, rght as right "
-            "FROM content_contentnode WHERE id=?",
-            (node_id,),
+    def get_node(
+        self, node_id, *, with_parents=False, with_children=False, where="1", params=()
+    ):
+        """node with its parents and children (those matching where) if requested"""
+        node = next(
+            self.get_rows(
+                "SELECT id, title, kind, description, lft, rght, "
+                "author, level, license_name, license_owner "
+                "FROM content_contentnode WHERE id=?",
+                (node_id,),
+                factory=Node,
+            ),
+            None,
         )
         if not node:
-            return node
-        node = dict(node)
+            return None
         if with_parents:
-            node.update(
-                {
-                    "parents": self.get_node_parents(
-                        node_id, node["left"], node["right"]
-                    ),
-                    "parents_count": self.get_node_parents_count(
-                        node_id, node["left"], node["right"]
-                    ),
-                }
+            node.parents = self.get_node_parents(node_id, node.left, node.right)
+            node.parents_count = self.get_node_parents_count(
+                node_id, node.left, node.right
             )
 
         if with_children:
-            node.update(
-                {
-                    "children": self.get_node_children(
-                        node_id, node["left"], node["right"]
-                    ),
-                    "children_count": self.get_node_children_count(
-                        node_id, node["left"], node["right"]
-                    ),
-                }
+            node.children = self.get_node_children(
+                node_id, node.left, node.right, where, params
+            )
+            node.children_count = self.get_node_children_count(
+                node_id, node.left, node.right, where, params
             )
         return node
 
@@ -200,19 +294,70 @@ class KolibriDB:
             return None
 
     def get_node_files(self, node_id, *, thumbnail=False):
-        for row in self.get_rows(
-            "SELECT id as fid, local_file_id as id, "
-            "extension as ext, priority as prio, "
-            "supplementary as supp, checksum, lang_id as lang, preset "
+        yield from self.get_rows(
+            "SELECT id, local_file_id, extension, priority, "
+            "supplementary, checksum, lang_id, preset "
             "FROM content_file WHERE contentnode_id=? AND available=? AND thumbnail=? "
             "ORDER BY priority ASC",
             (node_id, 1, 1 if thumbnail else 0),
-        ):
-            yield dict(row)
+            factory=File,
+        )
+
+    def get_local_file_size(self, local_file_id):
+        """size in bytes of a local file as recorded in DB (None if unknown)"""
+        row = self.get_row(
+            "SELECT file_size FROM content_localfile WHERE id=?", (local_file_id,)
+        )
+        return row["file_size"] if row else None
+
+    def get_local_files_size(self):
+        """size in bytes of all local files as recorded in DB, per local file ID"""
+        return {
+            row["id"]: row["file_size"] or 0
+            for row in self.get_rows("SELECT id, file_size FROM content_localfile")
+        }
+
+    def get_nodes_files_size(self, where="1", params=()):
+        """total size in bytes of available files (incl. thumbnails) per node ID
+
+        Of root and its descendants matching where (SQL clause with params, see
+        get_selected_descendants)"""
+        return {
+            row["node_id"]: row["size"] or 0
+            for row in self.get_rows(
+                "SELECT f.contentnode_id as node_id, "  # nosec # noqa: S608
+                "SUM(l.file_size) as size "
+                "FROM content_file f "
+                "JOIN content_localfile l ON l.id = f.local_file_id "
+                "WHERE f.available=? AND f.contentnode_id IN ("
+                "SELECT id FROM content_contentnode WHERE id = ? "
+                f"OR (lft > ? AND rght < ? AND ({where}))) "
+                "GROUP BY f.contentnode_id",
+                (1, self.root.id, self.root_left, self.root_right, *params),
+            )
+        }
+
+    def get_kinds_and_extensions(self, where="1", params=()):
+        """(kind, extension) pairs of available files of root's descendants matching
+        where (SQL clause with params, see get_selected_descendants)
+
+        Nodes without files are listed with a None extension"""
+        return {
+            (row["kind"], row["ext"])
+            for row in self.get_rows(
+                "SELECT DISTINCT n.kind as kind, f.extension as ext "  # nosec # noqa: S608
+                "FROM (SELECT id, kind FROM content_contentnode "
+                f"WHERE lft > ? AND rght < ? AND ({where})) n "
+                "LEFT JOIN content_file f ON f.contentnode_id = n.id "
+                "AND f.available=? AND f.thumbnail=?",
+                (self.root_left, self.root_right, *params, 1, 0),
+            )
+        }
 
     def get_node_thumbnail(self, node_id):
         return self.get_node_file(node_id, thumbnail=True)
 
     def get_thumbnail_name(self, node_id):
+        """name of node's thumbnail in ZIM's thumbnails/ (converted to WebP)"""
         thumbnail = self.get_node_thumbnail(node_id)
-        return f"{thumbnail['id']}.{thumbnail['ext']}" if thumbnail else None
+        return f"{thumbnail.id}.webp" if thumbnail else None
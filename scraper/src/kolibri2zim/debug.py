@@ -1,28 +1,104 @@
+import concurrent.futures as cf
 import io
 import logging
+import math
 import pathlib
+from contextlib import contextmanager
 
 import requests
 from retrying import retry
-from zimscraperlib.download import _get_retry_adapter, stream_file
+from urllib3.util.retry import Retry
+from zimscraperlib.download import stream_file
 from zimscraperlib.video.encoding import reencode
 
+from kolibri2zim.metrics import Metrics
+from kolibri2zim.scheduler import (
+    TRANSIENT_STATUS_CODES,
+    AIMDLimiter,
+    TransientDownloadError,
+)
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger("DEBUG")
 
+# connections kept alive per host, for concurrent downloads
+HTTP_POOL_SIZE = 32
+
+# only retry connection establishment at HTTP level: other transient errors
+# are surfaced quickly so the caller can retry later without blocking a worker
 session = requests.Session()
-session.mount("http", _get_retry_adapter())
+session.mount(
+    "http",
+    requests.adapters.HTTPAdapter(
+        max_retries=Retry(
+            total=3, connect=3, read=0, status=0, redirect=False, backoff_factor=1
+        ),
+        pool_maxsize=HTTP_POOL_SIZE,
+    ),
+)
+
+# concurrent downloads, adjusted to 429/5xx rates (see AIMDLimiter)
+download_limiter = AIMDLimiter()
 
 ON_DISK_THRESHOLD = 2**20 * 20  # 20MiB
+SEGMENTED_DOWNLOAD_THRESHOLD = 2**20 * 512  # 512MiB
+SEGMENT_BLOCK_SIZE = 2**20  # 1MiB
+REQUEST_TIMEOUT = 60
+
+
+class RangeNotSupportedError(Exception):
+    """Server did not honor our Range request (or sent an unexpected total size)"""
+
+
+def get_retry_after(response: requests.Response | None) -> float | None:
+    """delay in seconds requested by server via Retry-After (if in seconds)"""
+    if response is None:
+        return None
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+@contextmanager
+def download_attempt(url: str):
+    """hold a download slot, reporting outcome to limiter
+
+    network errors and 429/5xx responses are raised as TransientDownloadError"""
+    with download_limiter.slot():
+        try:
+            yield
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as exc:
+            download_limiter.on_throttled()
+            raise TransientDownloadError(f"Network error for {url}: {exc}") from exc
+        except requests.HTTPError as exc:
+            if (
+                exc.response is not None
+                and exc.response.status_code in TRANSIENT_STATUS_CODES
+            ):
+                download_limiter.on_throttled()
+                raise TransientDownloadError(
+                    f"HTTP {exc.response.status_code} for {url}",
+                    retry_after=get_retry_after(exc.response),
+                ) from exc
+            raise
+    download_limiter.on_success()
+
+
+def is_transient(exc: BaseException) -> bool:
+    return isinstance(exc, TransientDownloadError)
 
 
-# retry up to 3 times, with delay from 40s
-@retry(stop_max_attempt_number=3, wait_exponential_multiplier=20000)
 def get_size_and_mime(url: str) -> tuple[int | None, str]:
     logger.debug(f"get_size_and_mime({url=})")
-    _, headers = stream_file(
-        url, byte_stream=io.BytesIO(), only_first_block=True
-    )  # type: ignore # see https://github.com/openzim/python-scraperlib/issues/104
+    with download_attempt(url):
+        _, headers = stream_file(
+            url, byte_stream=io.BytesIO(), only_first_block=True, session=session
+        )  # type: ignore # see https://github.com/openzim/python-scraperlib/issues/104
     mimetype = headers.get("Content-Type", "application/octet-stream")
     # Encoded data (compressed) prevents us from using Content-Length header
     # as source for the content (it represents length of compressed data)
@@ -38,15 +114,132 @@ def get_size_and_mime(url: str) -> tuple[int | None, str]:
     return None, mimetype  # couldn't retrieve size
 
 
-# retry up to 5 times, with delay from 40s to 10mn
-@retry(stop_max_attempt_number=5, wait_exponential_multiplier=20000)
 def download_to(
     url: str,
     fpath: pathlib.Path | None = None,
     byte_stream: io.BytesIO | None = None,
+    *,
+    metrics: Metrics,
 ):
+    """single download attempt ; raises TransientDownloadError on retryable failure
+
+    Nodes failing this way are rescheduled by the scraper. Time and bytes are
+    recorded into metrics"""
     logger.debug(f"download_to({url=}) {'to-file' if fpath else 'to-mem'}")
-    stream_file(url, fpath=fpath, byte_stream=byte_stream)
+    with download_attempt(url), metrics.timer("download_seconds"):
+        nb_bytes, _ = stream_file(
+            url, fpath=fpath, byte_stream=byte_stream, session=session
+        )
+    metrics.inc("download_bytes", nb_bytes)
+
+
+# for use outside of nodes processing, where blocking is acceptable
+# retry up to 5 times on transient errors, with delay from 40s to 10mn
+@retry(
+    stop_max_attempt_number=5,
+    wait_exponential_multiplier=20000,
+    retry_on_exception=is_transient,
+)
+def download_to_with_retries(
+    url: str,
+    fpath: pathlib.Path | None = None,
+    byte_stream: io.BytesIO | None = None,
+    *,
+    metrics: Metrics,
+):
+    download_to(url, fpath=fpath, byte_stream=byte_stream, metrics=metrics)
+
+
+# retry up to 5 times on transient errors, with delay from 2s to 32s
+@retry(
+    stop_max_attempt_number=5,
+    wait_exponential_multiplier=1000,
+    retry_on_exception=is_transient,
+)
+def download_segment(
+    url: str,
+    fpath: pathlib.Path,
+    start: int,
+    end: int,
+    size: int,
+    *,
+    metrics: Metrics,
+):
+    """download bytes start-end (inclusive) of url into preallocated fpath"""
+    logger.debug(f"download_segment({url=}, {start=}, {end=})")
+    written = 0
+    with download_attempt(url):
+        resp = session.get(
+            url,
+            headers={"Range": f"bytes={start}-{end}"},
+            stream=True,
+            timeout=REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        content_range = resp.headers.get("Content-Range", "")
+        if (
+            resp.status_code != requests.codes.partial_content
+            or not content_range.endswith(f"/{size}")
+        ):
+            resp.close()
+            raise RangeNotSupportedError(
+                f"Unexpected response for range request: {resp.status_code} "
+                f"{content_range=}"
+            )
+
+        with open(fpath, "r+b") as fh:
+            fh.seek(start)
+            for data in resp.iter_content(SEGMENT_BLOCK_SIZE):
+                fh.write(data)
+                written += len(data)
+    metrics.inc("download_bytes", written)
+    if written != end - start + 1:
+        raise TransientDownloadError(
+            f"Incomplete segment {start}-{end} of {url}: {written} bytes"
+        )
+
+
+def download_segmented(
+    url: str,
+    fpath: pathlib.Path,
+    size: int,
+    nb_segments: int,
+    *,
+    metrics: Metrics,
+):
+    """download url into fpath using nb_segments parallel Range requests
+
+    fpath is preallocated to size and each segment writes to its own slice.
+    Raises RangeNotSupportedError if server can't be used this way"""
+    logger.debug(f"download_segmented({url=}, {size=}, {nb_segments=})")
+    with open(fpath, "wb") as fh:
+        fh.truncate(size)
+
+    segment_size = math.ceil(size / nb_segments)
+    try:
+        with (
+            metrics.timer("download_seconds"),
+            cf.ThreadPoolExecutor(max_workers=nb_segments) as executor,
+        ):
+            futures = [
+                executor.submit(
+                    download_segment,
+                    url=url,
+                    fpath=fpath,
+                    start=start,
+                    end=min(start + segment_size, size) - 1,
+                    size=size,
+                    metrics=metrics,
+                )
+                for start in range(0, size, segment_size)
+            ]
+            for future in cf.as_completed(futures):
+                if future.exception():
+                    executor.shutdown(cancel_futures=True)
+                future.result()
+    except Exception:
+        fpath.unlink(missing_ok=True)
+        raise
 
 
 # retry up to three times on subprocess.CalledProcessError
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import functools
+import io
+import pathlib
+import shutil
+import subprocess
+import zipfile
+
+from PIL import Image
+from zimscraperlib.image.optimization import optimize_jpeg, optimize_png
+from zimscraperlib.image.presets import JpegMedium, PngMedium
+from zimscraperlib.image.transformation import resize_image
+
+
+class PdfDocument:
+    """PDF with images downsampled and recompressed
+
+    Uses Ghostscript's /ebook settings (150dpi images) if installed, falls back
+    to qpdf's lossless streams recompression otherwise. Output depends on the tool
+    so it's part of in-cache name and its version part of encoder version"""
+
+    VERSION = 1
+
+    ext = "pdf"
+    mimetype = "application/pdf"
+
+    def __init__(self, tool: str | None = None):
+        self.tool = tool or get_pdf_tool()
+
+    @property
+    def cache_name(self) -> str:
+        return f"pdfdocument_{self.tool}"
+
+    @property
+    def encoder_version(self) -> str:
+        return f"{self.VERSION}-{self.tool}-{get_tool_version(self.tool)}"
+
+
+class EpubDocument:
+    """EPUB with JPEG and PNG images downsized and recompressed"""
+
+    VERSION = 1
+
+    ext = "epub"
+    mimetype = "application/epub+zip"
+
+    max_image_width = 1600
+    images_options = {  # noqa: RUF012
+        "JPEG": (optimize_jpeg, JpegMedium.options),
+        "PNG": (optimize_png, PngMedium.options),
+    }
+
+
+# keyed by file extension
+DOCUMENTS_PRESETS = {"pdf": PdfDocument, "epub": EpubDocument}
+
+
+def get_pdf_tool() -> str | None:
+    """name of the installed tool to optimize PDFs with, if any"""
+    for tool in ("gs", "qpdf"):
+        if shutil.which(tool):
+            return tool
+    return None
+
+
+@functools.cache
+def get_tool_version(tool: str | None) -> str | None:
+    """version reported by a PDF tool, None if unavailable"""
+    if not tool:
+        return None
+    try:
+        output = subprocess.run(
+            [tool, "--version"], check=True, capture_output=True, text=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    # gs prints its version, qpdf a "qpdf version x.y.z" line then its license
+    lines = output.strip().splitlines()
+    return lines[0].split()[-1] if lines else None
+
+
+def keep_smaller(src: pathlib.Path, dst: pathlib.Path):
+    """overwrite dst with src if optimization didn't make it smaller"""
+    if dst.stat().st_size >= src.stat().st_size:
+        shutil.copyfile(src, dst)
+
+
+def optimize_pdf(src: pathlib.Path, dst: pathlib.Path, tool: str | None):
+    if tool == "gs":
+        args = [
+            "gs",
+            "-sDEVICE=pdfwrite",
+            "-dCompatibilityLevel=1.5",
+            "-dPDFSETTINGS=/ebook",
+            "-dNOPAUSE",
+            "-dBATCH",
+            "-dQUIET",
+            f"-sOutputFile={dst}",
+            str(src),
+        ]
+    elif tool == "qpdf":
+        args = [
+            "qpdf",
+            "--object-streams=generate",
+            "--compress-streams=y",
+            "--recompress-flate",
+            "--compression-level=9",
+            str(src),
+            str(dst),
+        ]
+    else:
+        raise OSError("Neither Ghostscript (gs) nor qpdf is installed")
+    subprocess.run(args, check=True, capture_output=True)
+    keep_smaller(src, dst)
+
+
+def optimize_epub_image(data: bytes, preset: EpubDocument) -> bytes:
+    """downsized and recompressed image data, in the same format
+
+    returns data unchanged if not a JPEG/PNG, invalid or not smaller once optimized
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            fmt, width = image.format, image.width
+        if fmt not in preset.images_options:
+            return data
+        optimizer, options = preset.images_options[fmt]
+
+        src = io.BytesIO(data)
+        if width > preset.max_image_width:
+            src = io.BytesIO()
+            resize_image(
+                io.BytesIO(data),
+                width=preset.max_image_width,
+                dst=src,
+                method="width",
+                allow_upscaling=False,
+            )
+            src.seek(0)
+        optimized = optimizer(src, **options).getvalue()  # pyright: ignore
+    except Exception:
+        return data
+    return optimized if len(optimized) < len(data) else data
+
+
+def optimize_epub(src: pathlib.Path, dst: pathlib.Path, preset: EpubDocument):
+    """rewrite EPUB with optimized images, keeping members order and compression
+
+    Images keep their names (and format) so the EPUB's references are unchanged"""
+    with zipfile.ZipFile(src) as src_ark, zipfile.ZipFile(dst, "w") as dst_ark:
+        for info in src_ark.infolist():
+            data = src_ark.read(info)
+            if not info.is_dir():
+                data = optimize_epub_image(data, preset)
+            dst_ark.writestr(info, data)
+    keep_smaller(src, dst)
+
+
+def optimize_document(src: pathlib.Path, dst: pathlib.Path, preset):
+    """optimize PDF or EPUB document at src into dst
+
+    Runs on the images processes pool"""
+    if isinstance(preset, PdfDocument):
+        optimize_pdf(src, dst, preset.tool)
+    elif isinstance(preset, EpubDocument):
+        optimize_epub(src, dst, preset)
+    else:
+        raise ValueError(f"Unsupported document preset: {type(preset).__name__}")
@@ -6,7 +6,6 @@ import os
 import sys
 
 from kolibri2zim.constants import NAME, SCRAPER, logger
-from kolibri2zim.scraper import Kolibri2Zim
 
 
 def parse_args(raw_args):
@@ -33,6 +32,26 @@ def parse_args(raw_args):
         help="Comma-separated list of node IDs to process ; root is always processed.",
     )
 
+    parser.add_argument(
+        "--subtree-ids",
+        help="Comma-separated list of node IDs to process along with their "
+        "descendants and ancestors. Combined with --node-ids",
+    )
+
+    parser.add_argument(
+        "--kinds",
+        help="Comma-separated list of node kinds to process (video, audio, "
+        "document, exercise, html5). Topics are only processed if they lead to "
+        "selected nodes",
+    )
+
+    parser.add_argument(
+        "--languages",
+        help="Comma-separated list of language codes of nodes to process, "
+        "as in Kolibri (en, fr, es-419…). Topics are only processed if they lead "
+        "to selected nodes",
+    )
+
     parser.add_argument(
         "--name",
         help="ZIM name. Used as identifier and filename (date will be appended)",
@@ -116,6 +135,15 @@ def parse_args(raw_args):
         default=False,
     )
 
+    parser.add_argument(
+        "--optimize-documents",
+        help="Downsample and recompress images in PDF (using Ghostscript or qpdf) "
+        "and EPUB documents. Slower but reduces size of scanned documents.",
+        dest="optimize_documents",
+        action="store_true",
+        default=False,
+    )
+
     parser.add_argument(
         "--autoplay",
         help="Enable autoplay on video articles. "
@@ -177,12 +205,40 @@ def parse_args(raw_args):
         type=int,
     )
 
+    parser.add_argument(
+        "--cpu-budget",
+        help="Number of CPU threads to share among video compression processes. "
+        "Each ffmpeg gets an equal share of it (per process). Lower "
+        "than --processes, fewer encodes run at once. "
+        "Default: same as --processes (one thread per process)",
+        type=int,
+    )
+
+    parser.add_argument(
+        "--download-segments",
+        help="Number of parallel HTTP Range requests to use when downloading "
+        "very large files (512MiB and above) to be re-encoded. "
+        "Increase on high-latency links. Default: 1 (single stream)",
+        default=1,
+        type=int,
+    )
+
     parser.add_argument(
         "--optimization-cache",
-        help="URL with credentials to S3 for use as optimization cache",
+        help="URL with credentials to S3 for use as optimization cache. "
+        "Can also be a local directory: file:///path/to/dir?max_size=50G "
+        "(least recently used files are removed above max_size, if set)",
         dest="s3_url_with_credentials",
     )
 
+    parser.add_argument(
+        "--content-dir",
+        help="Read channel database and files from this local folder (with Studio's "
+        "content/databases and content/storage layout, as made by kolibri2zim-mirror "
+        "or in a Kolibri home) instead of downloading them from Studio",
+        dest="content_dir",
+    )
+
     parser.add_argument(
         "--dedup-html-files",
         help="Deduplicates in-HTML5 App files by adding each only once and creating "
@@ -197,6 +253,45 @@ def parse_args(raw_args):
         "--debug", help="Enable verbose output", action="store_true", default=False
     )
 
+    parser.add_argument(
+        "--plan",
+        help="Only estimate build's cost from the channel database, without "
+        "downloading content: size per node kind, videos to re-encode, optimization "
+        "cache coverage, ZIM size, download volume and CPU time. Writes a JSON report "
+        "to output directory.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Profile nodes processing (per node kind) and videos pipeline threads "
+        "by sampling their stacks. Writes pstats files and a text report of top "
+        "functions to output directory.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--stats-filename",
+        help="Path to store progress JSON file to (done/total items, bytes and ETA)",
+        dest="stats_filename",
+    )
+
+    parser.add_argument(
+        "--metrics-filename",
+        help="Path to write a JSON summary of timing and throughput metrics to "
+        "(per-stage durations, downloads, DB queries, cache lookups…), at the end",
+        dest="metrics_filename",
+    )
+
+    parser.add_argument(
+        "--metrics-textfile",
+        help="Path to a Prometheus textfile (for node-exporter's textfile "
+        "collector) updated with metrics during the run",
+        dest="metrics_textfile",
+    )
+
     parser.add_argument(
         "--only-topics",
         help="Debug option to only handle topic nodes",
@@ -219,6 +314,10 @@ def main():
         for handler in logger.handlers:
             handler.setLevel("DEBUG")
 
+    # imported once arguments are valid: --help, --version and usage errors don't
+    # pay for the scraper's dependencies
+    from kolibri2zim.scraper import Kolibri2Zim
+
     try:
         scraper = Kolibri2Zim(**dict(args._get_kwargs()))
         sys.exit(scraper.run())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import io
+import pathlib
+
+from zimscraperlib.image.convertion import convert_image
+from zimscraperlib.image.presets import WebpMedium
+from zimscraperlib.image.transformation import resize_image
+
+
+class WebpThumbnail(WebpMedium):
+    """Medium quality WebP thumbnail fitting in zimui cards
+
+    Cards span a full column on mobile: thumbnails are downsized to fit in
+    width x height, preserving aspect ratio. Bump VERSION when changing any of
+    these so cached thumbnails are not reused."""
+
+    VERSION = 1
+
+    width = 540
+    height = 405
+
+
+def optimize_thumbnail(src: pathlib.Path, dst: pathlib.Path, preset: WebpThumbnail):
+    """resize src to fit in preset's box and save it as WebP to dst
+
+    Runs on the images processes pool"""
+    resized = io.BytesIO()
+    resize_image(
+        src,
+        width=preset.width,
+        height=preset.height,
+        dst=resized,
+        method="thumbnail",
+        allow_upscaling=False,
+    )
+    resized.seek(0)
+    convert_image(resized, dst, fmt="WEBP", **preset.options)  # pyright: ignore
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import bisect
+import json
+import math
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+
+from kolibri2zim.constants import NAME, logger
+
+# upper bounds (in seconds) of histograms' buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, 300, 1800)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """count, sum, min, max and buckets of observed values"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # one count per bucket, plus one for values above last bucket (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "mean": self.sum / self.count if self.count else None,
+        }
+
+
+def format_labels(labels: Labels, **extra: str) -> str:
+    """labels in Prometheus exposition format: {name="value",…}"""
+    items = [*labels, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms, keyed by name and labels
+
+    Each scraper has its own registry. Updates are also applied to parent, if any,
+    which aggregates registries of ZIMs built in the same process (batch).
+
+    Cheap enough to be updated from hot paths: each update takes a lock and
+    updates a few numbers."""
+
+    def __init__(self, parent: "Metrics | None" = None):
+        self.parent = parent
+        self.started_on = time.monotonic()
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if self.parent:
+            self.parent.inc(name, value, **labels)
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+        if self.parent:
+            self.parent.observe(name, value, **labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        """observe duration (in seconds) of the with-block into name histogram"""
+        started_on = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_on, **labels)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def get_histogram_sum(self, name: str) -> float:
+        """sum of name histograms' sums, whatever their labels"""
+        with self._lock:
+            return sum(
+                histogram.sum
+                for (hname, _), histogram in self.histograms.items()
+                if hname == name
+            )
+
+    def describe(self) -> str:
+        """main metrics, for logs"""
+        download_seconds = self.get_histogram_sum("download_seconds")
+        download_bytes = self.get_counter("download_bytes")
+        return (
+            f"Downloaded {download_bytes / 2**20:.0f}MiB"
+            + (
+                f" at {download_bytes / download_seconds / 2**20:.1f}MiB/s per stream"
+                if download_seconds
+                else ""
+            )
+            + f", waited {self.get_histogram_sum('creator_lock_wait_seconds'):.0f}s"
+            f" for creator lock, {self.get_histogram_sum('db_query_seconds'):.0f}s"
+            " in DB queries"
+        )
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "duration": time.monotonic() - self.started_on,
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.as_dict()}
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """metrics in Prometheus text exposition format, prefixed with scraper name"""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{NAME}_{name}_total{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulated = 0
+                for bound, count in zip(
+                    [*histogram.buckets, "+Inf"], histogram.counts, strict=True
+                ):
+                    cumulated += count
+                    lines.append(
+                        f"{NAME}_{name}_bucket"
+                        f"{format_labels(labels, le=str(bound))} {cumulated}"
+                    )
+                lines.append(
+                    f"{NAME}_{name}_sum{format_labels(labels)} {histogram.sum}"
+                )
+                lines.append(
+                    f"{NAME}_{name}_count{format_labels(labels)} {histogram.count}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, fpath: pathlib.Path):
+        fpath.write_text(json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, fpath: pathlib.Path):
+        """write textfile (for node-exporter's textfile collector) atomically"""
+        tmp_path = fpath.with_name(f".{fpath.name}.tmp")
+        tmp_path.write_text(self.to_prometheus())
+        tmp_path.replace(fpath)
+
+
+class TimedLock:
+    """threading.Lock recording time spent waiting for it in {name}_wait_seconds"""
+
+    def __init__(self, name: str, metrics: Metrics):
+        self.name = name
+        self.metrics = metrics
+        self._lock = threading.Lock()
+
+    def acquire(self, *args, **kwargs) -> bool:
+        started_on = time.perf_counter()
+        acquired = self._lock.acquire(*args, **kwargs)
+        self.metrics.observe(
+            f"{self.name}_wait_seconds", time.perf_counter() - started_on
+        )
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class MetricsWriter:
+    """Periodically writes metrics to a Prometheus textfile, from a daemon thread"""
+
+    def __init__(self, fpath: pathlib.Path, metrics: Metrics, interval: float = 15):
+        self.fpath = fpath
+        self.metrics = metrics
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            self.metrics.write_prometheus(self.fpath)
+        except OSError as exc:
+            logger.warning(f"Unable to write metrics to {self.fpath}: {exc}")
+
+    def stop(self):
+        """stop periodic writes, writing a last time"""
+        self._stopped.set()
+        self._thread.join()
+        self.write()
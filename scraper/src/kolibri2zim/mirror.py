@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" mirror channels' DB and files into a folder laid out as Kolibri Studio
+
+    Replaces dump_channel_to_fs.py (a wget per file, only skipping files of
+    matching size).
+
+    {root}/content/databases/{channel_id}.sqlite3
+    {root}/content/storage/{a}/{b}/{local_file_id}.{ext}
+    {root}/content/manifests/{channel_id}.json
+
+    kolibri2zim runs off this mirror either by reading it directly with
+    --content-dir (files are added to the ZIM from disk) or by serving root over
+    HTTP and setting STUDIO_URL to it, saving bandwidth and time on both ends
+    during development.
+
+    kolibri2zim-mirror --channel-id xxx --output build
+    kolibri2zim --channel-id xxx --content-dir build
+
+    caddy file-server -browse -listen 0.0.0.0:8888 -root build
+    STUDIO_URL=http://localhost:8888 kolibri2zim --channel-id xxx
+
+    Mirroring can be interrupted and run again: DB and files already in mirror
+    are reused (unless --force) and downloads go to a .part file which next run
+    resumes with a Range request. Files are only moved in place once verified
+    against their local file ID (MD5 of content) so files in mirror are trusted
+    on their size (--verify checks their MD5 again). Channels mirrored into the
+    same folder share files they have in common.
+
+    Manifest lists mirrored files (ID, extension, size and path relative to
+    root) and IDs of those which failed, with Studio URL and date. Exit code is
+    1 if any file failed: running again retries them. """
+
+import argparse
+import concurrent.futures as cf
+import datetime
+import hashlib
+import json
+import pathlib
+import sqlite3
+import sys
+
+import requests
+from retrying import retry
+
+from kolibri2zim.constants import NAME, SCRAPER, STUDIO_URL, logger
+from kolibri2zim.debug import (
+    REQUEST_TIMEOUT,
+    download_attempt,
+    download_limiter,
+    is_transient,
+    session,
+)
+from kolibri2zim.metrics import Metrics
+from kolibri2zim.storage import StudioStorage, database_relpath, storage_relpath
+
+NB_PARALLEL_DOWNLOADS = 15
+BLOCK_SIZE = 2**20  # 1MiB
+# log progress every so many files
+LOG_EVERY = 1000
+
+
+class ChecksumMismatchError(Exception):
+    """Downloaded file's MD5 doesn't match its local file ID"""
+
+
+def file_md5(fpath: pathlib.Path):
+    digest = hashlib.md5()  # nosec # noqa: S324
+    with open(fpath, "rb") as fh:
+        while data := fh.read(BLOCK_SIZE):
+            digest.update(data)
+    return digest
+
+
+# retry up to 5 times on transient errors, with delay from 4s to 1mn ; partial
+# file is kept between attempts so each resumes where previous one stopped
+@retry(
+    stop_max_attempt_number=5,
+    wait_exponential_multiplier=2000,
+    retry_on_exception=is_transient,
+)
+def download_resumable(
+    url: str, fpath: pathlib.Path, checksum: str, *, metrics: Metrics
+):
+    """download url to fpath through a .part file, resuming it if present
+
+    fpath only appears once complete and matching checksum (MD5 hex digest)"""
+    part_path = fpath.with_name(f"{fpath.name}.part")
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    digest = file_md5(part_path) if offset else hashlib.md5()  # nosec # noqa: S324
+    written = 0
+    with download_attempt(url), metrics.timer("download_seconds"):
+        resp = session.get(
+            url,
+            headers={"Range": f"bytes={offset}-"} if offset else {},
+            stream=True,
+            timeout=REQUEST_TIMEOUT,
+        )
+        # nothing left to download: part file is complete
+        if offset and resp.status_code == requests.codes.range_not_satisfiable:
+            resp.close()
+        else:
+            resp.raise_for_status()
+            if (
+                resp.status_code != requests.codes.partial_content
+                or not resp.headers.get("Content-Range", "").startswith(
+                    f"bytes {offset}-"
+                )
+            ):
+                # server sends whole file
+                offset = 0
+                digest = hashlib.md5()  # nosec # noqa: S324
+            with open(part_path, "ab" if offset else "wb") as fh:
+                for data in resp.iter_content(BLOCK_SIZE):
+                    fh.write(data)
+                    digest.update(data)
+                    written += len(data)
+    metrics.inc("download_bytes", written)
+
+    if digest.hexdigest() != checksum:
+        part_path.unlink()
+        raise ChecksumMismatchError(
+            f"{url} MD5 is {digest.hexdigest()}, expected {checksum}"
+        )
+    part_path.replace(fpath)
+
+
+def mirror_file(
+    root: pathlib.Path,
+    studio: StudioStorage,
+    local_file_id: str,
+    ext: str,
+    size: int | None,
+    *,
+    force: bool = False,
+    verify: bool = False,
+) -> bool:
+    """whether file had to be downloaded (False if already in mirror)
+
+    Files in mirror have been verified when added: they're only checked against
+    DB's size unless verify is set, in which case their MD5 is computed"""
+    fpath = root / storage_relpath(local_file_id, ext)
+    if fpath.exists() and not force:
+        if (size is None or fpath.stat().st_size == size) and (
+            not verify or file_md5(fpath).hexdigest() == local_file_id
+        ):
+            return False
+        logger.warning(f"{fpath.name} in mirror doesn't match, downloading again")
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+    fpath.unlink(missing_ok=True)
+    download_resumable(
+        studio.url_for(local_file_id, ext),
+        fpath,
+        local_file_id,
+        metrics=studio.metrics,
+    )
+    return True
+
+
+def mirror(
+    channel_id: str,
+    root: pathlib.Path,
+    nb_threads: int = NB_PARALLEL_DOWNLOADS,
+    *,
+    force: bool = False,
+    verify: bool = False,
+) -> bool:
+    """whether all files of channel could be mirrored into root
+
+    DB is reused if already in mirror, unless force is set"""
+    studio = StudioStorage(STUDIO_URL, metrics=Metrics())
+    db_path = root / database_relpath(channel_id)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    if db_path.exists() and not force:
+        logger.info(f"Reusing existing DB at {db_path}")
+    else:
+        logger.info("Downloading DB")
+        tmp_path = db_path.with_name(f"{db_path.name}.part")
+        studio.download_db(channel_id, tmp_path)
+        tmp_path.replace(db_path)
+
+    conn = sqlite3.connect(f"file:{db_path.resolve()}?mode=ro", uri=True)
+    try:
+        files = conn.execute(
+            "SELECT id, extension, file_size FROM content_localfile"
+        ).fetchall()
+    finally:
+        conn.close()
+    logger.info(f"Mirroring {len(files)} files using {nb_threads} threads")
+
+    download_limiter.set_maximum(nb_threads)
+    mirrored, failed = [], []
+    nb_downloaded = 0
+    with cf.ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        futures = {
+            executor.submit(
+                mirror_file,
+                root,
+                studio,
+                fid,
+                ext,
+                size,
+                force=force,
+                verify=verify,
+            ): (fid, ext, size)
+            for fid, ext, size in files
+        }
+        for index, future in enumerate(cf.as_completed(futures), start=1):
+            fid, ext, size = futures[future]
+            try:
+                nb_downloaded += future.result()
+            except Exception as exc:
+                logger.error(f"Failed to mirror {fid}.{ext}: {exc}")
+                failed.append(fid)
+            else:
+                mirrored.append(
+                    {
+                        "id": fid,
+                        "ext": ext,
+                        "size": size,
+                        "path": storage_relpath(fid, ext),
+                    }
+                )
+            if index % LOG_EVERY == 0:
+                logger.info(f"  {index}/{len(files)} files")
+
+    manifest_path = root / "content" / "manifests" / f"{channel_id}.json"
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(
+        json.dumps(
+            {
+                "channel_id": channel_id,
+                "studio_url": studio.url,
+                "generator": SCRAPER,
+                "date": datetime.datetime.now(tz=datetime.UTC).isoformat(),
+                "files": sorted(mirrored, key=lambda file: file["id"]),
+                "failed": sorted(failed),
+            },
+            indent=2,
+        )
+    )
+    logger.info(
+        f"Mirrored {len(mirrored)} files ({nb_downloaded} downloaded, "
+        f"{len(mirrored) - nb_downloaded} already present, "
+        f"{studio.metrics.get_counter('download_bytes') / 2**20:.0f}MiB), "
+        f"{len(failed)} failed. "
+        f"Manifest written to {manifest_path}"
+    )
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=f"{NAME}-mirror",
+        description="Mirror Kolibri channels' DB and files into a local folder "
+        "to run the scraper against (setting STUDIO_URL)",
+    )
+    parser.add_argument(
+        "--channel-id",
+        help="Kolibri channel ID to mirror. Can be repeated",
+        action="append",
+        required=True,
+        dest="channel_ids",
+    )
+    parser.add_argument(
+        "--output",
+        help="Mirror folder, shared by channels. Default: build",
+        default="build",
+        type=pathlib.Path,
+        dest="output_dir",
+    )
+    parser.add_argument(
+        "--threads",
+        help=f"Number of parallel downloads. Default: {NB_PARALLEL_DOWNLOADS}",
+        default=NB_PARALLEL_DOWNLOADS,
+        type=int,
+    )
+    parser.add_argument(
+        "--force",
+        help="Download DB and files again, even if already in mirror",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--verify",
+        help="Check MD5 of files already in mirror (instead of only their size)",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--debug", help="Enable verbose output", action="store_true", default=False
+    )
+    args = parser.parse_args()
+    if args.debug:
+        for handler in logger.handlers:
+            handler.setLevel("DEBUG")
+
+    succeeded = True
+    for channel_id in args.channel_ids:
+        logger.info(f"Mirroring {channel_id} into {args.output_dir}")
+        succeeded &= mirror(
+            channel_id,
+            args.output_dir,
+            args.threads,
+            force=args.force,
+            verify=args.verify,
+        )
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == "__main__":
+    main()
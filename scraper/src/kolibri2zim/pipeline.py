@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import concurrent.futures as cf
+import dataclasses
+import pathlib
+import queue
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from kolibri2zim.constants import logger
+from kolibri2zim.scheduler import (
+    RetryScheduler,
+    TransientDownloadError,
+    find_transient_error,
+)
+
+_STOP = object()
+
+
+@dataclasses.dataclass
+class CPUAllocation:
+    """CPU threads assigned to an encode by CPUBudget, to release() once done"""
+
+    threads: int
+    # for utilization accounting
+    acquired_on: float = dataclasses.field(default_factory=time.monotonic)
+
+
+class CPUBudget:
+    """Distributes a budget of CPU threads among concurrent ffmpeg encodes
+
+    acquire() blocks until one of the `nb_slots` encoders and at least one thread
+    of the budget are free, and assigns it the remaining threads shared with all
+    free slots. Encodes about to start (whose sources are still being fetched)
+    thus always find threads while slots are free, and the budget is never
+    exceeded. With a budget lower than nb_slots, at most `budget` single-threaded
+    encodes run."""
+
+    def __init__(self, budget: int, nb_slots: int):
+        self.budget = max(budget, 1)
+        self.nb_slots = max(nb_slots, 1)
+        self.threads_in_use = 0
+        self.nb_running = 0
+        self.nb_encodes = 0
+        self.busy_thread_seconds = 0.0
+        self.started_on = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self) -> CPUAllocation:
+        """block for a free slot and thread, returning allocation for release()"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.nb_running < self.nb_slots
+                and self.threads_in_use < self.budget
+            )
+            free_slots = self.nb_slots - self.nb_running
+            threads = max(1, (self.budget - self.threads_in_use) // free_slots)
+            self.threads_in_use += threads
+            self.nb_running += 1
+            return CPUAllocation(threads=threads)
+
+    def release(self, allocation: CPUAllocation):
+        with self._cond:
+            self.threads_in_use -= allocation.threads
+            self.nb_running -= 1
+            self.nb_encodes += 1
+            self.busy_thread_seconds += allocation.threads * (
+                time.monotonic() - allocation.acquired_on
+            )
+            self._cond.notify_all()
+
+    @property
+    def utilization(self) -> float:
+        """ratio of budget's thread-seconds used by encodes since creation"""
+        elapsed = time.monotonic() - self.started_on
+        if not elapsed:
+            return 0.0
+        return min(1.0, self.busy_thread_seconds / (self.budget * elapsed))
+
+    def summary(self) -> str:
+        return (
+            f"{self.nb_encodes} encodes using {self.utilization:.0%} of "
+            f"{self.budget} CPU threads budget over "
+            f"{time.monotonic() - self.started_on:.0f}s"
+        )
+
+
+@dataclasses.dataclass
+class VideoJob:
+    """A video to download, re-encode with preset and add to the ZIM at path"""
+
+    file_id: str  # the file ID in DB (version agnostic), used for cache key
+    local_file_id: str  # the local file ID (current version), used to download
+    ext: str
+    checksum: str
+    path: str
+    preset: Any
+    # whether output should be uploaded to optimization cache
+    upload_to_cache: bool = True
+    future: cf.Future = dataclasses.field(default_factory=cf.Future)
+    # fetch attempt, jobs failing on transient download errors are queued again
+    attempt: int = 1
+
+
+class VideoPipeline:
+    """Three-stage fetch → encode → add pipeline for videos to re-encode
+
+    - fetch: `nb_fetchers` threads download sources from the jobs queue
+    - encode: downloaded sources are handed to `encode` (the processes pool)
+    - add: a single thread adds encoded videos to the ZIM
+
+    At most `capacity` jobs are between start of fetch and end of add at any time,
+    capping disk usage in build_dir while keeping encoders fed. Jobs queue holds
+    at most `max_queued` jobs: submit() blocks when it is full.
+
+    Jobs whose fetch fails on a transient download error are queued again after a
+    delay (server's Retry-After or from `retry_base_delay` doubling each attempt),
+    up to `max_attempts` fetches: fetchers never sleep and keep feeding encoders
+    with other jobs meanwhile."""
+
+    def __init__(
+        self,
+        fetch: Callable[[VideoJob], tuple[pathlib.Path, pathlib.Path]],
+        encode: Callable[[VideoJob, pathlib.Path, pathlib.Path], cf.Future],
+        add: Callable[[VideoJob, pathlib.Path], None],
+        nb_fetchers: int,
+        capacity: int,
+        max_queued: int,
+        max_attempts: int = 1,
+        retry_base_delay: float = 20,
+    ):
+        self.fetch = fetch
+        self.encode = encode
+        self.add = add
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_scheduler = RetryScheduler()
+        self.jobs_queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self.add_queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self.slots = threading.BoundedSemaphore(capacity)
+
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+
+        self.fetchers = [
+            threading.Thread(
+                target=self._fetch_loop, name=f"video-fetch-{idx}", daemon=True
+            )
+            for idx in range(nb_fetchers)
+        ]
+        self.adder = threading.Thread(
+            target=self._add_loop, name="video-add", daemon=True
+        )
+        for thread in [*self.fetchers, self.adder]:
+            thread.start()
+
+    def submit(self, job: VideoJob) -> cf.Future:
+        """queue job for processing, returning its outcome future"""
+        with self._pending_cond:
+            self._pending += 1
+        self.jobs_queue.put(job)
+        return job.future
+
+    def shutdown(self):
+        """wait for all submitted jobs to complete and stop threads
+
+        Fetchers are only stopped once all jobs completed, as jobs awaiting a
+        retry are queued again meanwhile"""
+        with self._pending_cond:
+            self._pending_cond.wait_for(lambda: self._pending == 0)
+        self.retry_scheduler.shutdown()
+        for _ in self.fetchers:
+            self.jobs_queue.put(_STOP)
+        for thread in self.fetchers:
+            thread.join()
+        self.add_queue.put(_STOP)
+        self.adder.join()
+
+    def _job_done(self, job: VideoJob, exc: BaseException | None = None):
+        if exc is None:
+            job.future.set_result(None)
+        else:
+            job.future.set_exception(exc)
+        self.slots.release()
+        with self._pending_cond:
+            self._pending -= 1
+            self._pending_cond.notify_all()
+
+    def _fetch_loop(self):
+        while True:
+            job = self.jobs_queue.get()
+            if job is _STOP:
+                return
+            self.slots.acquire()
+            try:
+                src, dst = self.fetch(job)
+                encoding = self.encode(job, src, dst)
+            except Exception as exc:
+                transient = find_transient_error(exc)
+                if transient is not None and job.attempt < self.max_attempts:
+                    self.retry(job, transient)
+                    continue
+                logger.error(f"Error fetching video for {job.path}: {exc}")
+                self._job_done(job, exc)
+                continue
+            encoding.add_done_callback(
+                lambda future, job=job, dst=dst: self.add_queue.put((job, future, dst))
+            )
+
+    def retry(self, job: VideoJob, transient: TransientDownloadError):
+        """queue job again after a delay, freeing its slot meanwhile"""
+        delay = transient.retry_after or self.retry_base_delay * 2 ** (job.attempt - 1)
+        logger.warning(
+            f"Error fetching video for {job.path} ({transient}), retrying in "
+            f"{delay}s (attempt {job.attempt + 1}/{self.max_attempts})"
+        )
+        job.attempt += 1
+        self.slots.release()
+        self.retry_scheduler.schedule(delay, lambda job=job: self.jobs_queue.put(job))
+
+    def _add_loop(self):
+        while True:
+            item = self.add_queue.get()
+            if item is _STOP:
+                return
+            job, encoding, dst = item
+            try:
+                encoding.result()
+                logger.debug(f"Re-encoded {dst.name} successfuly")
+                self.add(job, dst)
+            except Exception as exc:
+                logger.error(f"Error re-encoding {dst.name}: {exc}")
+                logger.exception(exc)
+                self._job_done(job, exc)
+                continue
+            self._job_done(job)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import datetime
+import json
+import pathlib
+
+from kolibri2zim.constants import logger
+
+# rough output size to source size ratios of optimized files, per preset
+OUTPUT_RATIOS = {
+    "VideoWebmHigh": 0.6,
+    "VideoWebmLow": 0.3,
+    "VideoMp4Low": 0.35,
+    "WebpThumbnail": 0.1,
+    "PdfDocument": 0.7,
+    "EpubDocument": 0.8,
+}
+# rough CPU-seconds to optimize one MiB of source, per preset
+CPU_SECONDS_PER_MIB = {
+    "VideoWebmHigh": 12.0,
+    "VideoWebmLow": 8.0,
+    "VideoMp4Low": 4.0,
+    "WebpThumbnail": 0.5,
+    "PdfDocument": 2.0,
+    "EpubDocument": 1.0,
+}
+# generated entries (HTML pages, topics JSON…) per node
+NODE_OVERHEAD_BYTES = 4096
+
+
+class Plan:
+    """Estimated cost of a build, accumulated while walking the channel's tree
+
+    Files are either added as-is or optimized with a preset (re-encoded videos,
+    thumbnails, documents). Optimized files present in the optimization cache are
+    neither downloaded from Studio nor optimized again.
+
+    Sizes come from the DB. Optimized sizes and CPU costs use rough per-preset
+    averages: figures are orders of magnitude, not forecasts."""
+
+    def __init__(self):
+        # kind to nodes, files and source bytes
+        self.kinds: dict[str, dict[str, int]] = {}
+        # preset name to files, source bytes and cache hits
+        self.presets: dict[str, dict[str, int]] = {}
+        self.download_bytes = 0
+        self.cache_download_bytes = 0
+        self.output_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def _kind(self, kind: str) -> dict[str, int]:
+        return self.kinds.setdefault(kind, {"nodes": 0, "files": 0, "bytes": 0})
+
+    def add_node(self, kind: str):
+        self._kind(kind)["nodes"] += 1
+        self.output_bytes += NODE_OVERHEAD_BYTES
+
+    def add_file(self, kind: str, size: int):
+        """record a file added as-is to the ZIM"""
+        self._kind(kind)["files"] += 1
+        self._kind(kind)["bytes"] += size
+        self.download_bytes += size
+        self.output_bytes += size
+
+    def add_optimized_file(self, kind: str, size: int, preset: str, *, cached: bool):
+        """record a file optimized with preset, possibly found in cache"""
+        self._kind(kind)["files"] += 1
+        self._kind(kind)["bytes"] += size
+        stats = self.presets.setdefault(
+            preset, {"files": 0, "bytes": 0, "cached": 0, "cached_bytes": 0}
+        )
+        stats["files"] += 1
+        stats["bytes"] += size
+        output_size = int(size * OUTPUT_RATIOS.get(preset, 1))
+        self.output_bytes += output_size
+        if cached:
+            stats["cached"] += 1
+            stats["cached_bytes"] += size
+            self.cache_download_bytes += output_size
+        else:
+            self.download_bytes += size
+            self.cpu_seconds += size / 2**20 * CPU_SECONDS_PER_MIB.get(preset, 0)
+
+    @property
+    def cache_coverage(self) -> float | None:
+        """ratio of optimized files found in cache, None if there's none"""
+        nb_files = sum(stats["files"] for stats in self.presets.values())
+        if not nb_files:
+            return None
+        return sum(stats["cached"] for stats in self.presets.values()) / nb_files
+
+    def as_dict(self) -> dict:
+        return {
+            "nodes": sum(stats["nodes"] for stats in self.kinds.values()),
+            "kinds": self.kinds,
+            "optimizations": self.presets,
+            "cache_coverage": self.cache_coverage,
+            "download_bytes": self.download_bytes,
+            "cache_download_bytes": self.cache_download_bytes,
+            "zim_size": self.output_bytes,
+            "cpu_hours": self.cpu_seconds / 3600,
+        }
+
+    def log(self):
+        for kind, stats in sorted(self.kinds.items()):
+            logger.info(
+                f"  {kind}: {stats['nodes']} nodes, {stats['files']} files "
+                f"({stats['bytes'] / 2**20:.0f}MiB)"
+            )
+        for preset, stats in sorted(self.presets.items()):
+            logger.info(
+                f"  {preset}: {stats['files']} files to optimize "
+                f"({stats['bytes'] / 2**20:.0f}MiB), {stats['cached']} in cache"
+            )
+        logger.info(
+            f"Estimates: ZIM of {self.output_bytes / 2**30:.1f}GiB, "
+            f"{self.download_bytes / 2**30:.1f}GiB to download from Studio "
+            f"(+{self.cache_download_bytes / 2**30:.1f}GiB from cache), "
+            f"{datetime.timedelta(seconds=round(self.cpu_seconds))} of CPU time"
+        )
+
+    def write(self, fpath: pathlib.Path):
+        fpath.write_text(json.dumps(self.as_dict(), indent=2))
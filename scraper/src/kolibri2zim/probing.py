@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import dataclasses
+import json
+import pathlib
+import subprocess
+
+from kolibri2zim.constants import logger
+
+# encoders only target bitrates: accept sources slightly above preset's target
+BITRATE_TOLERANCE = 1.1
+
+
+@dataclasses.dataclass(frozen=True)
+class PresetConstraints:
+    """What a source video must comply with to be used in place of preset's output
+
+    bitrates are in bits/s"""
+
+    video_codecs: tuple[str, ...]
+    audio_codecs: tuple[str, ...]
+    max_width: int | None = None
+    max_video_bitrate: int | None = None
+    max_audio_bitrate: int | None = None
+    remux_args: tuple[str, ...] = ()
+
+
+# keyed by preset class name
+PRESETS_CONSTRAINTS: dict[str, PresetConstraints] = {
+    "VideoWebmLow": PresetConstraints(
+        video_codecs=("vp8",),
+        audio_codecs=("vorbis",),
+        max_width=480,
+        max_video_bitrate=128_000,
+        max_audio_bitrate=48_000,
+    ),
+    "VideoWebmHigh": PresetConstraints(
+        video_codecs=("vp8",),
+        audio_codecs=("vorbis",),
+    ),
+    "VideoMp4Low": PresetConstraints(
+        video_codecs=("h264",),
+        audio_codecs=("aac",),
+        max_width=480,
+        max_video_bitrate=300_000,
+        max_audio_bitrate=48_000,
+        remux_args=("-movflags", "+faststart"),
+    ),
+}
+
+
+def probe_media(fpath: pathlib.Path) -> dict:
+    """ffprobe's JSON output (streams and format) for fpath"""
+    ffprobe = subprocess.run(
+        [
+            "/usr/bin/env",
+            "ffprobe",
+            "-v",
+            "quiet",
+            "-print_format",
+            "json",
+            "-show_streams",
+            "-show_format",
+            f"file:{fpath}",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(ffprobe.stdout)
+
+
+def _bitrate(entry: dict) -> int | None:
+    try:
+        return int(entry["bit_rate"])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_compliance_issues(info: dict, constraints: PresetConstraints) -> list[str]:
+    """reasons why media described by ffprobe info doesn't meet constraints
+
+    empty list means media is compliant"""
+    streams = info.get("streams", [])
+    videos = [stream for stream in streams if stream.get("codec_type") == "video"]
+    audios = [stream for stream in streams if stream.get("codec_type") == "audio"]
+
+    if len(videos) != 1:
+        return [f"{len(videos)} video streams"]
+    if len(audios) > 1:
+        return [f"{len(audios)} audio streams"]
+    video = videos[0]
+    audio = audios[0] if audios else None
+
+    issues = []
+    if video.get("codec_name") not in constraints.video_codecs:
+        issues.append(f"video codec {video.get('codec_name')}")
+    if audio and audio.get("codec_name") not in constraints.audio_codecs:
+        issues.append(f"audio codec {audio.get('codec_name')}")
+    if constraints.max_width and (video.get("width") or 0) > constraints.max_width:
+        issues.append(f"width {video.get('width')}")
+
+    if constraints.max_video_bitrate:
+        max_audio_bitrate = constraints.max_audio_bitrate or 0
+        video_bitrate = _bitrate(video)
+        if video_bitrate is None:
+            # webm streams usually lack bitrate, check overall one instead
+            overall_bitrate = _bitrate(info.get("format", {}))
+            if overall_bitrate is None:
+                issues.append("unknown bitrate")
+            elif overall_bitrate > BITRATE_TOLERANCE * (
+                constraints.max_video_bitrate + (max_audio_bitrate if audio else 0)
+            ):
+                issues.append(f"overall bitrate {overall_bitrate}")
+        elif video_bitrate > BITRATE_TOLERANCE * constraints.max_video_bitrate:
+            issues.append(f"video bitrate {video_bitrate}")
+
+    if constraints.max_audio_bitrate and audio:
+        audio_bitrate = _bitrate(audio)
+        if (
+            audio_bitrate is not None
+            and audio_bitrate > BITRATE_TOLERANCE * constraints.max_audio_bitrate
+        ):
+            issues.append(f"audio bitrate {audio_bitrate}")
+
+    return issues
+
+
+def get_remux_args(preset) -> list[str]:
+    """ffmpeg args to copy streams of a source already meeting preset"""
+    constraints = PRESETS_CONSTRAINTS[type(preset).__name__]
+    return ["-codec", "copy", *constraints.remux_args]
+
+
+def source_meets_preset(fpath: pathlib.Path, preset) -> bool:
+    """whether video at fpath can be used (remuxed) instead of re-encoded with preset
+
+    Sources that can't be probed are considered not compliant"""
+    constraints = PRESETS_CONSTRAINTS.get(type(preset).__name__)
+    if not constraints:
+        return False
+    try:
+        info = probe_media(fpath)
+    except Exception as exc:
+        logger.warning(f"Unable to probe {fpath.name}, will re-encode: {exc}")
+        return False
+    issues = get_compliance_issues(info, constraints)
+    if issues:
+        logger.debug(
+            f"{fpath.name} needs re-encoding to {type(preset).__name__}: "
+            f"{', '.join(issues)}"
+        )
+    return not issues
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import io
+import pathlib
+import pstats
+import sys
+import threading
+from contextlib import contextmanager
+
+from kolibri2zim.constants import logger
+
+# pstats' function key: (filename, first line, name)
+FuncKey = tuple[str, int, str]
+
+
+def func_key(frame) -> FuncKey:
+    code = frame.f_code
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class CategorySamples:
+    """stack samples of a category, in pstats' format (loadable by pstats.Stats)
+
+    Calls counts are numbers of samples a function was on stack and times are
+    those counts multiplied by sampling interval."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # function to [samples on top of stack, samples on stack, {caller: samples}]
+        self.functions: dict[FuncKey, list] = {}
+        self.stats = {}
+
+    def add(self, stack: list[FuncKey]):
+        """record a sample of stack, innermost function first"""
+        seen = set()
+        for depth, func in enumerate(stack):
+            entry = self.functions.setdefault(func, [0, 0, {}])
+            if depth == 0:
+                entry[0] += 1
+            # recursive functions are only accounted once per sample
+            if func in seen:
+                continue
+            seen.add(func)
+            entry[1] += 1
+            if depth + 1 < len(stack):
+                callers = entry[2]
+                callers[stack[depth + 1]] = callers.get(stack[depth + 1], 0) + 1
+
+    def create_stats(self):
+        self.stats = {
+            func: (
+                nb_on_stack,
+                nb_on_stack,
+                nb_on_top * self.interval,
+                nb_on_stack * self.interval,
+                {
+                    caller: (nb, nb, 0.0, nb * self.interval)
+                    for caller, nb in callers.items()
+                },
+            )
+            for func, (nb_on_top, nb_on_stack, callers) in self.functions.items()
+        }
+
+
+class Profiler:
+    """Sampling profiler of threads' blocks, aggregated by category (node kind…)
+
+    Threads tag their blocks with a category using profile() while a sampler
+    thread, between start() and stop(), periodically records stacks of tagged
+    threads (from sys._current_frames()) under their category, up to the
+    function that entered the block. Nested profile() calls are accounted to the
+    outer one.
+
+    Unlike cProfile (interpreter-wide on Python 3.12, a single one can be active),
+    this attributes work to the thread doing it and has a fixed, low overhead."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        # thread ident to (category, frame which entered profile())
+        self._tags: dict[int, tuple[str, object]] = {}
+        self._samples: dict[str, CategorySamples] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @contextmanager
+    def profile(self, category: str):
+        ident = threading.get_ident()
+        if ident in self._tags:
+            yield
+            return
+
+        # 0: this generator, 1: contextmanager's __enter__, 2: block's function
+        self._tags[ident] = (category, sys._getframe(2))
+        try:
+            yield
+        finally:
+            del self._tags[ident]
+
+    def start(self):
+        """start sampling tagged threads"""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="profiler-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """record current stack of each tagged thread under its category"""
+        frames = sys._current_frames()
+        for ident, (category, entry_frame) in list(self._tags.items()):
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(func_key(frame))
+                if frame is entry_frame:
+                    break
+                frame = frame.f_back
+            if not stack:
+                continue
+            with self._lock:
+                if category not in self._samples:
+                    self._samples[category] = CategorySamples(self.interval)
+                self._samples[category].add(stack)
+
+    def get_stats(self, category: str | None = None) -> pstats.Stats | None:
+        """stats of all threads for category (all categories if None)"""
+        with self._lock:
+            samples = [
+                category_samples
+                for name, category_samples in self._samples.items()
+                if category is None or name == category
+            ]
+            if not samples:
+                return None
+            stats = pstats.Stats(samples[0])
+            for category_samples in samples[1:]:
+                stats.add(category_samples)
+        return stats
+
+    def dump(self, directory: pathlib.Path, prefix: str, top: int = 40):
+        """write pstats files per category and a text report of top functions
+
+        {prefix}_{category}.pstats can be loaded with pstats, snakeviz…"""
+        directory.mkdir(parents=True, exist_ok=True)
+        report = io.StringIO()
+        for category in ["all", *sorted(self._samples)]:
+            stats = self.get_stats(None if category == "all" else category)
+            if stats is None:
+                continue
+            stats.dump_stats(directory / f"{prefix}_{category}.pstats")
+            report.write(f"===== {category} =====\n")
+            stats.stream = report  # pyright: ignore[reportAttributeAccessIssue]
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        report_path = directory / f"{prefix}.txt"
+        report_path.write_text(report.getvalue())
+        logger.info(f"Profiling report written to {report_path}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import datetime
+import json
+import pathlib
+import threading
+import time
+
+from kolibri2zim.constants import logger
+
+
+class Progress:
+    """Tracks done/total work items and bytes, estimating time to completion
+
+    Items are nodes and videos to re-encode (whose total grows as nodes are
+    processed). Bytes are the sizes of items' source files, used for the ETA as
+    they better reflect work than the number of items.
+
+    Updates only increment counters under a lock: statistics are computed and
+    written (to `stats_path`, in openZIM's {"done": x, "total": y} format) and
+    logged from a reporter thread, every `interval` seconds."""
+
+    def __init__(
+        self,
+        stats_path: pathlib.Path | None = None,
+        interval: float = 10,
+        log_interval: float = 60,
+    ):
+        self.stats_path = stats_path
+        self.interval = interval
+        self.log_interval = log_interval
+        self.started_on = time.monotonic()
+        self.done = self.total = 0
+        self.done_bytes = self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, nb_bytes: int = 0):
+        """record an item to process"""
+        with self._lock:
+            self.total += 1
+            self.total_bytes += nb_bytes
+
+    def item_done(self, nb_bytes: int = 0):
+        """record an item as processed (successfully or not)"""
+        with self._lock:
+            self.done += 1
+            self.done_bytes += nb_bytes
+
+    @property
+    def eta(self) -> float | None:
+        """estimated seconds to completion, None until some progress is made"""
+        with self._lock:
+            if self.total_bytes and self.done_bytes:
+                ratio = self.done_bytes / self.total_bytes
+            elif self.total and self.done:
+                ratio = self.done / self.total
+            else:
+                return None
+        return (time.monotonic() - self.started_on) * (1 - ratio) / ratio
+
+    def stats(self) -> dict:
+        eta = self.eta
+        with self._lock:
+            return {
+                "done": self.done,
+                "total": self.total,
+                "done_bytes": self.done_bytes,
+                "total_bytes": self.total_bytes,
+                "eta": round(eta) if eta is not None else None,
+            }
+
+    def write(self):
+        if not self.stats_path:
+            return
+        tmp_path = self.stats_path.with_name(f".{self.stats_path.name}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(self.stats()))
+            tmp_path.replace(self.stats_path)
+        except OSError as exc:
+            logger.warning(f"Unable to write stats to {self.stats_path}: {exc}")
+
+    def log(self):
+        stats = self.stats()
+        percent = f" ({stats['done'] / stats['total']:.0%})" if stats["total"] else ""
+        eta = (
+            f", ETA {datetime.timedelta(seconds=stats['eta'])}"
+            if stats["eta"] is not None
+            else ""
+        )
+        logger.info(f"Progress: {stats['done']}/{stats['total']} items{percent}{eta}")
+
+    def start(self):
+        """start periodically writing stats file and logging progress"""
+        self._thread = threading.Thread(
+            target=self._run, name="progress-reporter", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        last_logged_on = time.monotonic()
+        while not self._stopped.wait(self.interval):
+            self.write()
+            if time.monotonic() - last_logged_on >= self.log_interval:
+                self.log()
+                last_logged_on = time.monotonic()
+
+    def stop(self):
+        """stop reporting, writing stats file a last time"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.write()
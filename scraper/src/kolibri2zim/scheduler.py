@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import heapq
+import itertools
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+from kolibri2zim.constants import logger
+
+# HTTP status codes for which a later attempt is expected to succeed
+TRANSIENT_STATUS_CODES = (408, 413, 429, 500, 502, 503, 504)
+
+
+class TransientDownloadError(Exception):
+    """A download failed for a reason that might go away (network, 429, 5xx)
+
+    retry_after is the server-requested delay (Retry-After header), if any"""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def find_transient_error(exc: BaseException | None) -> TransientDownloadError | None:
+    """TransientDownloadError at the origin of exc, if any
+
+    Only explicit chains (raise … from) are followed: an error raised while
+    handling a transient one (in cleanup code…) is not transient itself"""
+    while exc is not None:
+        if isinstance(exc, TransientDownloadError):
+            return exc
+        exc = exc.__cause__
+    return None
+
+
+class AIMDLimiter:
+    """Bounds concurrent downloads, adapting the bound to server health
+
+    Additive Increase / Multiplicative Decrease: limit grows by about one every
+    `limit` successful downloads and is halved on throttling/server errors
+    (at most once per `decrease_interval` so a burst of failures counts once)"""
+
+    def __init__(
+        self, maximum: int = 1, minimum: int = 1, decrease_interval: float = 1.0
+    ):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = float(self.maximum)
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self.nb_throttled = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def set_maximum(self, maximum: int):
+        """reset limiter to a new maximum concurrency"""
+        with self._cond:
+            self.maximum = max(maximum, self.minimum)
+            self.limit = float(self.maximum)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """block until a download slot is available and hold it"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            if self.limit < self.maximum:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                self._cond.notify_all()
+
+    def on_throttled(self):
+        with self._cond:
+            self.nb_throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.decrease_interval:
+                return
+            self._last_decrease = now
+            previous = int(self.limit)
+            self.limit = max(float(self.minimum), self.limit / 2)
+            if int(self.limit) != previous:
+                logger.warning(
+                    f"Server is struggling, reducing concurrent downloads "
+                    f"from {previous} to {int(self.limit)}"
+                )
+
+
+class RetryScheduler:
+    """Calls functions after a delay, from a single timer thread
+
+    Used to re-submit failed tasks to an executor later on without keeping
+    a worker busy sleeping in the meantime"""
+
+    def __init__(self):
+        self._queue: list[tuple[float, int, Callable[[], None]]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="retry-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._queue)
+
+    def schedule(self, delay: float, func: Callable[[], None]):
+        with self._cond:
+            heapq.heappush(
+                self._queue, (time.monotonic() + delay, next(self._counter), func)
+            )
+            self._cond.notify()
+
+    def shutdown(self):
+        """stop timer thread, dropping pending calls"""
+        with self._cond:
+            self._stopped = True
+            self._queue.clear()
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (
+                    not self._queue or self._queue[0][0] > time.monotonic()
+                ):
+                    self._cond.wait(
+                        self._queue[0][0] - time.monotonic() if self._queue else None
+                    )
+                if self._stopped:
+                    return
+                _, _, func = heapq.heappop(self._queue)
+            try:
+                func()
+            except Exception as exc:
+                logger.error(f"Scheduled retry failed to run: {exc}")
+                logger.exception(exc)
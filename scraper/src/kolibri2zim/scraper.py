@@ -3,6 +3,7 @@
 
 import base64
 import concurrent.futures as cf
+import contextlib
 import datetime
 import functools
 import hashlib
@@ -12,14 +13,11 @@ import os
 import shutil
 import tempfile
 import threading
+import time
 import zipfile
-from contextlib import contextmanager
 from pathlib import Path
 
 import jinja2
-from bs4 import BeautifulSoup
-from kiwixstorage import KiwixStorage
-from pif import get_public_ip
 from slugify import slugify
 from zimscraperlib.filesystem import get_file_mimetype
 from zimscraperlib.i18n import find_language_names
@@ -27,17 +25,33 @@ from zimscraperlib.image.convertion import convert_image, create_favicon
 from zimscraperlib.image.transformation import resize_image
 from zimscraperlib.inputs import compute_descriptions, handle_user_provided_file
 from zimscraperlib.video.presets import VideoMp4Low, VideoWebmHigh, VideoWebmLow
-from zimscraperlib.zim.creator import Creator
+from zimscraperlib.zim.creator import Creator, mimetype_for
 from zimscraperlib.zim.items import StaticItem
 
-from kolibri2zim.constants import JS_DEPS, ROOT_DIR, STUDIO_URL, logger
+from kolibri2zim.cache import get_optimization_cache
+from kolibri2zim.constants import JS_DEPS, ROOT_DIR, logger
 from kolibri2zim.database import KolibriDB
 from kolibri2zim.debug import (
     ON_DISK_THRESHOLD,
-    download_to,
-    get_size_and_mime,
+    SEGMENTED_DOWNLOAD_THRESHOLD,
+    RangeNotSupportedError,
+    download_limiter,
+    download_segmented,
     safer_reencode,
 )
+from kolibri2zim.documents import (
+    DOCUMENTS_PRESETS,
+    get_pdf_tool,
+    optimize_document,
+)
+from kolibri2zim.images import WebpThumbnail, optimize_thumbnail
+from kolibri2zim.metrics import Metrics, MetricsWriter, TimedLock
+from kolibri2zim.pipeline import CPUBudget, VideoJob, VideoPipeline
+from kolibri2zim.planning import Plan
+from kolibri2zim.probing import get_remux_args, source_meets_preset
+from kolibri2zim.profiling import Profiler
+from kolibri2zim.progress import Progress
+from kolibri2zim.scheduler import RetryScheduler, find_transient_error
 from kolibri2zim.schemas import (
     Channel,
     Topic,
@@ -45,6 +59,8 @@ from kolibri2zim.schemas import (
     TopicSection,
     TopicSubSection,
 )
+from kolibri2zim.selection import NodeSelection, split_list
+from kolibri2zim.storage import StudioStorage, get_content_storage
 
 options = [
     "debug",
@@ -73,26 +89,94 @@ options = [
     "css",
     "dedup_html_files",
     "node_ids",
+    "subtree_ids",
+    "kinds",
+    "languages",
+    "download_segments",
+    "cpu_budget",
+    "optimize_documents",
+    "metrics_filename",
+    "metrics_textfile",
+    "stats_filename",
+    "profile",
+    "plan",
+    "content_dir",
 ]
 NOSTREAM_FUNNEL_SIZE = 1024  # 2**20 * 2  # 2MiB
+# nodes (and video sources) failing on transient download errors are rescheduled
+# (not blocking a worker) up to NODE_MAX_ATTEMPTS times with delay from 20s to 2mn40s
+NODE_MAX_ATTEMPTS = 5
+NODE_RETRY_BASE_DELAY = 20
+# max number of videos awaiting download in the videos pipeline
+VIDEO_PIPELINE_QUEUE_SIZE = 64
+# signatures of already-compressed formats, not worth compressing again
+COMPRESSED_SIGNATURES = (
+    b"\x89PNG",  # PNG
+    b"\xff\xd8\xff",  # JPEG
+    b"GIF8",  # GIF
+    b"RIFF",  # WebP, WAV, AVI
+    b"wOFF",  # WOFF
+    b"wOF2",  # WOFF2
+    b"OggS",  # Ogg
+    b"ID3",  # MP3
+    b"\x1aE\xdf\xa3",  # WebM, MKV
+    b"PK\x03\x04",  # ZIP
+    b"\x1f\x8b",  # GZIP
+)
+COMPRESSIBLE_MIMETYPES = (
+    "application/javascript",
+    "application/json",
+    "application/wasm",
+    "application/xml",
+    "font/otf",
+    "font/ttf",
+    "image/bmp",
+)
+# assets/ entries only needed by nodes of a kind, per extension of their files (None
+# for any). Others (bootstrap, fonts) are always added
+NODES_ASSETS = {
+    ("video", None): ("videojs",),
+    ("audio", None): ("videojs",),
+    ("document", "pdf"): ("pdfjs", "document.js"),
+    ("document", "epub"): (
+        "epub.min.js",
+        "jszip.min.js",
+        "epub_embed.css",
+        "epub_embed.html",
+        "epub_embed.js",
+        "document.js",
+    ),
+    ("exercise", None): ("perseus", "perseus_exercise.js"),
+}
+# ogv.js plays WebM and Ogg where browser can't
+OGVJS_ASSETS = ("ogvjs", "videojs-ogvjs.js")
+OGVJS_EXTENSIONS = ("webm", "ogg", "ogv")
+OPTIONAL_ASSETS = {name for names in NODES_ASSETS.values() for name in names} | set(
+    OGVJS_ASSETS
+)
 
 
 def filename_for(file):
-    return f'{file["id"]}.{file["ext"]}'
-
-
-def get_kolibri_url_for(file_id: str, ext: str):
-    """download URL and filename for a file ID and extension"""
-    fname = f"{file_id}.{ext}"
-    remote_dirs = (file_id[0], file_id[1])
-    remote_path = f"{'/'.join(remote_dirs)}/{fname}"
-    return f"{STUDIO_URL}/content/storage/{remote_path}", fname
+    return f"{file.id}.{file.ext}"
 
 
 def read_from_zip(ark, member):
     return ark.open(member).read()
 
 
+def should_compress(mimetype: str, content: bytes) -> bool:
+    """whether content is worth compressing in the ZIM, from mimetype and magic
+
+    MP4 and other ISO media files are identified by an ftyp box at offset 4"""
+    if content.startswith(COMPRESSED_SIGNATURES) or content[4:8] == b"ftyp":
+        return False
+    return (
+        mimetype.startswith("text/")
+        or mimetype.endswith(("+xml", "+json"))
+        or mimetype in COMPRESSIBLE_MIMETYPES
+    )
+
+
 def wrap_failure_details(func):
     def wrapper(self, item):
         node_id = kind = None
@@ -107,6 +191,25 @@ def wrap_failure_details(func):
     return wrapper
 
 
+def encoder_version_for(preset) -> str:
+    """version of preset's output, checked against cached objects' one"""
+    return str(getattr(preset, "encoder_version", preset.VERSION))
+
+
+def profiled(category):
+    """profile decorated method calls under category, if profiling is enabled"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.profile(category):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 class Kolibri2Zim:
     def __init__(self, **kwargs):
         for option in options:
@@ -116,11 +219,20 @@ class Kolibri2Zim:
         def go(option):
             return kwargs.get(option)
 
+        # pools, cache and registries shared with other ZIMs (see batch.py)
+        self.resources = kwargs.get("resources")
+        # this ZIM's metrics, also aggregated into batch's ones
+        self.metrics = Metrics(
+            parent=self.resources.metrics if self.resources else None
+        )
+
         self.channel_id = go("channel_id")
         self.root_id = go("root_id")
 
         # video-encoding info
         self.use_webm = go("use_webm")
+        # whether video and audio pages load ogv.js (only added if needed)
+        self.with_ogvjs = True
         self.low_quality = go("low_quality")
         self.autoplay = go("autoplay")
 
@@ -155,19 +267,53 @@ class Kolibri2Zim:
         # performances options
         self.nb_threads = int(go("threads") or 1)
         self.nb_processes = int(go("processes") or 1)
+        self.nb_download_segments = int(go("download_segments") or 1)
+        # CPU threads shared by all ffmpeg processes (defaults to one per process)
+        self.cpu_budget_threads = int(go("cpu_budget") or self.nb_processes)
         self.s3_url_with_credentials = go("s3_url_with_credentials")
-        self.s3_storage = None
+        # channel DB and files, from Studio or a local folder
+        self.storage = get_content_storage(go("content_dir"), metrics=self.metrics)
+        self.optimization_cache = None
         self.dedup_html_files = go("dedup_html_files")
-        self.html_files_cache = []
+        self.optimize_documents = go("optimize_documents")
+        self.html_files_cache = set()
+        # (local_file_id, preset name) to future of video being added to ZIM
+        self.videos_registry: dict[tuple[str, str], cf.Future] = {}
+        self.videos_registry_lock = threading.Lock()
+        self.nb_videos_deduplicated = 0
+        # futures of videos awaiting another ZIM of the batch (see batch.py)
+        self.deferred_videos: set[cf.Future] = set()
+        # (local_file_id, ZIM path) to future of file being added to ZIM, then
+        # moved to files_added once added (not to keep a future per file)
+        self.files_registry: dict[tuple[str, str], cf.Future] = {}
+        self.files_added: set[tuple[str, str]] = set()
+        self.files_registry_lock = threading.Lock()
+        self.nb_files_coalesced = 0
 
         # debug/developer options
         self.keep_build_dir = go("keep_build_dir")
+        self.metrics_filename = go("metrics_filename")
+        self.metrics_textfile = go("metrics_textfile")
+        self.profiler = Profiler() if go("profile") else None
+        self.plan_only = go("plan")
+
+        # progress of nodes and videos, in items and source bytes
+        self.progress = Progress(
+            stats_path=(
+                Path(go("stats_filename")).expanduser()
+                if go("stats_filename")
+                else None
+            )
+        )
+        # node ID to size of its files, for progress
+        self.nodes_sizes: dict[str, int] = {}
         self.debug = go("debug")
         self.only_topics = go("only_topics")
-        self.node_ids = (
-            None
-            if go("node_ids") is None
-            else [t.strip() for t in go("node_ids").split(",")]  # pyright: ignore
+        self.selection = NodeSelection(
+            node_ids=split_list(go("node_ids")),
+            subtree_ids=split_list(go("subtree_ids")),
+            kinds=split_list(go("kinds")),
+            languages=split_list(go("languages")),
         )
 
         # jinja2 environment setup
@@ -182,9 +328,24 @@ class Kolibri2Zim:
     def templates_dir(self):
         return ROOT_DIR.joinpath("templates")
 
-    def add_local_files(self, root_path, folder):
-        """recursively add local files from {folder} starting at {path}"""
+    @functools.cached_property
+    def selection_clause(self) -> tuple[str, list]:
+        """SQL WHERE clause (and its parameters) of nodes selected in DB"""
+        return self.selection.compile(self.db)
+
+    def profile(self, category):
+        """context manager profiling its block under category if --profile is set"""
+        if self.profiler:
+            return self.profiler.profile(category)
+        return contextlib.nullcontext()
+
+    def add_local_files(self, root_path, folder, exclude=()):
+        """recursively add local files from {folder} starting at {path}
+
+        exclude: names of folder's files or sub-folders not to add"""
         for fpath in folder.iterdir():
+            if fpath.name in exclude:
+                continue
             path = "/".join([root_path, fpath.name])
             if fpath.is_file():
                 self.creator.add_item_for(
@@ -194,29 +355,95 @@ class Kolibri2Zim:
             else:
                 self.add_local_files(path, fpath)
 
+    def get_nodes_assets(self):
+        """optional assets/ entries (players, viewers) needed by nodes to process
+
+        Based on kinds and files of selected nodes"""
+        if self.only_topics:
+            return set()
+        assets = set()
+        for kind, ext in self.db.get_kinds_and_extensions(*self.selection_clause):
+            assets.update(NODES_ASSETS.get((kind, None), ()))
+            assets.update(NODES_ASSETS.get((kind, ext), ()))
+            if kind in ("video", "audio") and (
+                ext in OGVJS_EXTENSIONS or (kind == "video" and self.use_webm)
+            ):
+                assets.update(OGVJS_ASSETS)
+        return assets
+
     def populate_nodes_executor(self):
         """Loop on content nodes to create zim entries from kolibri DB"""
 
-        def schedule_node(item):
-            future = self.nodes_executor.submit(self.add_node, item=item)
+        for item in self.iter_nodes():
+            self.schedule_node(item)
+
+    def iter_nodes(self):
+        """(node_id, kind) tuples of nodes to process: root then selected descendants
+
+        Selection is done by SQLite: only selected nodes are read"""
+        yield (self.db.root.id, self.db.root.kind)
+
+        for node in self.db.get_selected_descendants(*self.selection_clause):
+            yield (node.id, node.kind)
+
+    def schedule_node(self, item, future=None, attempt=1):
+        """submit node processing to the nodes executor
+
+        future represents the node's outcome across all attempts: it is only
+        resolved once node succeeded or failed for good"""
+        if future is None:
+            future = cf.Future()
             self.nodes_futures.add(future)
+            self.progress.add(self.nodes_sizes.get(item[0], 0))
+            # bytes of videos node re-encodes are credited by them (see claim_video)
+            future.add_done_callback(
+                lambda _: self.progress.item_done(self.nodes_sizes.get(item[0], 0))
+            )
+        try:
+            task = self.nodes_executor.submit(self.add_node, item=item)
+        except RuntimeError as exc:
+            # executor has been shut down (retry came too late)
+            future.set_exception(exc)
+            return future
+        task.add_done_callback(
+            functools.partial(
+                self.node_attempt_completed, item=item, future=future, attempt=attempt
+            )
+        )
+        return future
 
-        # schedule root-id
-        schedule_node((self.db.root["id"], self.db.root["kind"]))
+    def node_attempt_completed(self, task, item, future, attempt):
+        """resolve node future or reschedule node on transient download error"""
+        exc = task.exception()
+        if exc is None:
+            future.set_result(task.result())
+            return
 
-        # fill queue with (node_id, kind) tuples for all root node's descendants
-        for node in self.db.get_node_descendants(self.root_id):
-            if self.node_ids is None or node["id"] in self.node_ids:
-                schedule_node((node["id"], node["kind"]))
+        transient = find_transient_error(exc)
+        if transient is None or attempt >= NODE_MAX_ATTEMPTS:
+            future.set_exception(exc)
+            return
+
+        delay = transient.retry_after or NODE_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+        logger.warning(
+            f"{exc} ({transient}), retrying in {delay}s "
+            f"(attempt {attempt + 1}/{NODE_MAX_ATTEMPTS})"
+        )
+        self.retry_scheduler.schedule(
+            delay,
+            functools.partial(
+                self.schedule_node, item=item, future=future, attempt=attempt + 1
+            ),
+        )
 
     def get_or_create_node_slug(self, node) -> str:
         """Compute a unique slug to be used as URL for a given node"""
-        if node["id"] in self.nodes_ids_to_slugs:
-            return self.nodes_ids_to_slugs[node["id"]]
-        if "title" in node:
-            slug = f"{slugify(node['title'])}-{node['id'][:4]}"
+        if node.id in self.nodes_ids_to_slugs:
+            return self.nodes_ids_to_slugs[node.id]
+        if node.title is not None:
+            slug = f"{slugify(node.title)}-{node.id[:4]}"
         else:
-            slug = node["id"]
+            slug = node.id
         if slug in self.nodes_ids_to_slugs.values():
             # detect extreme case where we have a conflict
             conflicting_node_id = {
@@ -224,28 +451,33 @@ class Kolibri2Zim:
             }[slug]
             logger.error(
                 f"Slug conflict detected between node {conflicting_node_id} and node"
-                f" {node['id']}, both have same slug {slug}"
+                f" {node.id}, both have same slug {slug}"
             )
             raise Exception("Slug conflict, cannot proceed any further")
-        self.nodes_ids_to_slugs[node["id"]] = slug
+        self.nodes_ids_to_slugs[node.id] = slug
         return slug
 
     def get_node_with_slugs(self, node_id, *, with_parents=False, with_children=False):
+        """node with slugs, its children limited to selected ones"""
         node = self.db.get_node(
-            node_id=node_id, with_parents=with_parents, with_children=with_children
+            node_id=node_id,
+            with_parents=with_parents,
+            with_children=with_children,
+            where=self.selection_clause[0],
+            params=self.selection_clause[1],
         )
 
-        node["slug"] = self.get_or_create_node_slug(node)
+        node.slug = self.get_or_create_node_slug(node)
         if with_parents:
             # transform generators into list so we can use them multiple times
-            node["parents"] = list(node["parents"])
-            for parent in node["parents"]:
-                parent["slug"] = self.get_or_create_node_slug(parent)
+            node.parents = list(node.parents)
+            for parent in node.parents:
+                parent.slug = self.get_or_create_node_slug(parent)
         if with_children:
             # transform generators into list so we can use them multiple times
-            node["children"] = list(node["children"])
-            for child in node["children"]:
-                child["slug"] = self.get_or_create_node_slug(child)
+            node.children = list(node.children)
+            for child in node.children:
+                child.slug = self.get_or_create_node_slug(child)
         return node
 
     def add_channel_json(self):
@@ -256,8 +488,8 @@ class Kolibri2Zim:
         with self.creator_lock:
             self.creator.add_item_for(
                 path="channel.json",
-                title=node["title"],
-                content=Channel(root_slug=node["slug"]).model_dump_json(
+                title=node.title,
+                content=Channel(root_slug=node.slug).model_dump_json(
                     by_alias=True, indent=2
                 ),
                 mimetype="application/json",
@@ -279,15 +511,73 @@ class Kolibri2Zim:
             # add thumbnail to zim if there's one for this node
             thumbnail = self.db.get_node_thumbnail(node_id)
             if thumbnail:
-                self.funnel_file(thumbnail["id"], thumbnail["ext"], "thumbnails/")
+                self.add_thumbnail(thumbnail)
             # fire the add_{kind}_node() method which will actually process it
-            handler(node_id)
+            with (
+                self.metrics.timer("node_seconds", kind=kind),
+                self.profile(f"add_{kind}_node"),
+            ):
+                handler(node_id)
+
+    def add_file_once(self, fid, path, adder, *args):
+        """add file fid at path by calling adder(*args), only once per build
+
+        Nodes often share files (thumbnails, subtitles…) and request them at the
+        same time: only the first request downloads and adds it while others wait
+        for its outcome (and share its failure). A failed file can be requested
+        again."""
+        key = (fid, path)
+        existing = future = None
+        with self.files_registry_lock:
+            if key in self.files_added or key in self.files_registry:
+                self.nb_files_coalesced += 1
+                existing = self.files_registry.get(key)
+            else:
+                future = self.files_registry[key] = cf.Future()
+        if future is None:
+            self.metrics.inc("files_coalesced")
+            logger.debug(f"{path} already requested by another node")
+            if existing:
+                existing.result()
+            return
+
+        try:
+            adder(*args)
+        except BaseException as exc:
+            with self.files_registry_lock:
+                del self.files_registry[key]
+            future.set_exception(exc)
+            raise
+        with self.files_registry_lock:
+            self.files_added.add(key)
+            del self.files_registry[key]
+        future.set_result(None)
 
     def funnel_file(self, fid, fext, path_prefix=""):
-        """directly add a Kolibri file to the ZIM using same name"""
+        """directly add a Kolibri file to the ZIM using same name, once per build"""
+        self.add_file_once(
+            fid,
+            f"{path_prefix}{fid}.{fext}",
+            self.add_funneled_file,
+            fid,
+            fext,
+            path_prefix,
+        )
+
+    def add_funneled_file(self, fid, fext, path_prefix):
+        fname = f"{fid}.{fext}"
+
+        # local files are read in place by libzim, when writing the ZIM
+        local_path = self.storage.get_local_path(fid, fext)
+        if local_path:
+            with self.creator_lock:
+                self.creator.add_item_for(
+                    path=path_prefix + fname, title="", fpath=local_path
+                )
+            logger.debug(f"Added {fname} from {self.storage}")
+            return
 
-        url, fname = get_kolibri_url_for(fid, fext)
-        size, mimetype = get_size_and_mime(url)
+        size, mimetype = self.storage.get_size_and_mime(fid, fext)
 
         item_kw = {
             "path": path_prefix + fname,
@@ -302,10 +592,10 @@ class Kolibri2Zim:
                     suffix=Path(fname).suffix, delete=False, dir=self.build_dir
                 ).name
             )
-            download_to(url, item_kw["fpath"])
+            self.storage.download_to(fid, fext, fpath=item_kw["fpath"])
         else:
             fileobj = io.BytesIO()
-            download_to(url, byte_stream=fileobj)
+            self.storage.download_to(fid, fext, byte_stream=fileobj)
             item_kw["content"] = fileobj.getvalue()
             del fileobj
 
@@ -313,69 +603,184 @@ class Kolibri2Zim:
             self.creator.add_item_for(**item_kw)
         logger.debug(f"Added {fname} from Studio")
 
+    def add_thumbnail(self, thumbnail):
+        """add a node's thumbnail to the ZIM, resized and converted to WebP"""
+        preset = WebpThumbnail()
+        self.add_optimized_file(
+            thumbnail,
+            f"thumbnails/{thumbnail.id}.{preset.ext}",
+            preset,
+            optimize_thumbnail,
+        )
+
+    def add_optimized_file(self, file, path, preset, optimizer):
+        """add a Kolibri file to the ZIM at path, optimized with preset, once per build
+
+        optimizer(src, dst, preset) runs on the images processes pool. Optimized
+        files are reused from/uploaded to the optimization cache. Those that can't
+        be optimized are added as-is, at the same path."""
+        self.add_file_once(
+            file.id, path, self.optimize_and_add_file, file, path, preset, optimizer
+        )
+
+    def optimize_and_add_file(self, file, path, preset, optimizer):
+        if self.funnel_from_cache(file.fid, path, file.checksum, preset):
+            return
+
+        fname = filename_for(file)
+        src, dst = (
+            Path(
+                tempfile.NamedTemporaryFile(
+                    suffix=suffix, delete=False, dir=self.build_dir
+                ).name
+            )
+            for suffix in (Path(fname).suffix, f".{preset.ext}")
+        )
+        try:
+            self.storage.download_to(file.id, file.ext, fpath=src)
+        except Exception:
+            src.unlink(missing_ok=True)
+            dst.unlink(missing_ok=True)
+            raise
+
+        try:
+            self.images_executor.submit(optimizer, src, dst, preset).result()
+        except Exception as exc:
+            logger.warning(f"Unable to optimize {fname}, adding as-is: {exc}")
+            dst.unlink(missing_ok=True)
+            with self.creator_lock:
+                self.creator.add_item_for(
+                    path=path,
+                    title="",
+                    fpath=src,
+                    mimetype=get_file_mimetype(src),
+                    is_front=False,
+                    delete_fpath=True,
+                )
+            return
+        src.unlink()
+
+        self.upload_to_cache(
+            self.cache_key_for(file.fid, preset),
+            dst,
+            checksum=file.checksum,
+            encoder_version=encoder_version_for(preset),
+        )
+        with self.creator_lock:
+            self.creator.add_item_for(
+                path=path,
+                title="",
+                fpath=dst,
+                mimetype=preset.mimetype,
+                is_front=False,
+                delete_fpath=True,
+            )
+        logger.debug(f"Added {path} optimized from {fname}")
+
     def download_to_disk(self, file_id, ext):
         """download a Kolibri file to the build-dir using its filename"""
-        url, fname = get_kolibri_url_for(file_id, ext)
+        fname = f"{file_id}.{ext}"
         fpath = self.build_dir / fname
-        download_to(url, fpath=fpath)
+
+        # large files are fetched using parallel Range requests, if requested
+        if self.nb_download_segments > 1 and isinstance(self.storage, StudioStorage):
+            size = self.db.get_local_file_size(file_id)
+            if size and size >= SEGMENTED_DOWNLOAD_THRESHOLD:
+                try:
+                    download_segmented(
+                        self.storage.url_for(file_id, ext),
+                        fpath,
+                        size,
+                        self.nb_download_segments,
+                        metrics=self.metrics,
+                    )
+                    return fpath
+                except RangeNotSupportedError as exc:
+                    logger.warning(
+                        f"Unable to download {fname} in segments, "
+                        f"falling back to single stream: {exc}"
+                    )
+
+        self.storage.download_to(file_id, ext, fpath=fpath)
         return fpath
 
-    def funnel_from_s3(self, file_id, path, checksum, preset):
-        """whether it could fetch and add the file from S3 cache
+    def funnel_from_cache(self, file_id, path, checksum, preset):
+        """whether it could fetch and add the file from optimization cache
 
         - checks if a cache is configured
         - checks if file is present
         - checks if file is valid (corresponds to same original file)
-        - downloads and add to zim
+        - downloads to build_dir and add to zim (file removed once added)
 
         returns True is all this succeeded, False otherwise"""
-        if not self.s3_storage:
+        if not self.optimization_cache:
             return False
 
-        key = self.s3_key_for(file_id, preset)
+        key = self.cache_key_for(file_id, preset)
 
-        # exit early if we don't have this object in bucket
-        if not self.s3_storage.has_object_matching(
-            key, meta={"checksum": checksum, "encoder_version": str(preset.VERSION)}
-        ):
+        # exit early if we don't have this object in cache
+        if not self.is_in_cache(file_id, checksum, preset):
+            self.metrics.inc(
+                "cache_lookups", preset=type(preset).__name__, result="miss"
+            )
             return False
+        self.metrics.inc("cache_lookups", preset=type(preset).__name__, result="hit")
 
-        # download file into memory
-        fileobj = io.BytesIO()
+        # download file to disk so memory usage doesn't grow with video size
+        fpath = Path(
+            tempfile.NamedTemporaryFile(
+                suffix=f".{preset.ext}", delete=False, dir=self.build_dir
+            ).name
+        )
         try:
-            self.s3_storage.download_fileobj(key, fileobj)
+            self.optimization_cache.download_file(key, fpath)
         except Exception as exc:
             logger.error(f"failed to download {key} from cache: {exc}")
             logger.exception(exc)
+            fpath.unlink(missing_ok=True)
             # make sure we fallback to re-encode
             return False
 
-        # add to zim
+        # add to zim, libzim streams it from disk and file is deleted once added
         with self.creator_lock:
-            kwargs = {
-                "path": path,
-                "fileobj": fileobj,
-                "mimetype": preset.mimetype,
-            }
-            self.creator.add_item(StaticItem(**kwargs))
-        logger.debug(f"Added {path} from S3::{key}")
+            self.creator.add_item_for(
+                path=path,
+                title="",
+                fpath=fpath,
+                mimetype=preset.mimetype,
+                is_front=False,
+                delete_fpath=True,
+            )
+        logger.debug(f"Added {path} from cache::{key}")
         return True
 
-    def s3_key_for(self, file_id, preset):
-        """compute in-bucket key for file"""
-        return f"{file_id[0]}/{file_id[1]}/{file_id}/{type(preset).__name__.lower()}"
+    def is_in_cache(self, file_id, checksum, preset):
+        """whether cache has file optimized with this version of preset"""
+        return self.optimization_cache.has_object_matching(
+            self.cache_key_for(file_id, preset),
+            meta={
+                "checksum": checksum,
+                "encoder_version": encoder_version_for(preset),
+            },
+        )
+
+    def cache_key_for(self, file_id, preset):
+        """compute in-cache key for file"""
+        name = getattr(preset, "cache_name", type(preset).__name__.lower())
+        return f"{file_id[0]}/{file_id[1]}/{file_id}/{name}"
 
-    def upload_to_s3(self, key, fpath, **meta):
+    def upload_to_cache(self, key, fpath, **meta):
         """whether it successfully uploaded to cache"""
-        if not self.s3_storage:
+        if not self.optimization_cache:
             return
 
-        logger.debug(f"Uploading {fpath.name} to S3::{key} with {meta}")
+        logger.debug(f"Uploading {fpath.name} to cache::{key} with {meta}")
         try:
-            self.s3_storage.upload_file(fpath, key, meta=meta)
+            self.optimization_cache.upload_file(fpath, key, meta=meta)
         except Exception as exc:
             logger.error(f"{key} failed to upload to cache: {exc}")
             return False
+        self.metrics.inc("cache_uploads")
         return True
 
     def add_topic_node(self, node_id):
@@ -390,50 +795,49 @@ class Kolibri2Zim:
 
         with self.creator_lock:
             self.creator.add_item_for(
-                path=f"topics/{node['slug']}.json",
-                title=node["title"],
+                path=f"topics/{node.slug}.json",
+                title=node.title,
                 content=Topic(
                     parents=[
                         TopicParent(
                             slug=self.get_or_create_node_slug(parent),
-                            title=parent["title"],
+                            title=parent.title,
                         )
-                        for parent in node["parents"]
+                        for parent in node.parents
                     ],
-                    title=node["title"],
-                    description=node["description"],
+                    title=node.title,
+                    description=node.description,
                     sections=[
                         TopicSection(
                             slug=self.get_or_create_node_slug(section),
-                            title=section["title"],
-                            description=section["description"],
-                            kind=section["kind"],
-                            thumbnail=self.db.get_thumbnail_name(section["id"]),
+                            title=section.title,
+                            description=section.description,
+                            kind=section.kind,
+                            thumbnail=self.db.get_thumbnail_name(section.id),
                             subsections=[
                                 TopicSubSection(
                                     slug=self.get_or_create_node_slug(subsection),
-                                    title=subsection["title"],
-                                    description=subsection["description"],
-                                    kind=subsection["kind"],
-                                    thumbnail=self.db.get_thumbnail_name(
-                                        subsection["id"]
-                                    ),
+                                    title=subsection.title,
+                                    description=subsection.description,
+                                    kind=subsection.kind,
+                                    thumbnail=self.db.get_thumbnail_name(subsection.id),
                                 )
                                 for subsection in self.db.get_node_children(
-                                    section["id"],
-                                    section["left"],
-                                    section["right"],
+                                    section.id,
+                                    section.left,
+                                    section.right,
+                                    *self.selection_clause,
                                 )
                             ],
                         )
-                        for section in node["children"]
+                        for section in node.children
                     ],
                     thumbnail=self.db.get_thumbnail_name(node_id),
                 ).model_dump_json(by_alias=True, indent=2),
                 mimetype="application/json",
                 is_front=False,
             )
-        logger.debug(f"Added topic #{node_id} - {node['slug']}")
+        logger.debug(f"Added topic #{node_id} - {node.slug}")
 
     def add_video_node(self, node_id):
         """Add content from this `video` node to zim
@@ -443,95 +847,39 @@ class Kolibri2Zim:
         subtitle files (`video_subtitle`) are VTT files and are only limited by the
         number of language to select from in kolibri studio"""
 
-        files = self.db.get_node_files(node_id, thumbnail=False)
-        if not files:
-            return
-        files = sorted(files, key=lambda f: f["prio"])
-        it = filter(lambda f: f["supp"] == 0, files)
+        files = sorted(
+            self.db.get_node_files(node_id, thumbnail=False), key=lambda f: f.prio
+        )
         try:
-            # find main video file
-            video_file = next(it)
+            video_file, preset = self.select_video(files)
         except StopIteration:
             # we have no video file
             return
 
-        try:
-            alt_video_file = next(it)
-        except StopIteration:
-            # we have no supplementary video file (which is OK)
-            alt_video_file = None
-
-        # now decide which file to keep and what to do with it
-
-        # content_file has a 1:1 rel with content_localfile which is thre
-        # *implementation* of the file. We use that local file ID (its checksum)
-        # everywhere BUT as S3 cache ID as we want to overwrite the same key
-        # should a new version of the localfile for the same file arrives.
-        vid = video_file["id"]  # the local file ID (current version)
-        vfid = video_file["fid"]  # the file ID in DB (version agnostic)
-        vchk = video_file["checksum"]
-
-        # we'll reencode, using the best file with appropriate preset
-        if self.use_webm:
-            preset = VideoWebmLow() if self.low_quality else VideoWebmHigh()
+        if preset:
             src_fname = Path(filename_for(video_file))
             path = str(src_fname.with_suffix(f".{preset.ext}"))
             video_filename_ext = preset.ext
             video_filename = src_fname.with_suffix(f".{video_filename_ext}").name
 
-            # funnel from S3 cache if it is present there
-            if not self.funnel_from_s3(vfid, path, vchk, preset):
-                # download original video
-                src = self.download_to_disk(vid, video_file["ext"])
-                dst = src.with_suffix(".webm")
-
-                # request conversion
-                self.convert_and_add_video_aside(vfid, src, vchk, dst, path, preset)
-
-        # we want low-q but no webm yet don't have low_res file, let's reencode
-        elif self.low_quality and alt_video_file is None:
-            preset = VideoMp4Low()
-            src_fname = Path(filename_for(video_file))
-            path = str(src_fname.with_suffix(f".{preset.ext}"))
-            video_filename_ext = preset.ext
-            video_filename = src_fname.with_suffix(f".{video_filename_ext}").name
-
-            # funnel from S3 cache if it is present there
-            if not self.funnel_from_s3(vfid, path, vchk, preset):
-                # download original video
-                src = self.download_to_disk(vid, video_file["ext"])
-
-                # move source file to a new name and swap variables so our target will
-                # be the previously source one
-                src_ = src.with_suffix(f"{src.suffix}.orig")
-                shutil.move(src, src_)
-                dst = src
-                src = src_
-
-                # request conversion
-                self.convert_and_add_video_aside(vfid, src, vchk, dst, path, preset)
-
-        # we want mp4, either in high-q or we have a low_res file to use
+            self.add_reencoded_video(video_file, path, preset, node_id)
         else:
-            video_file = (
-                alt_video_file if self.low_quality and alt_video_file else video_file
-            )
-            self.funnel_file(video_file["id"], video_file["ext"])
+            self.funnel_file(video_file.id, video_file.ext)
             video_filename = filename_for(video_file)
-            video_filename_ext = video_file["ext"]
+            video_filename_ext = video_file.ext
 
         # prepare list of subtitles for template
         subtitles = []
-        for file in filter(lambda f: f["preset"] == "video_subtitle", files):
-            self.funnel_file(file["id"], file["ext"])
+        for file in filter(lambda f: f.preset == "video_subtitle", files):
+            self.funnel_file(file.id, file.ext)
             try:
-                local, english = find_language_names(file["lang"])
+                local, english = find_language_names(file.lang)
             except Exception:
-                english = file["lang"]
+                english = file.lang
 
             subtitles.append(
                 {
-                    "code": file["lang"],
+                    "code": file.lang,
                     "name": english,
                     "filename": filename_for(file),
                 }
@@ -545,108 +893,241 @@ class Kolibri2Zim:
             subtitles=sorted(subtitles, key=lambda i: i["code"]),
             thumbnail=self.db.get_thumbnail_name(node_id),
             autoplay=self.autoplay,
-            **node,
+            with_ogvjs=self.with_ogvjs,
+            **node.as_dict(),
         )
         with self.creator_lock:
             self.creator.add_item_for(
-                path=f"files/{node['slug']}/",
-                title=node["title"],
+                path=f"files/{node.slug}/",
+                title=node.title,
                 content=html,
                 mimetype="text/html",
                 is_front=True,
             )
-        logger.debug(f"Added video #{node_id} - {node['slug']}")
+        logger.debug(f"Added video #{node_id} - {node.slug}")
 
-    @contextmanager
-    def cleanup_future_once_done(self, future):
-        try:
-            yield
-        finally:
-            self.videos_futures.remove(future)
+    def select_video(self, files):
+        """(video file, preset to re-encode it with or None) from node's sorted files
 
-    def video_conversion_completed(
-        self, future, src_fname, dest_fpath, path, s3_key, s3_meta
-    ):
-        """Perform needed duty once video conversion has completed
+        raises StopIteration if there's no video file"""
+        it = filter(lambda f: f.supp == 0, files)
+        # find main video file
+        video_file = next(it)
+        # supplementary video file is optional
+        alt_video_file = next(it, None)
 
-        - adds the converted video inside this future to the zim
-        - upload converted video to cache if configured
-        - delete converted video
-        """
+        # we'll reencode, using the best file with appropriate preset
+        if self.use_webm:
+            return video_file, VideoWebmLow() if self.low_quality else VideoWebmHigh()
 
-        with self.cleanup_future_once_done(future):
-            if future.cancelled():
-                return
+        # we want low-q but no webm yet don't have low_res file, let's reencode
+        if self.low_quality and alt_video_file is None:
+            return video_file, VideoMp4Low()
 
-            try:
-                future.result()
-            except Exception as exc:
-                logger.error(f"Error re-encoding {src_fname}: {exc}")
-                logger.exception(exc)
+        # we want mp4, either in high-q or we have a low_res file to use
+        if self.low_quality and alt_video_file:
+            return alt_video_file, None
+        return video_file, None
+
+    @profiled("video_pipeline")
+    def fetch_video_source(self, job):
+        """download source video to build_dir, returning (source, target) paths
+
+        Sources failing on transient download errors are queued again by the
+        pipeline (see VideoPipeline.retry)"""
+        src = self.download_to_disk(job.local_file_id, job.ext)
+        dst = src.with_suffix(f".{job.preset.ext}")
+        if dst == src:
+            # move source file to a new name so our target will be the source one
+            src = src.with_suffix(f"{src.suffix}.orig")
+            shutil.move(dst, src)
+        return src, dst
+
+    @profiled("video_pipeline")
+    def encode_video(self, job, src_fpath, dest_fpath):
+        """submit video re-encoding to the processes pool
+
+        blocks until a process is free, ffmpeg threads taken from CPU budget.
+        Sources already meeting preset constraints are only remuxed"""
+        if source_meets_preset(src_fpath, job.preset):
+            logger.debug(f"Remuxing {src_fpath.name}, it already meets preset")
+            ffmpeg_args = get_remux_args(job.preset)
+            # not worth storing in cache, source is as good as an encoded one
+            job.upload_to_cache = False
+            mode = "remux"
+        else:
+            ffmpeg_args = job.preset.to_ffmpeg_args()
+            mode = "encode"
+
+        allocation = self.cpu_budget.acquire()
+        logger.debug(
+            f"Re-encoding {src_fpath.name} using {allocation.threads} thread(s)"
+        )
+        started_on = time.monotonic()
+        try:
+            future = self.videos_executor.submit(
+                safer_reencode,
+                src_path=src_fpath,
+                dst_path=dest_fpath,
+                ffmpeg_args=ffmpeg_args,
+                delete_src=True,
+                with_process=False,
+                failsafe=False,
+                threads=allocation.threads,
+            )
+        except Exception:
+            self.cpu_budget.release(allocation)
+            raise
+        future.add_done_callback(lambda _: self.cpu_budget.release(allocation))
+        future.add_done_callback(
+            lambda _: self.metrics.observe(
+                "transcode_seconds",
+                time.monotonic() - started_on,
+                preset=type(job.preset).__name__,
+                mode=mode,
+            )
+        )
+        return future
+
+    @profiled("video_pipeline")
+    def add_encoded_video(self, job, dest_fpath):
+        """add re-encoded video to the ZIM, uploading to cache once added"""
+        kwargs = {
+            "path": job.path,
+            "filepath": dest_fpath,
+            "mimetype": get_file_mimetype(dest_fpath),
+        }
+        cache_key = (
+            self.cache_key_for(job.file_id, job.preset) if job.upload_to_cache else None
+        )
+        cache_meta = {
+            "checksum": job.checksum,
+            "encoder_version": encoder_version_for(job.preset),
+        }
+        # other ZIMs of the batch await this video in cache as soon as it's added
+        if self.resources and cache_key:
+            self.upload_to_cache(cache_key, dest_fpath, **cache_meta)
+            cache_key = None
+
+        with self.creator_lock:
+            self.creator.add_item(
+                StaticItem(**kwargs),
+                callback=functools.partial(
+                    self.converted_video_added_to_zim,
+                    dest_fpath=dest_fpath,
+                    cache_key=cache_key,
+                    cache_meta=cache_meta,
+                ),
+            )
+        logger.debug(f"Added {job.path} from re-encoded file")
+
+    def claim_video(self, local_file_id, preset, nb_bytes=0):
+        """future for caller to resolve once it produced this video, None if not needed
+
+        Video is not needed if another node already produced it or is doing so.
+        A video whose production failed can be claimed again.
+
+        Video is a progress item crediting nb_bytes (its source's size, moved from
+        its node's) once produced, so ETA accounts for encodes still running."""
+        key = (local_file_id, type(preset).__name__)
+        with self.videos_registry_lock:
+            existing = self.videos_registry.get(key)
+            if existing and not (existing.done() and existing.exception()):
+                self.nb_videos_deduplicated += 1
+                return None
+            future = self.videos_registry[key] = cf.Future()
+        self.progress.add()
+        future.add_done_callback(lambda _: self.progress.item_done(nb_bytes))
+        return future
+
+    def add_reencoded_video(self, video_file, path, preset, node_id):
+        """add video re-encoded with preset at path, only once per build
+
+        Path is based on local file ID so nodes sharing a video all link to the same
+        entry: only the first one produces it, from cache or through re-encoding."""
+        nb_bytes = self.db.get_local_file_size(video_file.id) or 0
+        future = self.claim_video(video_file.id, preset, nb_bytes)
+        if future is None:
+            logger.debug(f"{path} already requested by another node")
+            return
+        # source's bytes are done once video is produced, not with its node
+        self.nodes_sizes[node_id] = self.nodes_sizes.get(node_id, 0) - nb_bytes
+
+        # ZIMs of a batch share videos through the optimization cache: only one
+        # produces it, others get it from cache once it's there (without blocking
+        # a node thread meanwhile)
+        if self.resources and self.optimization_cache:
+            shared, owner = self.resources.claim_video(
+                self.cache_key_for(video_file.fid, preset)
+            )
+            if owner:
+                future.add_done_callback(lambda _: shared.set_result(None))
+            elif not shared.done():
+                logger.debug(f"{path} produced for another ZIM, deferring it")
+                self.deferred_videos.add(future)
+                shared.add_done_callback(
+                    lambda _: self.produce_video_aside(video_file, path, preset, future)
+                )
                 return
 
-            logger.debug(f"Re-encoded {src_fname} successfuly")
+        self.produce_video(video_file, path, preset, future)
 
-            kwargs = {
-                "path": path,
-                "filepath": dest_fpath,
-                "mimetype": get_file_mimetype(dest_fpath),
-            }
+    def produce_video_aside(self, video_file, path, preset, future):
+        """produce video on the nodes executor, called once another ZIM produced it"""
+        try:
+            self.nodes_executor.submit(
+                self.produce_video, video_file, path, preset, future
+            )
+        except RuntimeError as exc:
+            future.set_exception(exc)
 
-            with self.creator_lock:
-                self.creator.add_item(
-                    StaticItem(**kwargs),
-                    callback=functools.partial(
-                        self.converted_video_added_to_zim,
-                        dest_fpath=dest_fpath,
-                        s3_key=s3_key,
-                        s3_meta=s3_meta,
-                    ),
-                )
-            logger.debug(f"Added {path} from re-encoded file")
-
-    def convert_and_add_video_aside(
-        self, file_id, src_fpath, src_checksum, dest_fpath, path, preset
-    ):
-        """add video to the process-based convertion queue"""
-
-        future = self.videos_executor.submit(
-            safer_reencode,
-            src_path=src_fpath,
-            dst_path=dest_fpath,
-            ffmpeg_args=preset.to_ffmpeg_args(),
-            delete_src=True,
-            with_process=False,
-            failsafe=False,
-        )
-        self.videos_futures.add(future)
-        future.add_done_callback(
-            functools.partial(
-                self.video_conversion_completed,
-                src_fname=src_fpath.name,
-                dest_fpath=dest_fpath,
+    def produce_video(self, video_file, path, preset, future):
+        """add video from cache or through the pipeline, resolving future once added"""
+        # content_file has a 1:1 rel with content_localfile which is thre
+        # *implementation* of the file. We use that local file ID (its checksum)
+        # everywhere BUT as cache ID as we want to overwrite the same key
+        # should a new version of the localfile for the same file arrives.
+        try:
+            # funnel from cache if it is present there, re-encode otherwise
+            if self.funnel_from_cache(
+                video_file.fid, path, video_file.checksum, preset
+            ):
+                future.set_result(None)
+            else:
+                self.convert_and_add_video_aside(video_file, path, preset, future)
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+
+    def convert_and_add_video_aside(self, video_file, path, preset, future):
+        """add video to the fetch → encode → add pipeline, resolving future once added
+
+        blocks if the pipeline's queue is full"""
+        self.video_pipeline.submit(
+            VideoJob(
+                file_id=video_file.fid,
+                local_file_id=video_file.id,
+                ext=video_file.ext,
+                checksum=video_file.checksum,
                 path=path,
-                s3_key=self.s3_key_for(file_id, preset),
-                s3_meta={
-                    "checksum": src_checksum,
-                    "encoder_version": str(preset.VERSION),
-                },
+                preset=preset,
+                future=future,
             )
         )
 
-    def converted_video_added_to_zim(self, dest_fpath, s3_key, s3_meta):
+    def converted_video_added_to_zim(self, dest_fpath, cache_key, cache_meta):
         """Perform needed duty once video has been added to the ZIM
 
         - upload converted video to cache if configured
         - delete converted video
         """
 
-        if self.s3_storage:
-            # we shall request s3 upload on the threads pool, only once item has been
+        if self.optimization_cache and cache_key:
+            # we shall request cache upload on the threads pool, only once item has been
             # added to ZIM so it can be removed altogether
             # TODO: submit to a thread executor (to create) instead
             # this is currently called on main-tread.
-            self.upload_to_s3(s3_key, dest_fpath, **s3_meta)
+            self.upload_to_cache(cache_key, dest_fpath, **cache_meta)
 
         os.unlink(dest_fpath)
 
@@ -657,26 +1138,27 @@ class Kolibri2Zim:
         file = self.db.get_node_file(node_id, thumbnail=False)
         if not file:
             return
-        self.funnel_file(file["id"], file["ext"])
+        self.funnel_file(file.id, file.ext)
 
         node = self.get_node_with_slugs(node_id, with_parents=True)
         html = self.jinja2_env.get_template("audio.html").render(
             node_id=node_id,
             filename=filename_for(file),
-            ext=file["ext"],
+            ext=file.ext,
             thumbnail=self.db.get_thumbnail_name(node_id),
             autoplay=self.autoplay,
-            **node,
+            with_ogvjs=self.with_ogvjs,
+            **node.as_dict(),
         )
         with self.creator_lock:
             self.creator.add_item_for(
-                path=f"files/{node['slug']}/",
-                title=node["title"],
+                path=f"files/{node.slug}/",
+                title=node.title,
                 content=html,
                 mimetype="text/html",
                 is_front=True,
             )
-        logger.debug(f"Added audio #{node_id} - {node['slug']}")
+        logger.debug(f"Added audio #{node_id} - {node.slug}")
 
     def add_exercise_node(self, node_id):
         """Add content from this `exercise` node to zim
@@ -690,15 +1172,14 @@ class Kolibri2Zim:
         files = self.db.get_node_files(node_id, thumbnail=False)
         if not files:
             return
-        files = sorted(files, key=lambda f: f["prio"])
-        perseus_file = next(filter(lambda f: f["supp"] == 0, files))
+        files = sorted(files, key=lambda f: f.prio)
+        perseus_file = next(filter(lambda f: f.supp == 0, files))
 
         # download persus file
-        perseus_url, perseus_name = get_kolibri_url_for(
-            perseus_file["id"], perseus_file["ext"]
-        )
         perseus_data = io.BytesIO()
-        download_to(perseus_url, byte_stream=perseus_data)
+        self.storage.download_to(
+            perseus_file.id, perseus_file.ext, byte_stream=perseus_data
+        )
 
         # read JSON manifest from perseus file
         zip_ark = zipfile.ZipFile(perseus_data)
@@ -745,17 +1226,17 @@ class Kolibri2Zim:
             node_id=node_id,
             perseus_content=f"[{', '.join(assessment_items)}]",
             questions_count=str(len(assessment_items)),
-            **node,
+            **node.as_dict(),
         )
         with self.creator_lock:
             self.creator.add_item_for(
-                path=f"files/{node['slug']}/",
-                title=node["title"],
+                path=f"files/{node.slug}/",
+                title=node.title,
                 content=html,
                 mimetype="text/html",
                 is_front=True,
             )
-        logger.debug(f"Added exercise node #{node_id} - {node['slug']}")
+        logger.debug(f"Added exercise node #{node_id} - {node.slug}")
 
     def add_document_node(self, node_id):
         """Add content from this `document` node to zim
@@ -775,19 +1256,19 @@ class Kolibri2Zim:
 
         def target_for(file):
             filename = filename_for(file)
-            if file["ext"] == "pdf":
+            if file.ext == "pdf":
                 return f"../assets/pdfjs/web/viewer.html?file=../../../files/{filename}"
             if get_is_epub(file):
                 return f"../assets/epub_embed.html?url=../files/{filename}"
 
         def get_is_epub(file):
-            return file["ext"] == "epub"
+            return file.ext == "epub"
 
         # record the actual document
         files = self.db.get_node_files(node_id, thumbnail=False)
         if not files:
             return
-        files = sorted(filter(lambda f: f["supp"] == 0, files), key=lambda f: f["prio"])
+        files = sorted(filter(lambda f: f.supp == 0, files), key=lambda f: f.prio)
         it = iter(files)
 
         try:
@@ -801,13 +1282,18 @@ class Kolibri2Zim:
             alt_document = None
 
         for file in files:
-            self.funnel_file(file["id"], file["ext"], path_prefix="files/")
-            file["target"] = target_for(file)
+            if preset := self.get_document_preset(file):
+                self.add_optimized_file(
+                    file, f"files/{filename_for(file)}", preset, optimize_document
+                )
+            else:
+                self.funnel_file(file.id, file.ext, path_prefix="files/")
+            file.target = target_for(file)
 
         node = self.get_node_with_slugs(node_id, with_parents=True)
 
         # convert generator to list as we might read it twice
-        node["parents"] = list(node["parents"])
+        node.parents = list(node.parents)
 
         # generate page once for each document, changing only `is_alt`
         if alt_document:
@@ -818,28 +1304,34 @@ class Kolibri2Zim:
         for is_alt in options:
             html = self.jinja2_env.get_template("document.html").render(
                 node_id=node_id,
-                node_slug=node["slug"],
+                node_slug=node.slug,
                 main_document=filename_for(main_document),
-                main_document_ext=main_document["ext"],
+                main_document_ext=main_document.ext,
                 alt_document=filename_for(alt_document) if alt_document else None,
-                alt_document_ext=alt_document["ext"] if alt_document else None,
+                alt_document_ext=alt_document.ext if alt_document else None,
                 target=target_for(alt_document if is_alt else main_document),
                 is_alt=is_alt,
                 is_epub=get_is_epub(alt_document if is_alt else main_document),
-                **node,
+                **node.as_dict(),
             )
             with self.creator_lock:
-                path = f"files/{node['slug']}/"
+                path = f"files/{node.slug}/"
                 if is_alt:
                     path += "_alt"
                 self.creator.add_item_for(
                     path=path,
-                    title=node["title"],
+                    title=node.title,
                     content=html,
                     mimetype="text/html",
                     is_front=is_alt,
                 )
-        logger.debug(f"Added document #{node_id} - {node['slug']}")
+        logger.debug(f"Added document #{node_id} - {node.slug}")
+
+    def get_document_preset(self, file):
+        """preset to optimize document file with, None if it's added as-is"""
+        if self.optimize_documents and file.ext in DOCUMENTS_PRESETS:
+            return DOCUMENTS_PRESETS[file.ext]()
+        return None
 
     def add_html5_node(self, node_id):
         """Add content from this `html5` node to zim
@@ -858,62 +1350,88 @@ class Kolibri2Zim:
 
         node = self.get_node_with_slugs(node_id)
 
-        # download ZIP file to memory
-        ark_url, ark_name = get_kolibri_url_for(file["id"], file["ext"])
-        ark_data = io.BytesIO()
-        download_to(url=ark_url, byte_stream=ark_data)
+        # ZIP file is downloaded to memory (read in place from local storage)
+        with self.storage.open(file.id, file.ext) as ark_data:
+            # members are decompressed and identified in parallel, outside the
+            # creator lock which is only held to add entries (or redir. for each if
+            # using dedup)
+            zip_ark = zipfile.ZipFile(ark_data)
+            members = zip_ark.namelist()
+            started_on = time.monotonic()
+            # consume results so that members' errors are raised
+            list(
+                self.html5_executor.map(
+                    functools.partial(self.add_html5_member, zip_ark, node.slug),
+                    members,
+                )
+            )
 
-        # loop over zip members and create an entry (or redir. for each if using dedup)
-        zip_ark = zipfile.ZipFile(ark_data)
-        for ark_member in zip_ark.namelist():
-            if not self.dedup_html_files:
-                with self.creator_lock:
-                    self.creator.add_item_for(
-                        path=(
-                            f"files/{node['slug']}/{ark_member}"
-                            if ark_member != "index.html"
-                            else f"files/{node['slug']}/"
-                        ),
-                        content=zip_ark.open(ark_member).read(),
-                        is_front=(ark_member == "index.html"),
-                    )
-                continue
+        logger.debug(
+            f"Added {len(members)} files from {filename_for(file)} "
+            f"in {time.monotonic() - started_on:.2f}s"
+        )
+        logger.debug(f"Added HTML5 node #{node_id} - {node.slug}")
+
+    @profiled("html5_members")
+    def add_html5_member(self, zip_ark, slug, ark_member):
+        """add a member of an HTML5 app ZIP to the ZIM, within files/{slug}/
+
+        mimetype and compression hint are computed from name and content so libzim
+        doesn't spend CPU compressing already-compressed media"""
+        path = (
+            f"files/{slug}/{ark_member}"
+            if ark_member != "index.html"
+            else f"files/{slug}/"
+        )
+        is_front = ark_member == "index.html"
+        content = read_from_zip(zip_ark, ark_member)
+        mimetype = mimetype_for(path=ark_member, content=content)
+        compress = should_compress(mimetype, content)
 
-            # calculate hash of file and add entry if not in zim already
-            content = zip_ark.open(ark_member).read()
-            content_hash = hashlib.md5(content).hexdigest()  # nosec # noqa: S324
+        if not self.dedup_html_files:
+            with self.creator_lock:
+                self.creator.add_item_for(
+                    path=path,
+                    content=content,
+                    mimetype=mimetype,
+                    is_front=is_front,
+                    should_compress=compress,
+                )
+            return
 
+        # calculate hash of file and add entry if not in zim already
+        content_hash = hashlib.md5(content).hexdigest()  # nosec # noqa: S324
+        with self.creator_lock:
             if content_hash not in self.html_files_cache:
-                self.html_files_cache.append(content_hash)
-                with self.creator_lock:
-                    self.creator.add_item_for(
-                        path=f"html5_files/{content_hash}",
-                        content=content,
-                        is_front=False,
-                    )
-
-            # add redirect to the unique sum-based entry for that file's path
-            with self.creator_lock:
-                self.creator.add_redirect(
-                    path=(
-                        f"files/{node['slug']}/{ark_member}"
-                        if ark_member != "index.html"
-                        else f"files/{node['slug']}/"
-                    ),
-                    target_path=f"html5_files/{content_hash}",
-                    is_front=ark_member == "index.html",
+                self.html_files_cache.add(content_hash)
+                self.creator.add_item_for(
+                    path=f"html5_files/{content_hash}",
+                    content=content,
+                    mimetype=mimetype,
+                    is_front=False,
+                    should_compress=compress,
                 )
 
-        logger.debug(f"Added HTML5 node #{node_id} - {node['slug']}")
+            # add redirect to the unique sum-based entry for that file's path
+            self.creator.add_redirect(
+                path=path,
+                target_path=f"html5_files/{content_hash}",
+                is_front=is_front,
+            )
 
     def run(self):
-        if self.s3_url_with_credentials and not self.s3_credentials_ok():
+        if self.plan_only:
+            return self.run_plan()
+
+        if self.resources:
+            # cache and web deps were checked once for the batch
+            self.optimization_cache = self.resources.optimization_cache
+        elif self.s3_url_with_credentials and not self.optimization_cache_ok():
             raise ValueError("Unable to connect to Optimization Cache. Check its URL.")
 
-        s3_msg = (
-            f"  using cache: {self.s3_storage.url.netloc} "
-            f"with bucket: {self.s3_storage.bucket_name}"
-            if self.s3_storage
+        cache_msg = (
+            f"  using cache: {self.optimization_cache}"
+            if self.optimization_cache
             else ""
         )
         logger.info(
@@ -923,10 +1441,19 @@ class Kolibri2Zim:
             f"  output_dir: {self.output_dir}\n"
             f"  using webm : {self.use_webm}\n"
             f"  low_quality : {self.low_quality}\n"
-            f"{s3_msg}"
+            f"  optimize documents : {self.optimize_documents}\n"
+            f"  processes: {self.nb_processes} "
+            f"(CPU budget: {self.cpu_budget_threads} threads)\n"
+            f"{cache_msg}"
         )
 
-        self.ensure_js_deps_are_present()
+        if not self.resources:
+            self.ensure_js_deps_are_present()
+
+        if self.optimize_documents and not get_pdf_tool():
+            logger.warning(
+                "Neither Ghostscript nor qpdf found: PDFs will be added unoptimized"
+            )
 
         logger.info("Download database")
         self.download_db()
@@ -950,7 +1477,7 @@ class Kolibri2Zim:
         logger.info("Setup Zim Creator")
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-        self.creator_lock = threading.Lock()
+        self.creator_lock = TimedLock("creator_lock", self.metrics)
         if not self.root_id:
             logger.error("Missing root id")
             return 1
@@ -984,6 +1511,13 @@ class Kolibri2Zim:
         )
         self.creator.start()
 
+        metrics_writer = (
+            MetricsWriter(Path(self.metrics_textfile), self.metrics)
+            if self.metrics_textfile
+            else None
+        )
+        if self.profiler:
+            self.profiler.start()
         succeeded = False
         try:
             self.add_favicon()
@@ -991,31 +1525,92 @@ class Kolibri2Zim:
 
             self.add_custom_about_and_css()
 
-            # add assets files
+            # add assets files, skipping players and viewers no node needs
+            nodes_assets = self.get_nodes_assets()
+            self.with_ogvjs = set(OGVJS_ASSETS) <= nodes_assets
+            skipped_assets = OPTIONAL_ASSETS - nodes_assets
             logger.info("Adding local files (assets)")
-            self.add_local_files("assets", self.templates_dir.joinpath("assets"))
+            if skipped_assets:
+                logger.info(
+                    f"  skipping {', '.join(sorted(skipped_assets))} (not needed)"
+                )
+            self.add_local_files(
+                "assets", self.templates_dir.joinpath("assets"), exclude=skipped_assets
+            )
 
             # setup queue for nodes processing
             self.nodes_futures = set()
             self.nodes_executor = cf.ThreadPoolExecutor(max_workers=self.nb_threads)
-
-            # setup a dedicated queue for videos to convert
-            self.videos_futures = set()
-            self.videos_executor = cf.ProcessPoolExecutor(max_workers=self.nb_processes)
+            self.retry_scheduler = RetryScheduler()
+            # HTML5 apps' members, extracted in parallel from a node's thread
+            self.html5_executor = cf.ThreadPoolExecutor(max_workers=self.nb_threads)
+
+            if self.resources:
+                self.images_executor = self.resources.images_executor
+                self.videos_executor = self.resources.videos_executor
+                self.cpu_budget = self.resources.cpu_budget
+            else:
+                download_limiter.set_maximum(
+                    self.nb_threads + self.nb_download_segments - 1
+                )
+                # thumbnails and documents are optimized on their own pool, not
+                # behind videos
+                self.images_executor = cf.ProcessPoolExecutor(
+                    max_workers=self.nb_processes
+                )
+                # setup a dedicated pipeline for videos to convert
+                self.videos_executor = cf.ProcessPoolExecutor(
+                    max_workers=self.nb_processes
+                )
+                self.cpu_budget = CPUBudget(
+                    budget=self.cpu_budget_threads, nb_slots=self.nb_processes
+                )
+            self.video_pipeline = VideoPipeline(
+                fetch=self.fetch_video_source,
+                encode=self.encode_video,
+                add=self.add_encoded_video,
+                nb_fetchers=self.cpu_budget.nb_slots,
+                # one source being encoded and one ready, per process
+                capacity=2 * self.cpu_budget.nb_slots,
+                max_queued=VIDEO_PIPELINE_QUEUE_SIZE,
+                max_attempts=NODE_MAX_ATTEMPTS,
+                retry_base_delay=NODE_RETRY_BASE_DELAY,
+            )
 
             logger.info("Starting nodes processing")
+            self.nodes_sizes = self.db.get_nodes_files_size(*self.selection_clause)
+            self.progress.start()
             self.populate_nodes_executor()
 
-            # await completion of all futures (nodes and videos)
+            # await completion of all nodes futures
+            cf.wait(self.nodes_futures, return_when=cf.FIRST_EXCEPTION)
+            # videos produced for another ZIM are then added from the nodes executor
+            cf.wait(self.deferred_videos)
+            self.retry_scheduler.shutdown()
+            self.nodes_executor.shutdown()
+            self.html5_executor.shutdown()
+            # no more video can be requested, await completion of the pipeline
+            # which includes ZIM addition of re-encoded videos
+            self.video_pipeline.shutdown()
+            if not self.resources:
+                self.images_executor.shutdown()
+                self.videos_executor.shutdown()
+            if self.cpu_budget.nb_encodes and not self.resources:
+                logger.info(f"Video encoders: {self.cpu_budget.summary()}")
+            if self.nb_videos_deduplicated:
+                logger.info(
+                    f"{self.nb_videos_deduplicated} videos shared by several nodes "
+                    "were only added once"
+                )
+            if self.nb_files_coalesced:
+                logger.info(
+                    f"{self.nb_files_coalesced} requests for files already added "
+                    "or being added by another node were coalesced"
+                )
+            # only latest attempt of each video matters (failed ones can be reclaimed)
             futures = cf.wait(
-                self.videos_futures | self.nodes_futures,
-                return_when=cf.FIRST_EXCEPTION,
+                set(self.videos_registry.values()) | self.nodes_futures, timeout=0
             )
-            self.nodes_executor.shutdown()
-            # properly shutting down the executor should allow processing
-            # futures's callbacks (zim addition) as the wait() function
-            # only awaits future completion and doesn't include callbacks
-            self.videos_executor.shutdown()
 
             self.add_channel_json()
 
@@ -1047,8 +1642,21 @@ class Kolibri2Zim:
             # we need to release libzim's resources.
             # currently does nothing but crash if can_finish=False but that's awaiting
             # impl. at libkiwix level
-            with self.creator_lock:
+            with self.creator_lock, self.metrics.timer("zim_finish_seconds"):
                 self.creator.finish()
+            self.progress.stop()
+            self.progress.log()
+            self.report_metrics()
+            if self.profiler:
+                self.profiler.stop()
+                try:
+                    self.profiler.dump(
+                        self.output_dir, f"{Path(self.clean_fname).stem}_profile"
+                    )
+                except OSError as exc:
+                    logger.warning(f"Unable to write profiling report: {exc}")
+            if metrics_writer:
+                metrics_writer.stop()
 
         if not self.keep_build_dir:
             logger.info("Removing build folder")
@@ -1056,19 +1664,103 @@ class Kolibri2Zim:
 
         return 0 if succeeded else 1
 
-    def s3_credentials_ok(self):
-        logger.info("testing S3 Optimization Cache credentials")
-        self.s3_storage = KiwixStorage(self.s3_url_with_credentials)
-        if not self.s3_storage.check_credentials(
-            list_buckets=True, bucket=True, write=True, read=True, failsafe=True
-        ):
-            logger.error("S3 cache connection error testing permissions.")
-            logger.error(f"  Server: {self.s3_storage.url.netloc}")
-            logger.error(f"  Bucket: {self.s3_storage.bucket_name}")
-            logger.error(f"  Key ID: {self.s3_storage.params.get('keyid')}")
-            logger.error(f"  Public IP: {get_public_ip()}")
-            return False
-        return True
+    def run_plan(self):
+        """estimate build's cost from channel DB only, writing a JSON report"""
+        if self.s3_url_with_credentials and not self.optimization_cache_ok():
+            raise ValueError("Unable to connect to Optimization Cache. Check its URL.")
+
+        logger.info("Download database")
+        self.download_db()
+        self.sanitize_inputs()
+
+        logger.info("Planning build (no content is downloaded)")
+        plan = self.compute_plan()
+        plan.log()
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        fpath = self.output_dir / f"{Path(self.clean_fname).stem}_plan.json"
+        plan.write(fpath)
+        logger.info(f"Plan written to {fpath}")
+
+        if not self.keep_build_dir:
+            shutil.rmtree(self.build_dir, ignore_errors=True)
+        return 0
+
+    def compute_plan(self):
+        """walk nodes as a build would, recording their files' fate in a Plan"""
+        plan = Plan()
+        sizes = self.db.get_local_files_size()
+        # files to optimize, once per (local file ID, preset) as in builds
+        to_optimize = {}
+
+        def add_file(kind, file, preset=None):
+            if preset is None:
+                plan.add_file(kind, sizes.get(file.id, 0))
+            else:
+                to_optimize.setdefault(
+                    (file.id, type(preset).__name__), (kind, file, preset)
+                )
+
+        for node_id, kind in self.iter_nodes():
+            plan.add_node(kind)
+            if not hasattr(self, f"add_{kind}_node") or (
+                self.only_topics and kind != "topic"
+            ):
+                continue
+
+            thumbnail = self.db.get_node_thumbnail(node_id)
+            if thumbnail:
+                add_file(kind, thumbnail, WebpThumbnail())
+
+            files = sorted(
+                self.db.get_node_files(node_id, thumbnail=False),
+                key=lambda f: f.prio,
+            )
+            if kind == "video":
+                with contextlib.suppress(StopIteration):
+                    add_file(kind, *self.select_video(files))
+                for file in filter(lambda f: f.preset == "video_subtitle", files):
+                    add_file(kind, file)
+            elif kind == "document":
+                for file in filter(lambda f: f.supp == 0, files):
+                    add_file(kind, file, self.get_document_preset(file))
+            else:
+                for file in files:
+                    add_file(kind, file)
+
+        def is_cached(item):
+            _, file, preset = item
+            return bool(self.optimization_cache) and self.is_in_cache(
+                file.fid, file.checksum, preset
+            )
+
+        # one request per file for S3: checked concurrently
+        with cf.ThreadPoolExecutor(max_workers=self.nb_threads) as executor:
+            for (kind, file, preset), cached in zip(
+                to_optimize.values(),
+                executor.map(is_cached, to_optimize.values()),
+                strict=True,
+            ):
+                plan.add_optimized_file(
+                    kind, sizes.get(file.id, 0), type(preset).__name__, cached=cached
+                )
+        return plan
+
+    def report_metrics(self):
+        """log main metrics and write JSON summary if requested"""
+        logger.info(self.metrics.describe())
+        if self.metrics_filename:
+            fpath = Path(self.metrics_filename).expanduser()
+            try:
+                self.metrics.write_json(fpath)
+                logger.info(f"Metrics written to {fpath}")
+            except OSError as exc:
+                logger.warning(f"Unable to write metrics to {fpath}: {exc}")
+
+    def optimization_cache_ok(self):
+        logger.info("testing Optimization Cache credentials")
+        self.optimization_cache = get_optimization_cache(self.s3_url_with_credentials)
+        return self.optimization_cache.check()
 
     def download_db(self):
         """download channel DB from kolibri and initialize DB
@@ -1076,12 +1768,9 @@ class Kolibri2Zim:
         Also sets the root_id with DB-computer value"""
         # download database
         fpath = self.build_dir.joinpath("db.sqlite3")
-        logger.debug(f"Downloading database into {fpath.name}…")
-        download_to(
-            f"{STUDIO_URL}/content/databases/{self.channel_id}.sqlite3",
-            fpath,
-        )
-        self.db = KolibriDB(fpath, self.root_id)
+        logger.debug(f"Downloading database from {self.storage} into {fpath.name}…")
+        self.storage.download_db(self.channel_id, fpath)
+        self.db = KolibriDB(fpath, self.root_id, metrics=self.metrics)
         self.root_id = self.db.root_id
 
     def sanitize_inputs(self):
@@ -1192,6 +1881,9 @@ class Kolibri2Zim:
                 title = channel_meta["name"]
                 content = None
             else:
+                # only needed for custom about pages
+                from bs4 import BeautifulSoup
+
                 soup = BeautifulSoup(user_provided_file.read_bytes(), "lxml")
                 title = soup.find("title")
                 if not title:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import dataclasses
+import json
+
+from kolibri2zim.database import KolibriDB
+
+
+def split_list(value: str | None) -> list[str] | None:
+    """items of a comma-separated CLI value, None if not set"""
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# kinds of content nodes the scraper builds (see Kolibri2Zim.add_{kind}_node)
+KINDS = ("video", "audio", "document", "exercise", "html5")
+
+
+@dataclasses.dataclass
+class NodeSelection:
+    """Nodes to build within root's tree, compiled into an SQL WHERE clause
+
+    - node_ids: those nodes only
+    - subtree_ids: those nodes and their descendants, along with their ancestors
+      so they can be reached from root
+    - kinds, languages: only nodes of those kinds and languages (node's lang_id,
+      channel's language if not set)
+
+    Node and subtree IDs are combined (union) and are then filtered by kinds and
+    languages, which don't apply to topics as they're the way to reach content.
+    Topics are only selected if some content below them is (or if listed in
+    node_ids) so topic pages don't link to nodes which are not built.
+    Nothing set selects the whole tree. Root is always built, outside selection."""
+
+    node_ids: list[str] | None = None
+    subtree_ids: list[str] | None = None
+    kinds: list[str] | None = None
+    languages: list[str] | None = None
+
+    def __post_init__(self):
+        unknown = sorted(set(self.kinds or []) - set(KINDS))
+        if unknown:
+            raise ValueError(
+                f"Unknown kind(s) {', '.join(unknown)}, expecting {', '.join(KINDS)}"
+            )
+
+    def __bool__(self):
+        return any((self.node_ids, self.subtree_ids, self.kinds, self.languages))
+
+    def compile(self, db: KolibriDB) -> tuple[str, list]:
+        """WHERE clause selecting nodes of db (content_contentnode rows) and its
+        parameters
+
+        Subtrees are turned into lft/rght ranges using db"""
+        if not self:
+            return "1", []
+
+        # content nodes: members of node_ids or subtrees, of kinds and languages
+        members, members_params = [], []
+        if self.node_ids:
+            members.append("id IN (SELECT value FROM json_each(?))")
+            members_params.append(json.dumps(self.node_ids))
+        for subtree_id in self.subtree_ids or []:
+            subtree = db.get_node(subtree_id)
+            if not subtree:
+                raise ValueError(f"No node for subtree ID {subtree_id}")
+            # subtree itself, then its ancestors
+            members.append("(lft >= ? AND rght <= ?) OR (lft < ? AND rght > ?)")
+            members_params += [subtree.left, subtree.right] * 2
+        membership = " OR ".join(f"({member})" for member in members) or "1"
+
+        clauses, params = ["kind != 'topic'", membership], list(members_params)
+        if self.kinds:
+            clauses.append("kind IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(self.kinds))
+        if self.languages:
+            # nodes without a language inherit channel's one
+            clauses.append("COALESCE(lang_id, ?) IN (SELECT value FROM json_each(?))")
+            params += [db.get_channel_language(), json.dumps(self.languages)]
+        content = " AND ".join(f"({clause})" for clause in clauses)
+
+        # topics: members with selected content below them (unqualified columns of
+        # the subquery are the descendant's ones), or listed in node_ids
+        topic = (
+            "kind = 'topic' AND "  # nosec # noqa: S608
+            f"({membership}) AND EXISTS (SELECT 1 FROM content_contentnode d "
+            "WHERE d.lft > content_contentnode.lft "
+            f"AND d.rght < content_contentnode.rght AND {content})"
+        )
+        topic_params = members_params + params
+        if self.node_ids:
+            topic += " OR (kind = 'topic' AND id IN (SELECT value FROM json_each(?)))"
+            topic_params.append(json.dumps(self.node_ids))
+
+        return f"({content}) OR ({topic})", params + topic_params
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import abc
+import io
+import pathlib
+import shutil
+
+from zimscraperlib.filesystem import get_file_mimetype
+
+from kolibri2zim.cache import link_or_copy
+from kolibri2zim.constants import STUDIO_URL
+from kolibri2zim.debug import (
+    download_to,
+    download_to_with_retries,
+    get_size_and_mime,
+)
+from kolibri2zim.metrics import Metrics
+
+
+def database_relpath(channel_id: str) -> str:
+    """path of a channel's DB in Studio's layout"""
+    return f"content/databases/{channel_id}.sqlite3"
+
+
+def storage_relpath(file_id: str, ext: str) -> str:
+    """path of a file in Studio's layout"""
+    return f"content/storage/{file_id[0]}/{file_id[1]}/{file_id}.{ext}"
+
+
+class ContentStorage(abc.ABC):
+    """Where channels' DB and files are read from, laid out as Kolibri Studio
+
+    {root}/content/databases/{channel_id}.sqlite3
+    {root}/content/storage/{a}/{b}/{local_file_id}.{ext}"""
+
+    @abc.abstractmethod
+    def download_db(self, channel_id: str, fpath: pathlib.Path): ...
+
+    def get_local_path(
+        self, file_id: str, ext: str  # noqa: ARG002
+    ) -> pathlib.Path | None:
+        """path file can be read from in place, None if storage is remote"""
+        return None
+
+    @abc.abstractmethod
+    def get_size_and_mime(self, file_id: str, ext: str) -> tuple[int | None, str]:
+        """size (None if unknown) and mimetype of file"""
+
+    @abc.abstractmethod
+    def download_to(
+        self,
+        file_id: str,
+        ext: str,
+        fpath: pathlib.Path | None = None,
+        byte_stream: io.BytesIO | None = None,
+    ):
+        """write file to fpath or byte_stream"""
+
+    def open(self, file_id: str, ext: str) -> io.BufferedIOBase:
+        """binary file object to read file from (in memory if remote)"""
+        byte_stream = io.BytesIO()
+        self.download_to(file_id, ext, byte_stream=byte_stream)
+        byte_stream.seek(0)
+        return byte_stream
+
+    def __str__(self):
+        return type(self).__name__
+
+
+class StudioStorage(ContentStorage):
+    """Kolibri Studio (or a mirror of it) over HTTP
+
+    Downloads are recorded into metrics (own registry if not set)"""
+
+    def __init__(self, url: str = STUDIO_URL, metrics: Metrics | None = None):
+        self.url = url
+        self.metrics = metrics or Metrics()
+
+    def url_for(self, file_id: str, ext: str) -> str:
+        return f"{self.url}/{storage_relpath(file_id, ext)}"
+
+    def db_url_for(self, channel_id: str) -> str:
+        return f"{self.url}/{database_relpath(channel_id)}"
+
+    def download_db(self, channel_id: str, fpath: pathlib.Path):
+        download_to_with_retries(
+            self.db_url_for(channel_id),
+            fpath,
+            metrics=self.metrics,
+        )
+
+    def get_size_and_mime(self, file_id: str, ext: str) -> tuple[int | None, str]:
+        return get_size_and_mime(self.url_for(file_id, ext))
+
+    def download_to(
+        self,
+        file_id: str,
+        ext: str,
+        fpath: pathlib.Path | None = None,
+        byte_stream: io.BytesIO | None = None,
+    ):
+        download_to(
+            self.url_for(file_id, ext),
+            fpath=fpath,
+            byte_stream=byte_stream,
+            metrics=self.metrics,
+        )
+
+    def __str__(self):
+        return self.url
+
+
+class LocalStorage(ContentStorage):
+    """Folder with Studio's layout: a kolibri2zim-mirror or a Kolibri home
+
+    Files are read in place: linked (or copied if on another filesystem) when a
+    path to a file the scraper can delete is needed"""
+
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+
+    def _path(self, file_id: str, ext: str) -> pathlib.Path:
+        return self.root / storage_relpath(file_id, ext)
+
+    def download_db(self, channel_id: str, fpath: pathlib.Path):
+        # copied as Kolibri might update it while we're reading it
+        shutil.copyfile(self.root / database_relpath(channel_id), fpath)
+
+    def get_local_path(self, file_id: str, ext: str) -> pathlib.Path:
+        fpath = self._path(file_id, ext)
+        if not fpath.is_file():
+            raise FileNotFoundError(f"Missing {fpath.name} in {self.root}")
+        return fpath
+
+    def get_size_and_mime(self, file_id: str, ext: str) -> tuple[int | None, str]:
+        fpath = self.get_local_path(file_id, ext)
+        return fpath.stat().st_size, get_file_mimetype(fpath)
+
+    def download_to(
+        self,
+        file_id: str,
+        ext: str,
+        fpath: pathlib.Path | None = None,
+        byte_stream: io.BytesIO | None = None,
+    ):
+        src = self.get_local_path(file_id, ext)
+        if fpath is not None:
+            fpath.unlink(missing_ok=True)
+            link_or_copy(src, fpath)
+        if byte_stream is not None:
+            byte_stream.write(src.read_bytes())
+
+    def open(self, file_id: str, ext: str) -> io.BufferedIOBase:
+        return open(self.get_local_path(file_id, ext), "rb")
+
+    def __str__(self):
+        return str(self.root)
+
+
+def get_content_storage(
+    content_dir: str | None, metrics: Metrics | None = None
+) -> ContentStorage:
+    """local storage for a --content-dir, Studio (at STUDIO_URL) otherwise"""
+    if not content_dir:
+        return StudioStorage(metrics=metrics)
+    root = pathlib.Path(content_dir).expanduser().resolve()
+    if not (root / "content" / "databases").is_dir():
+        raise ValueError(f"{root} has no content/databases folder")
+    return LocalStorage(root)
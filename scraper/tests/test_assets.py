@@ -0,0 +1,64 @@
+import pytest
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim.database import KolibriDB
+from kolibri2zim.scraper import OPTIONAL_ASSETS
+
+
+@pytest.mark.parametrize(
+    "kinds, options, expected",
+    [
+        ({"html5": 1}, {}, set()),
+        ({"document": 1}, {}, {"pdfjs", "document.js"}),
+        ({"audio": 1}, {}, {"videojs"}),
+        ({"video": 1}, {}, {"videojs"}),
+        ({"video": 1}, {"use_webm": True}, {"videojs", "ogvjs", "videojs-ogvjs.js"}),
+        ({"video": 1, "document": 1}, {"only_topics": True}, set()),
+    ],
+)
+def test_get_nodes_assets(tmp_path, scraper_generator, kinds, options, expected):
+    channel = generate_channel(
+        tmp_path, depth=1, fanout=2, kinds=kinds, with_files=False
+    )
+    scraper = scraper_generator(additional_options=options)
+    scraper.db = KolibriDB(channel.db_path)
+
+    assets = scraper.get_nodes_assets()
+    assert assets == expected
+    assert assets <= OPTIONAL_ASSETS
+
+
+@pytest.mark.parametrize(
+    "kinds, expected",
+    [
+        ("document", {"pdfjs", "document.js"}),
+        ("video", {"videojs"}),
+        ("video,document", {"videojs", "pdfjs", "document.js"}),
+    ],
+)
+def test_get_nodes_assets_selection(tmp_path, scraper_generator, kinds, expected):
+    channel = generate_channel(
+        tmp_path, depth=1, fanout=8, kinds={"video": 1, "document": 1}, seed=1
+    )
+    scraper = scraper_generator(additional_options={"kinds": kinds})
+    scraper.db = KolibriDB(channel.db_path)
+    assert scraper.get_nodes_assets() == expected
+
+
+def test_add_local_files_exclude(tmp_path, scraper_generator):
+    (tmp_path / "pdfjs").mkdir()
+    (tmp_path / "pdfjs" / "viewer.html").touch()
+    (tmp_path / "bootstrap").mkdir()
+    (tmp_path / "bootstrap" / "bootstrap.css").touch()
+    (tmp_path / "document.js").touch()
+
+    scraper = scraper_generator()
+    added = []
+
+    class Creator:
+        def add_item_for(self, path, **kwargs):  # noqa: ARG002
+            added.append(path)
+
+    scraper.creator = Creator()
+    scraper.add_local_files("assets", tmp_path, exclude={"pdfjs", "document.js"})
+    assert added == ["assets/bootstrap/bootstrap.css"]
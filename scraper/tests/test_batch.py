@@ -0,0 +1,146 @@
+import concurrent.futures as cf
+import json
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from zimscraperlib.video.presets import VideoWebmLow
+
+from kolibri2zim.batch import BatchResources, channel_argv, read_config
+from kolibri2zim.cache import LocalCache
+from kolibri2zim.database import File
+from kolibri2zim.scraper import Kolibri2Zim, encoder_version_for
+
+
+def test_channel_argv():
+    assert channel_argv(
+        {"output": "/output", "threads": 4, "dedup-html-files": True},
+        {"channel-id": "abcd", "name": "test", "threads": 2, "autoplay": False},
+    ) == [
+        "--output",
+        "/output",
+        "--threads",
+        "2",
+        "--dedup-html-files",
+        "--channel-id",
+        "abcd",
+        "--name",
+        "test",
+    ]
+
+
+def test_channel_argv_rejects_batch_options():
+    with pytest.raises(ValueError, match="processes"):
+        channel_argv({}, {"name": "test", "processes": 4})
+
+
+def test_read_config(tmp_path):
+    config = tmp_path / "channels.json"
+    config.write_text(
+        json.dumps(
+            {
+                "defaults": {"threads": 4},
+                "channels": [
+                    {"channel-id": "abcd", "name": "first"},
+                    {"channel-id": "efgh", "name": "second", "threads": 1},
+                ],
+            }
+        )
+    )
+    first, second = read_config(config)
+    assert (first.channel_id, first.name, first.threads) == ("abcd", "first", 4)
+    assert (second.channel_id, second.name, second.threads) == ("efgh", "second", 1)
+
+
+def test_read_config_without_channels(tmp_path):
+    config = tmp_path / "channels.json"
+    config.write_text(json.dumps({"defaults": {"threads": 4}}))
+    with pytest.raises(ValueError, match="No channels"):
+        read_config(config)
+
+
+def test_claim_video():
+    resources = BatchResources(nb_processes=1)
+    try:
+        future, owner = resources.claim_video("a/b/abcd/videowebmlow")
+        assert owner
+        other, other_owner = resources.claim_video("a/b/abcd/videowebmlow")
+        assert other is future
+        assert not other_owner
+        assert resources.claim_video("a/b/abcd/videomp4low")[1]
+
+        # waiters are released once owner resolves it
+        with cf.ThreadPoolExecutor() as executor:
+            waiter = executor.submit(other.result, timeout=5)
+            future.set_result(None)
+            assert waiter.result() is None
+    finally:
+        resources.shutdown()
+
+
+class Creator:
+    def __init__(self):
+        self.paths = []
+
+    def add_item_for(self, path, **kwargs):  # noqa: ARG002
+        self.paths.append(path)
+
+
+def test_video_shared_by_zims(
+    tmp_path: Path, scraper_generator: Callable[..., Kolibri2Zim]
+):
+    resources = BatchResources(nb_processes=1)
+    resources.optimization_cache = LocalCache(tmp_path / "cache")
+    video_file = File(
+        fid="fid0",
+        id="abcd",
+        ext="mp4",
+        prio=1,
+        supp=0,
+        checksum="abcd",
+        lang=None,
+        preset="high_res_video",
+    )
+    preset = VideoWebmLow()
+    scrapers = []
+    for _ in range(2):
+        scraper = scraper_generator(additional_options={"resources": resources})
+        scraper.optimization_cache = resources.optimization_cache
+        scraper.db.get_local_file_size = lambda local_file_id: 100  # noqa: ARG005
+        scraper.creator = Creator()
+        scraper.creator_lock = threading.Lock()
+        scraper.nodes_executor = cf.ThreadPoolExecutor(max_workers=1)
+        # futures of videos submitted to the pipeline
+        scraper.jobs = []
+        scraper.convert_and_add_video_aside = lambda *args, jobs=scraper.jobs: (
+            jobs.append(args[-1])
+        )
+        scrapers.append(scraper)
+    first, second = scrapers
+
+    try:
+        first.add_reencoded_video(video_file, "abcd.webm", preset, "node1")
+        [produced] = first.jobs
+        # video is produced by first ZIM: second one's node returns without it
+        second.add_reencoded_video(video_file, "abcd.webm", preset, "node2")
+        [deferred] = second.deferred_videos
+        assert not deferred.done()
+        assert not second.jobs
+
+        # first ZIM re-encoded and uploaded it: second one gets it from cache
+        src = tmp_path / "abcd.webm"
+        src.write_bytes(b"encoded")
+        resources.optimization_cache.upload_file(
+            src,
+            first.cache_key_for("fid0", preset),
+            meta={"checksum": "abcd", "encoder_version": encoder_version_for(preset)},
+        )
+        produced.set_result(None)
+        assert deferred.result(timeout=5) is None
+        assert second.creator.paths == ["abcd.webm"]
+        assert not second.jobs
+    finally:
+        for scraper in scrapers:
+            scraper.nodes_executor.shutdown()
+        resources.shutdown()
@@ -0,0 +1,161 @@
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from zimscraperlib.video.presets import VideoWebmLow
+
+from kolibri2zim.cache import (
+    LocalCache,
+    OptimizationCache,
+    S3Cache,
+    get_optimization_cache,
+    parse_size,
+)
+from kolibri2zim.scraper import Kolibri2Zim
+
+META = {"checksum": "abcd", "encoder_version": "2"}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1024", 1024), ("500M", 500 * 2**20), ("50GiB", 50 * 2**30), ("2 tb", 2**41)],
+)
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_get_optimization_cache(tmp_path: Path):
+    cache = get_optimization_cache(f"file://{tmp_path}?max_size=1G")
+    assert isinstance(cache, LocalCache)
+    assert cache.root == tmp_path
+    assert cache.max_size == 2**30
+    assert isinstance(get_optimization_cache(str(tmp_path)), LocalCache)
+    assert isinstance(
+        get_optimization_cache(
+            "https://s3.example.com/?keyId=a&secretAccessKey=b&bucketName=c"
+        ),
+        S3Cache,
+    )
+
+
+def test_local_cache_roundtrip(tmp_path: Path):
+    cache = LocalCache(tmp_path / "cache")
+    assert cache.check()
+    src = tmp_path / "video.webm"
+    src.write_bytes(b"encoded")
+
+    assert not cache.has_object_matching("a/b/ab12/videowebmlow", META)
+    cache.upload_file(src, "a/b/ab12/videowebmlow", META)
+    assert cache.has_object_matching("a/b/ab12/videowebmlow", META)
+    assert not cache.has_object_matching(
+        "a/b/ab12/videowebmlow", {**META, "encoder_version": "3"}
+    )
+
+    dst = tmp_path / "dst.webm"
+    cache.download_file("a/b/ab12/videowebmlow", dst)
+    assert dst.read_bytes() == b"encoded"
+    # ZIM addition deletes downloaded file, cache must be kept intact
+    dst.unlink()
+    assert cache.has_object_matching("a/b/ab12/videowebmlow", META)
+
+
+def test_local_cache_rejects_outside_keys(tmp_path: Path):
+    cache = LocalCache(tmp_path / "cache")
+    with pytest.raises(ValueError):
+        cache.has_object_matching("../../etc/passwd", META)
+
+
+def test_local_cache_lru_eviction(tmp_path: Path):
+    cache = LocalCache(tmp_path / "cache", max_size=25)
+    src = tmp_path / "video.webm"
+    src.write_bytes(b"0123456789")
+    for idx, key in enumerate(["k1", "k2"]):
+        cache.upload_file(src, key, META)
+        os.utime(cache._meta_path(key), (idx, idx))
+    # k1 used recently, k2 is now the least recently used
+    assert cache.has_object_matching("k1", META)
+    cache.upload_file(src, "k3", META)
+    assert cache.has_object_matching("k1", META)
+    assert not cache.has_object_matching("k2", META)
+    assert cache.has_object_matching("k3", META)
+
+
+def test_local_cache_scans_only_to_evict(tmp_path: Path, monkeypatch):
+    cache = LocalCache(tmp_path / "cache", max_size=100)
+    scans = []
+    scan = cache.scan
+    monkeypatch.setattr(cache, "scan", lambda: scans.append(1) or scan())
+    src = tmp_path / "video.webm"
+    src.write_bytes(b"0123456789")
+
+    for idx in range(9):
+        cache.upload_file(src, f"k{idx}", META)
+    # first upload only
+    assert len(scans) == 1
+    assert cache.total_size == 90
+
+    # replacing an object doesn't change total
+    cache.upload_file(src, "k0", META)
+    assert cache.total_size == 90
+
+    # above max_size: evicted down to 90%
+    cache.upload_file(src, "k9", META)
+    cache.upload_file(src, "k10", META)
+    assert len(scans) == 2
+    assert cache.total_size == 90
+
+
+def test_partial_cache_backend():
+    class PartialCache(OptimizationCache):
+        def check(self) -> bool:
+            return True
+
+    with pytest.raises(TypeError):
+        PartialCache()  # pyright: ignore[reportAbstractUsage]
+
+
+class Creator:
+    def __init__(self):
+        self.items = []
+
+    def add_item_for(self, **kwargs):
+        # file must be on disk when handed to libzim, which deletes it once added
+        self.items.append((kwargs, kwargs["fpath"].read_bytes()))
+
+
+def test_funnel_from_cache(
+    tmp_path: Path, scraper_generator: Callable[..., Kolibri2Zim]
+):
+    scraper = scraper_generator()
+    scraper.optimization_cache = LocalCache(tmp_path / "cache")
+    scraper.creator = Creator()
+    scraper.creator_lock = threading.Lock()
+    preset = VideoWebmLow()
+    src = tmp_path / "video.webm"
+    src.write_bytes(b"encoded")
+
+    assert not scraper.funnel_from_cache("ab12", "ab12.webm", "abcd", preset)
+    scraper.optimization_cache.upload_file(
+        src,
+        scraper.cache_key_for("ab12", preset),
+        meta={"checksum": "abcd", "encoder_version": str(preset.VERSION)},
+    )
+    # outdated source
+    assert not scraper.funnel_from_cache("ab12", "ab12.webm", "efgh", preset)
+    assert scraper.creator.items == []
+
+    assert scraper.funnel_from_cache("ab12", "ab12.webm", "abcd", preset)
+    [(kwargs, content)] = scraper.creator.items
+    # added from a temp file in build_dir, not from memory
+    assert "content" not in kwargs
+    assert kwargs["fpath"].parent == scraper.build_dir
+    assert kwargs["fpath"].suffix == ".webm"
+    assert kwargs["delete_fpath"]
+    assert kwargs["path"] == "ab12.webm"
+    assert kwargs["mimetype"] == preset.mimetype
+    assert content == b"encoded"
+    labels = {"preset": "VideoWebmLow"}
+    assert scraper.metrics.get_counter("cache_lookups", **labels, result="hit") == 1
+    assert scraper.metrics.get_counter("cache_lookups", **labels, result="miss") == 2
@@ -0,0 +1,30 @@
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim.database import File, KolibriDB, Node
+
+
+def test_records(tmp_path):
+    channel = generate_channel(
+        tmp_path, depth=1, fanout=2, kinds={"document": 1}, with_files=False
+    )
+    db = KolibriDB(channel.db_path)
+    child = next(db.get_node_children(db.root_id))
+    assert isinstance(child, Node)
+    assert child.kind == "document"
+    assert child.right == child.left + 1
+
+    node = db.get_node(child.id, with_parents=True)
+    assert node.title == child.title
+    assert [parent.id for parent in node.parents] == [db.root_id]
+    assert node.parents_count == 1
+    assert node.as_dict()["title"] == child.title
+
+    file = db.get_node_file(child.id)
+    assert isinstance(file, File)
+    assert file.ext == "pdf"
+    assert file.target is None
+
+
+def test_get_missing_node(tmp_path):
+    channel = generate_channel(tmp_path, depth=1, fanout=2, with_files=False)
+    assert KolibriDB(channel.db_path).get_node("missing") is None
@@ -0,0 +1,86 @@
+import io
+import zipfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from kolibri2zim.documents import (
+    EpubDocument,
+    PdfDocument,
+    get_pdf_tool,
+    get_tool_version,
+    optimize_document,
+    optimize_epub_image,
+)
+from kolibri2zim.scraper import encoder_version_for
+
+
+def image_bytes(fmt: str, size: tuple[int, int]) -> bytes:
+    data = io.BytesIO()
+    # noise compresses badly: optimization is noticeable
+    Image.effect_noise(size, 64).convert("RGB").save(data, fmt, quality=100)
+    return data.getvalue()
+
+
+def test_optimize_epub_image_downsizes():
+    data = image_bytes("JPEG", (3200, 1600))
+    optimized = optimize_epub_image(data, EpubDocument())
+    assert len(optimized) < len(data)
+    with Image.open(io.BytesIO(optimized)) as image:
+        assert image.format == "JPEG"
+        assert image.size == (1600, 800)
+
+
+@pytest.mark.parametrize("data", [b"not an image", image_bytes("GIF", (10, 10))])
+def test_optimize_epub_image_keeps_others(data: bytes):
+    assert optimize_epub_image(data, EpubDocument()) == data
+
+
+def test_optimize_epub(tmp_path: Path):
+    src, dst = tmp_path / "src.epub", tmp_path / "dst.epub"
+    with zipfile.ZipFile(src, "w") as ark:
+        ark.writestr("mimetype", "application/epub+zip", zipfile.ZIP_STORED)
+        ark.writestr("OEBPS/page.xhtml", "<img src='cover.jpg'/>", zipfile.ZIP_DEFLATED)
+        ark.writestr("OEBPS/cover.jpg", image_bytes("JPEG", (800, 600)))
+
+    optimize_document(src, dst, EpubDocument())
+
+    assert dst.stat().st_size < src.stat().st_size
+    with zipfile.ZipFile(dst) as ark:
+        assert ark.namelist() == ["mimetype", "OEBPS/page.xhtml", "OEBPS/cover.jpg"]
+        assert ark.getinfo("mimetype").compress_type == zipfile.ZIP_STORED
+        assert ark.read("mimetype") == b"application/epub+zip"
+
+
+@pytest.mark.skipif(not get_pdf_tool(), reason="Neither gs nor qpdf installed")
+def test_optimize_pdf(tmp_path: Path):
+    src, dst = tmp_path / "src.pdf", tmp_path / "dst.pdf"
+    Image.effect_noise((2000, 2000), 64).convert("RGB").save(src, "PDF")
+    optimize_document(src, dst, PdfDocument())
+    assert 0 < dst.stat().st_size <= src.stat().st_size
+
+
+def test_pdf_cache_depends_on_tool(scraper_generator, monkeypatch):
+    monkeypatch.setattr(
+        "kolibri2zim.documents.get_tool_version",
+        lambda tool: {"gs": "10.00.0", "qpdf": "11.3.0"}[tool],
+    )
+    scraper = scraper_generator()
+    gs_doc, qpdf_doc = PdfDocument(tool="gs"), PdfDocument(tool="qpdf")
+
+    # lossy and lossless outputs are cached apart and checked against tool version
+    assert scraper.cache_key_for("abcd", gs_doc) == "a/b/abcd/pdfdocument_gs"
+    assert scraper.cache_key_for("abcd", qpdf_doc) == "a/b/abcd/pdfdocument_qpdf"
+    assert encoder_version_for(gs_doc) == "1-gs-10.00.0"
+    assert encoder_version_for(qpdf_doc) == "1-qpdf-11.3.0"
+    # other presets are unchanged
+    assert scraper.cache_key_for("abcd", EpubDocument()) == "a/b/abcd/epubdocument"
+    assert encoder_version_for(EpubDocument()) == "1"
+
+
+def test_get_tool_version():
+    assert get_tool_version(None) is None
+    assert get_tool_version("missing-pdf-tool") is None
+    if get_pdf_tool():
+        assert get_tool_version(get_pdf_tool())
@@ -0,0 +1,80 @@
+import http.server
+import re
+import threading
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+import requests
+
+from kolibri2zim.debug import RangeNotSupportedError, download_segmented
+from kolibri2zim.metrics import Metrics
+
+CONTENT = bytes(range(256)) * 1000
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    support_ranges = True
+    not_found = False
+    nb_requests = 0
+
+    def log_message(self, *args, **kwargs): ...
+
+    def do_GET(self):  # noqa: N802
+        RangeHandler.nb_requests += 1
+        if self.not_found:
+            self.send_error(404)
+            return
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if not self.support_ranges or not match:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(CONTENT)))
+            self.end_headers()
+            self.wfile.write(CONTENT)
+            return
+        start, end = int(match.group(1)), int(match.group(2))
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(CONTENT[start : end + 1])
+
+
+@pytest.fixture()
+def http_server() -> Generator[http.server.ThreadingHTTPServer, None, None]:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    RangeHandler.support_ranges = True
+    RangeHandler.not_found = False
+    RangeHandler.nb_requests = 0
+
+
+@pytest.mark.parametrize("nb_segments", [1, 3, 7, 16])
+def test_download_segmented(http_server, tmp_path: Path, nb_segments: int):
+    fpath = tmp_path / "file.bin"
+    url = f"http://127.0.0.1:{http_server.server_port}/file.bin"
+    metrics = Metrics()
+    download_segmented(url, fpath, len(CONTENT), nb_segments, metrics=metrics)
+    assert fpath.read_bytes() == CONTENT
+    assert metrics.get_counter("download_bytes") == len(CONTENT)
+
+
+def test_download_segmented_no_range_support(http_server, tmp_path: Path):
+    RangeHandler.support_ranges = False
+    fpath = tmp_path / "file.bin"
+    url = f"http://127.0.0.1:{http_server.server_port}/file.bin"
+    with pytest.raises(RangeNotSupportedError):
+        download_segmented(url, fpath, len(CONTENT), 4, metrics=Metrics())
+    assert not fpath.exists()
+
+
+def test_download_segment_no_retry_on_permanent_error(http_server, tmp_path: Path):
+    RangeHandler.not_found = True
+    fpath = tmp_path / "file.bin"
+    url = f"http://127.0.0.1:{http_server.server_port}/file.bin"
+    with pytest.raises(requests.HTTPError):
+        download_segmented(url, fpath, len(CONTENT), 1, metrics=Metrics())
+    assert RangeHandler.nb_requests == 1
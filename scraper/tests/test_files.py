@@ -0,0 +1,97 @@
+import concurrent.futures as cf
+import threading
+from collections.abc import Callable
+
+import pytest
+
+from kolibri2zim.scraper import Kolibri2Zim
+from kolibri2zim.storage import ContentStorage
+
+
+class SlowStorage(ContentStorage):
+    """remote storage whose downloads wait for `release`, failing `failures` times"""
+
+    def __init__(self, failures: int = 0):
+        self.release = threading.Event()
+        self.downloads = 0
+        self.failures = failures
+
+    def download_db(self, channel_id, fpath):
+        raise NotImplementedError()
+
+    def get_size_and_mime(self, file_id, ext):  # noqa: ARG002
+        return 4, "text/plain"
+
+    def download_to(self, file_id, ext, fpath=None, byte_stream=None):  # noqa: ARG002
+        self.downloads += 1
+        self.release.wait(timeout=5)
+        if self.downloads <= self.failures:
+            raise OSError("download failed")
+        byte_stream.write(b"data")
+
+
+class Creator:
+    def __init__(self):
+        self.paths = []
+
+    def add_item_for(self, path, **kwargs):  # noqa: ARG002
+        self.paths.append(path)
+
+
+def funnel_concurrently(scraper: Kolibri2Zim, nb_requests: int) -> list[cf.Future]:
+    with cf.ThreadPoolExecutor(nb_requests) as executor:
+        futures = [
+            executor.submit(scraper.funnel_file, "abcd", "vtt")
+            for _ in range(nb_requests)
+        ]
+        # let all requests reach the registry before the download completes
+        while scraper.nb_files_coalesced < nb_requests - 1:
+            threading.Event().wait(0.01)
+        scraper.storage.release.set()
+    return futures
+
+
+def test_funnel_file_coalesced(scraper_generator: Callable[..., Kolibri2Zim]):
+    scraper = scraper_generator()
+    scraper.storage = SlowStorage()
+    scraper.creator = Creator()
+    scraper.creator_lock = threading.Lock()
+
+    for future in funnel_concurrently(scraper, 4):
+        future.result()
+    assert scraper.storage.downloads == 1
+    assert scraper.creator.paths == ["abcd.vtt"]
+    assert scraper.nb_files_coalesced == 3
+    assert scraper.metrics.get_counter("files_coalesced") == 3
+    # only files in flight have a future
+    assert scraper.files_registry == {}
+    assert scraper.files_added == {("abcd", "abcd.vtt")}
+
+    # later requests are not downloaded again either
+    scraper.funnel_file("abcd", "vtt")
+    assert scraper.storage.downloads == 1
+    assert scraper.nb_files_coalesced == 4
+
+    # same file at another path is another entry
+    scraper.funnel_file("abcd", "vtt", path_prefix="files/")
+    assert scraper.creator.paths == ["abcd.vtt", "files/abcd.vtt"]
+
+
+def test_funnel_file_after_failure(scraper_generator: Callable[..., Kolibri2Zim]):
+    scraper = scraper_generator()
+    scraper.storage = SlowStorage(failures=1)
+    scraper.creator = Creator()
+    scraper.creator_lock = threading.Lock()
+
+    # waiting requests share owner's failure
+    for future in funnel_concurrently(scraper, 2):
+        with pytest.raises(OSError, match="download failed"):
+            future.result()
+    assert scraper.creator.paths == []
+    assert scraper.files_registry == {}
+    assert scraper.files_added == set()
+
+    # failed file is attempted again
+    scraper.funnel_file("abcd", "vtt")
+    assert scraper.storage.downloads == 2
+    assert scraper.creator.paths == ["abcd.vtt"]
@@ -0,0 +1,84 @@
+import io
+import threading
+import zipfile
+from collections.abc import Callable
+
+import pytest
+
+from kolibri2zim.scraper import Kolibri2Zim, should_compress
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(64)
+MP4 = b"\x00\x00\x00\x18ftypmp42" + bytes(64)
+
+
+@pytest.mark.parametrize(
+    "mimetype, content, expected",
+    [
+        ("text/html", b"<html></html>", True),
+        ("application/javascript", b"var a;", True),
+        ("image/svg+xml", b"<svg></svg>", True),
+        ("font/ttf", b"\x00\x01\x00\x00", True),
+        ("image/png", PNG, False),
+        ("video/mp4", MP4, False),
+        ("font/woff2", b"wOF2" + bytes(16), False),
+        ("application/octet-stream", bytes(16), False),
+        # magic wins over a misleading mimetype
+        ("text/plain", b"\x1f\x8b\x08" + bytes(16), False),
+    ],
+)
+def test_should_compress(mimetype: str, content: bytes, expected):
+    assert should_compress(mimetype, content) is expected
+
+
+class FakeCreator:
+    def __init__(self):
+        self.items = {}
+        self.redirects = {}
+
+    def add_item_for(self, path, **kwargs):
+        self.items[path] = kwargs
+
+    def add_redirect(self, path, target_path, **kwargs):  # noqa: ARG002
+        self.redirects[path] = target_path
+
+
+@pytest.fixture()
+def html5_ark() -> zipfile.ZipFile:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as ark:
+        ark.writestr("index.html", "<html><img src='a.png'/></html>")
+        ark.writestr("a.png", PNG)
+        ark.writestr("img/b.png", PNG)
+        ark.writestr("app.js", "var a = 1;")
+    return zipfile.ZipFile(data)
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+def test_add_html5_member(
+    scraper_generator: Callable[..., Kolibri2Zim], html5_ark, dedup
+):
+    scraper = scraper_generator(additional_options={"dedup_html_files": dedup})
+    scraper.creator = FakeCreator()
+    scraper.creator_lock = threading.Lock()
+    for member in html5_ark.namelist():
+        scraper.add_html5_member(html5_ark, "slug", member)
+
+    creator = scraper.creator
+    if not dedup:
+        assert creator.items["files/slug/"]["is_front"]
+        assert creator.items["files/slug/"]["should_compress"]
+        assert creator.items["files/slug/a.png"]["mimetype"] == "image/png"
+        assert not creator.items["files/slug/a.png"]["should_compress"]
+        assert creator.items["files/slug/app.js"]["should_compress"]
+        return
+
+    # identical PNGs are added once
+    assert len(creator.items) == 3
+    assert (
+        creator.redirects["files/slug/a.png"]
+        == creator.redirects["files/slug/img/b.png"]
+    )
+    assert all(
+        item["mimetype"] != "image/png" or not item["should_compress"]
+        for item in creator.items.values()
+    )
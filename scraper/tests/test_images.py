@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from kolibri2zim.images import WebpThumbnail, optimize_thumbnail
+
+
+@pytest.mark.parametrize(
+    "mode, fmt, size, expected_size",
+    [
+        ("RGB", "JPEG", (1600, 900), (540, 304)),
+        ("RGBA", "PNG", (1200, 900), (540, 405)),
+        ("P", "GIF", (900, 1200), (304, 405)),
+        # never upscaled
+        ("RGB", "PNG", (400, 225), (400, 225)),
+    ],
+)
+def test_optimize_thumbnail(tmp_path: Path, mode, fmt, size, expected_size):
+    src = tmp_path / f"thumbnail.{fmt.lower()}"
+    dst = tmp_path / "thumbnail.webp"
+    Image.new(mode, size).save(src, fmt)
+
+    optimize_thumbnail(src, dst, WebpThumbnail())
+
+    with Image.open(dst) as image:
+        assert image.format == "WEBP"
+        assert image.size == expected_size
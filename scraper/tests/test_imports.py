@@ -0,0 +1,44 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+SRC_DIR = pathlib.Path(__file__).resolve().parent.parent / "src"
+# entrypoint's cumulative import time, in microseconds. It's ~25ms when scraper's
+# dependencies are deferred, ~650ms otherwise
+IMPORT_BUDGET = 150_000
+
+
+def import_times(module: str) -> dict[str, int]:
+    """cumulative import time (µs) of each module imported by module, per name"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(SRC_DIR), env.get("PYTHONPATH")])
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_entrypoint_imports():
+    times = import_times("kolibri2zim.entrypoint")
+    assert times["kolibri2zim.entrypoint"] < IMPORT_BUDGET
+    for module in ("kolibri2zim.scraper", "boto3", "bs4", "jinja2", "libzim"):
+        assert module not in times
+
+
+def test_scraper_defers_s3_imports():
+    times = import_times("kolibri2zim.scraper")
+    assert "kiwixstorage" not in times
+    assert "boto3" not in times
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from kolibri2zim.metrics import Histogram, Metrics, TimedLock
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.as_dict() == {
+        "count": 4,
+        "sum": 56.5,
+        "min": 0.5,
+        "max": 50,
+        "mean": 14.125,
+    }
+
+
+def test_metrics_summary(tmp_path: Path):
+    registry = Metrics()
+    registry.inc("cache_lookups", result="hit")
+    registry.inc("cache_lookups", result="hit")
+    registry.inc("cache_lookups", result="miss")
+    with registry.timer("node_seconds", kind="video"):
+        ...
+    registry.observe("node_seconds", 2, kind="topic")
+
+    assert registry.get_counter("cache_lookups", result="hit") == 2
+    assert registry.get_counter("cache_lookups", result="other") == 0
+    assert registry.get_histogram_sum("node_seconds") >= 2
+
+    registry.write_json(tmp_path / "metrics.json")
+    summary = json.loads((tmp_path / "metrics.json").read_text())
+    assert summary["counters"] == [
+        {"name": "cache_lookups", "labels": {"result": "hit"}, "value": 2},
+        {"name": "cache_lookups", "labels": {"result": "miss"}, "value": 1},
+    ]
+    assert [(item["labels"], item["count"]) for item in summary["histograms"]] == [
+        ({"kind": "topic"}, 1),
+        ({"kind": "video"}, 1),
+    ]
+
+
+def test_metrics_prometheus(tmp_path: Path):
+    registry = Metrics()
+    registry.inc("download_bytes", 1024)
+    registry.observe("node_seconds", 0.2, kind="topic")
+    registry.write_prometheus(tmp_path / "metrics.prom")
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert "kolibri2zim_download_bytes_total 1024" in lines
+    assert 'kolibri2zim_node_seconds_bucket{kind="topic",le="0.1"} 0' in lines
+    assert 'kolibri2zim_node_seconds_bucket{kind="topic",le="0.5"} 1' in lines
+    assert 'kolibri2zim_node_seconds_bucket{kind="topic",le="+Inf"} 1' in lines
+    assert 'kolibri2zim_node_seconds_count{kind="topic"} 1' in lines
+
+
+def test_timed_lock_records_wait():
+    registry = Metrics()
+    lock = TimedLock("test_lock", registry)
+
+    lock.acquire()
+    waiter = threading.Thread(target=lambda: lock.acquire() and lock.release())
+    waiter.start()
+    time.sleep(0.05)
+    lock.release()
+    waiter.join()
+
+    assert registry.get_histogram_sum("test_lock_wait_seconds") >= 0.04
+
+
+def test_metrics_parent():
+    batch = Metrics()
+    first, second = Metrics(parent=batch), Metrics(parent=batch)
+    first.inc("download_bytes", 10)
+    second.inc("download_bytes", 5)
+    second.observe("node_seconds", 2, kind="topic")
+
+    # each registry only has its own updates, parent has all of them
+    assert first.get_counter("download_bytes") == 10
+    assert second.get_counter("download_bytes") == 5
+    assert first.get_histogram_sum("node_seconds") == 0
+    assert batch.get_counter("download_bytes") == 15
+    assert batch.get_histogram_sum("node_seconds") == 2
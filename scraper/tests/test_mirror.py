@@ -0,0 +1,116 @@
+import functools
+import http.server
+import json
+import re
+import threading
+
+import pytest
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim import mirror as mirror_module
+from kolibri2zim.metrics import Metrics
+from kolibri2zim.mirror import ChecksumMismatchError, download_resumable, mirror
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """serves files, honoring `Range: bytes={start}-` requests"""
+
+    def log_message(self, *args):  # noqa: ARG002
+        return
+
+    def do_GET(self):  # noqa: N802
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        fpath = self.translate_path(self.path)
+        if not match:
+            return super().do_GET()
+        with open(fpath, "rb") as fh:
+            data = fh.read()
+        start = int(match.group(1))
+        if start >= len(data):
+            self.send_response(416)
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+
+@pytest.fixture
+def studio(tmp_path, monkeypatch):
+    channel = generate_channel(
+        tmp_path / "studio", depth=1, fanout=3, with_thumbnails=False
+    )
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(RangeHandler, directory=channel.root)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        mirror_module, "STUDIO_URL", f"http://127.0.0.1:{server.server_address[1]}"
+    )
+    yield channel
+    server.shutdown()
+
+
+def storage_files(root):
+    return sorted(
+        fpath.relative_to(root) for fpath in root.glob("content/storage/*/*/*")
+    )
+
+
+def test_mirror(tmp_path, studio):
+    root = tmp_path / "mirror"
+    assert mirror(studio.channel_id, root, nb_threads=2)
+
+    assert storage_files(root) == storage_files(studio.root)
+    for fpath in storage_files(root):
+        assert (root / fpath).read_bytes() == (studio.root / fpath).read_bytes()
+    manifest = json.loads(
+        (root / "content" / "manifests" / f"{studio.channel_id}.json").read_text()
+    )
+    assert len(manifest["files"]) == studio.nb_files
+    assert manifest["failed"] == []
+
+
+def test_mirror_skips_present_files(tmp_path, studio, monkeypatch):
+    root = tmp_path / "mirror"
+    assert mirror(studio.channel_id, root)
+
+    def fail(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError("Unexpected download")
+
+    monkeypatch.setattr(mirror_module, "download_resumable", fail)
+    assert mirror(studio.channel_id, root, verify=True)
+
+
+def test_download_resumes_part_file(tmp_path, studio):
+    relpath = storage_files(studio.root)[0]
+    content = (studio.root / relpath).read_bytes()
+    fpath = tmp_path / relpath.name
+    fpath.with_name(f"{fpath.name}.part").write_bytes(content[:1000])
+
+    download_resumable(
+        f"{mirror_module.STUDIO_URL}/{relpath.as_posix()}",
+        fpath,
+        relpath.stem,
+        metrics=Metrics(),
+    )
+    assert fpath.read_bytes() == content
+    assert not fpath.with_name(f"{fpath.name}.part").exists()
+
+
+def test_download_checks_md5(tmp_path, studio):
+    relpath = storage_files(studio.root)[0]
+    (studio.root / relpath).write_bytes(b"corrupted")
+    fpath = tmp_path / relpath.name
+
+    with pytest.raises(ChecksumMismatchError):
+        download_resumable(
+            f"{mirror_module.STUDIO_URL}/{relpath.as_posix()}",
+            fpath,
+            relpath.stem,
+            metrics=Metrics(),
+        )
+    assert not fpath.exists()
+    assert not mirror(studio.channel_id, tmp_path / "mirror")
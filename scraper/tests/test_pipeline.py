@@ -0,0 +1,174 @@
+import concurrent.futures as cf
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from kolibri2zim.pipeline import CPUBudget, VideoJob, VideoPipeline
+from kolibri2zim.scheduler import TransientDownloadError
+
+
+def make_job(idx: int) -> VideoJob:
+    return VideoJob(
+        file_id=f"fid{idx}",
+        local_file_id=f"lid{idx}",
+        ext="mp4",
+        checksum=f"chk{idx}",
+        path=f"lid{idx}.webm",
+        preset=None,
+    )
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 4])
+def test_pipeline_caps_jobs_in_flight(capacity: int):
+    lock = threading.Lock()
+    in_flight = max_in_flight = 0
+    added = []
+    encoder = cf.ThreadPoolExecutor(max_workers=2)
+
+    def fetch(job):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        return Path(f"{job.local_file_id}.mp4"), Path(job.path)
+
+    def encode(job, src, dst):  # noqa: ARG001
+        return encoder.submit(time.sleep, 0.01)
+
+    def add(job, dst):  # noqa: ARG001
+        nonlocal in_flight
+        with lock:
+            in_flight -= 1
+        added.append(job.path)
+
+    pipeline = VideoPipeline(
+        fetch=fetch,
+        encode=encode,
+        add=add,
+        nb_fetchers=2,
+        capacity=capacity,
+        max_queued=3,
+    )
+    futures = [pipeline.submit(make_job(idx)) for idx in range(20)]
+    pipeline.shutdown()
+    encoder.shutdown()
+
+    assert all(future.done() and not future.exception() for future in futures)
+    assert sorted(added) == sorted(f"lid{idx}.webm" for idx in range(20))
+    assert max_in_flight <= capacity
+
+
+def test_pipeline_reports_failures():
+    encoder = cf.ThreadPoolExecutor(max_workers=1)
+
+    def fetch(job):
+        if job.file_id == "fid1":
+            raise OSError("download failed")
+        return Path("src"), Path(job.path)
+
+    def encode(job, src, dst):  # noqa: ARG001
+        if job.file_id == "fid2":
+            return encoder.submit(lambda: 1 / 0)
+        return encoder.submit(lambda: None)
+
+    pipeline = VideoPipeline(
+        fetch=fetch,
+        encode=encode,
+        add=lambda job, dst: None,  # noqa: ARG005
+        nb_fetchers=1,
+        capacity=1,
+        max_queued=1,
+    )
+    futures = [pipeline.submit(make_job(idx)) for idx in range(3)]
+    pipeline.shutdown()
+    encoder.shutdown()
+
+    assert futures[0].exception() is None
+    assert isinstance(futures[1].exception(), OSError)
+    assert isinstance(futures[2].exception(), ZeroDivisionError)
+
+
+def test_pipeline_requeues_transient_failures():
+    encoder = cf.ThreadPoolExecutor(max_workers=1)
+    fetches = []
+    fetched = threading.Event()
+
+    def fetch(job):
+        fetches.append(job.file_id)
+        if job.file_id == "fid0" and job.attempt == 1:
+            raise TransientDownloadError("HTTP 503", retry_after=0.2)
+        if job.file_id == "fid1":
+            raise TransientDownloadError("HTTP 503", retry_after=0.01)
+        fetched.set()
+        return Path("src"), Path(job.path)
+
+    pipeline = VideoPipeline(
+        fetch=fetch,
+        encode=lambda job, src, dst: encoder.submit(lambda: None),  # noqa: ARG005
+        add=lambda job, dst: None,  # noqa: ARG005
+        nb_fetchers=1,
+        capacity=1,
+        max_queued=4,
+        max_attempts=3,
+    )
+    futures = [pipeline.submit(make_job(idx)) for idx in range(3)]
+    # single fetcher isn't held by the job awaiting its retry (in 0.2s)
+    assert fetched.wait(0.15)
+    pipeline.shutdown()
+    encoder.shutdown()
+
+    assert futures[0].exception() is None
+    assert fetches.count("fid0") == 2
+    # failed for good after max_attempts
+    assert isinstance(futures[1].exception(), TransientDownloadError)
+    assert fetches.count("fid1") == 3
+    assert futures[2].exception() is None
+
+
+def test_cpu_budget_shares_threads():
+    budget = CPUBudget(budget=9, nb_slots=4)
+    # remaining threads are shared with free slots, last one gets the rest
+    allocations = [budget.acquire() for _ in range(4)]
+    assert [allocation.threads for allocation in allocations] == [2, 2, 2, 3]
+    assert budget.threads_in_use == 9
+    budget.release(allocations[3])
+    assert budget.threads_in_use == 6
+    assert budget.nb_running == 3
+    assert budget.nb_encodes == 1
+
+
+def test_cpu_budget_concurrent_acquires():
+    budget = CPUBudget(budget=16, nb_slots=8)
+    # two sources fetched while none is queued: both start without waiting
+    acquired = []
+    threads = [
+        threading.Thread(target=lambda: acquired.append(budget.acquire()))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(1)
+    assert [allocation.threads for allocation in acquired] == [2, 2]
+    assert budget.nb_running == 2
+
+
+def test_cpu_budget_never_exceeded():
+    budget = CPUBudget(budget=2, nb_slots=4)
+    allocations = [budget.acquire() for _ in range(2)]
+    assert [allocation.threads for allocation in allocations] == [1, 1]
+    assert budget.threads_in_use == 2
+
+    # slots are free but budget is used up: waits for a release
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(budget.acquire()))
+    thread.start()
+    thread.join(0.1)
+    assert not acquired
+    budget.release(allocations[0])
+    thread.join(1)
+    assert [allocation.threads for allocation in acquired] == [1]
+    assert budget.threads_in_use == 2
+    assert 0 <= budget.utilization <= 1
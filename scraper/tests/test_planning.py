@@ -0,0 +1,58 @@
+import pytest
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim.database import KolibriDB
+from kolibri2zim.planning import NODE_OVERHEAD_BYTES, OUTPUT_RATIOS, Plan
+
+
+def test_plan_accounting():
+    plan = Plan()
+    plan.add_node("video")
+    plan.add_file("video", 100)
+    plan.add_optimized_file("video", 2**20, "VideoWebmLow", cached=False)
+    plan.add_optimized_file("video", 2**20, "VideoWebmLow", cached=True)
+
+    summary = plan.as_dict()
+    assert summary["nodes"] == 1
+    assert summary["kinds"]["video"] == {"nodes": 1, "files": 3, "bytes": 100 + 2**21}
+    assert summary["optimizations"]["VideoWebmLow"]["cached"] == 1
+    assert summary["cache_coverage"] == 0.5
+    # cached file is neither downloaded from Studio nor re-encoded
+    assert summary["download_bytes"] == 100 + 2**20
+    optimized_size = int(2**20 * OUTPUT_RATIOS["VideoWebmLow"])
+    assert summary["cache_download_bytes"] == optimized_size
+    assert summary["zim_size"] == NODE_OVERHEAD_BYTES + 100 + 2 * optimized_size
+    assert summary["cpu_hours"] > 0
+
+
+def test_plan_without_optimizations():
+    assert Plan().cache_coverage is None
+
+
+@pytest.mark.parametrize(
+    "options, preset",
+    [
+        ({"use_webm": True}, "VideoWebmHigh"),
+        ({"use_webm": True, "low_quality": True}, "VideoWebmLow"),
+        ({"low_quality": True}, "VideoMp4Low"),
+        ({}, None),
+    ],
+)
+def test_compute_plan(tmp_path, scraper_generator, options, preset):
+    channel = generate_channel(
+        tmp_path, depth=2, fanout=3, kinds={"video": 1}, with_files=False
+    )
+    scraper = scraper_generator(additional_options=options)
+    scraper.db = KolibriDB(channel.db_path)
+    scraper.root_id = scraper.db.root_id
+
+    plan = scraper.compute_plan()
+
+    assert plan.kinds["topic"]["nodes"] == 4
+    assert plan.kinds["video"]["nodes"] == 9
+    assert plan.presets["WebpThumbnail"]["files"] == 9
+    if preset:
+        assert plan.presets[preset]["files"] == 9
+    else:
+        assert set(plan.presets) == {"WebpThumbnail"}
+    assert plan.download_bytes == channel.total_bytes
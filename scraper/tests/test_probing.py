@@ -0,0 +1,62 @@
+import pytest
+
+from kolibri2zim.probing import PRESETS_CONSTRAINTS, get_compliance_issues
+
+
+def media_info(
+    vcodec="h264",
+    width=480,
+    vbitrate="280000",
+    acodec="aac",
+    abitrate="48000",
+    fbitrate="340000",
+):
+    streams = [{"codec_type": "video", "codec_name": vcodec, "width": width}]
+    if vbitrate:
+        streams[0]["bit_rate"] = vbitrate
+    if acodec:
+        streams.append({"codec_type": "audio", "codec_name": acodec})
+        if abitrate:
+            streams[1]["bit_rate"] = abitrate
+    return {"streams": streams, "format": {"bit_rate": fbitrate}}
+
+
+@pytest.mark.parametrize(
+    "preset_name, info, expected_issues",
+    [
+        ("VideoMp4Low", media_info(), []),
+        ("VideoMp4Low", media_info(acodec=None), []),
+        ("VideoMp4Low", media_info(width=1280), ["width 1280"]),
+        ("VideoMp4Low", media_info(vbitrate="1000000"), ["video bitrate 1000000"]),
+        ("VideoMp4Low", media_info(abitrate="128000"), ["audio bitrate 128000"]),
+        # no per-stream bitrate, overall one (340k) is within 300k+48k
+        ("VideoMp4Low", media_info(vbitrate=None), []),
+        ("VideoMp4Low", media_info(vcodec="hevc"), ["video codec hevc"]),
+        (
+            "VideoWebmLow",
+            media_info(),
+            ["video codec h264", "audio codec aac", "video bitrate 280000"],
+        ),
+        (
+            "VideoWebmLow",
+            media_info(vcodec="vp8", acodec="vorbis", vbitrate=None),
+            ["overall bitrate 340000"],
+        ),
+        (
+            "VideoWebmLow",
+            media_info(vcodec="vp8", acodec="vorbis", vbitrate=None, fbitrate="170000"),
+            [],
+        ),
+        ("VideoWebmHigh", media_info(vcodec="vp8", acodec="vorbis", width=1920), []),
+        (
+            "VideoWebmHigh",
+            media_info(vcodec="vp9", acodec="opus"),
+            ["video codec vp9", "audio codec opus"],
+        ),
+        ("VideoWebmHigh", {"streams": []}, ["0 video streams"]),
+    ],
+)
+def test_compliance_issues(preset_name, info, expected_issues):
+    assert (
+        get_compliance_issues(info, PRESETS_CONSTRAINTS[preset_name]) == expected_issues
+    )
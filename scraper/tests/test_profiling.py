@@ -0,0 +1,89 @@
+import pstats
+import threading
+import time
+from pathlib import Path
+
+from kolibri2zim.profiling import Profiler
+
+
+def busy_video(duration: float):
+    ends_on = time.monotonic() + duration
+    while time.monotonic() < ends_on:
+        sum(idx * idx for idx in range(100))
+
+
+def busy_topic(duration: float):
+    ends_on = time.monotonic() + duration
+    while time.monotonic() < ends_on:
+        sum(idx * idx for idx in range(100))
+
+
+def functions(stats: pstats.Stats) -> set[str]:
+    return {func[2] for func in stats.stats}  # pyright: ignore
+
+
+def test_profiler_overlapping_threads(tmp_path: Path):
+    profiler = Profiler(interval=0.001)
+    profiler.start()
+    # all threads are profiling at the same time
+    barrier = threading.Barrier(3)
+    errors = []
+
+    def work(category: str, func):
+        try:
+            with profiler.profile(category):
+                barrier.wait(timeout=5)
+                func(0.2)
+                # nested calls are accounted to outer category
+                with profiler.profile("other"):
+                    func(0.05)
+                barrier.wait(timeout=5)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [
+        threading.Thread(target=work, args=args)
+        for args in (
+            ("add_video_node", busy_video),
+            ("add_video_node", busy_video),
+            ("add_topic_node", busy_topic),
+        )
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    profiler.stop()
+    assert not errors
+
+    # each thread's work is attributed to its own category
+    video_stats = profiler.get_stats("add_video_node")
+    topic_stats = profiler.get_stats("add_topic_node")
+    assert video_stats is not None
+    assert topic_stats is not None
+    assert "busy_video" in functions(video_stats)
+    assert "busy_topic" not in functions(video_stats)
+    assert "busy_topic" in functions(topic_stats)
+    assert "busy_video" not in functions(topic_stats)
+    # stacks stop at the function which entered the block
+    assert "run" not in functions(video_stats)
+    assert profiler.get_stats("other") is None
+
+    profiler.dump(tmp_path, "channel_profile")
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "channel_profile.txt",
+        "channel_profile_add_topic_node.pstats",
+        "channel_profile_add_video_node.pstats",
+        "channel_profile_all.pstats",
+    ]
+    assert "busy_video" in (tmp_path / "channel_profile.txt").read_text()
+    assert "work" in functions(
+        pstats.Stats(str(tmp_path / "channel_profile_all.pstats"))
+    )
+
+
+def test_profiler_without_sampling():
+    profiler = Profiler()
+    with profiler.profile("add_topic_node"):
+        pass
+    assert profiler.get_stats() is None
@@ -0,0 +1,46 @@
+import json
+import time
+from pathlib import Path
+
+from kolibri2zim.progress import Progress
+
+
+def test_progress_stats(tmp_path: Path):
+    progress = Progress(stats_path=tmp_path / "stats.json")
+    assert progress.eta is None
+
+    for nb_bytes in (100, 300, 0):
+        progress.add(nb_bytes)
+    progress.started_on = time.monotonic() - 10
+    progress.item_done(100)
+    progress.item_done(0)
+
+    # 100 bytes of 400 done in 10s: 30s to go
+    assert round(progress.eta) == 30
+    progress.write()
+    assert json.loads((tmp_path / "stats.json").read_text()) == {
+        "done": 2,
+        "total": 3,
+        "done_bytes": 100,
+        "total_bytes": 400,
+        "eta": 30,
+    }
+
+
+def test_progress_eta_without_bytes():
+    progress = Progress()
+    progress.add()
+    progress.add()
+    progress.started_on = time.monotonic() - 10
+    progress.item_done()
+    assert round(progress.eta) == 10
+
+
+def test_progress_reporter(tmp_path: Path):
+    progress = Progress(stats_path=tmp_path / "stats.json", interval=0.01)
+    progress.start()
+    progress.add()
+    progress.item_done()
+    time.sleep(0.05)
+    progress.stop()
+    assert json.loads((tmp_path / "stats.json").read_text())["done"] == 1
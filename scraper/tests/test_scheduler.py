@@ -0,0 +1,94 @@
+import threading
+
+from kolibri2zim.scheduler import (
+    AIMDLimiter,
+    RetryScheduler,
+    TransientDownloadError,
+    find_transient_error,
+)
+
+
+def test_aimd_limiter_decrease_and_increase():
+    limiter = AIMDLimiter(maximum=8, decrease_interval=0)
+    assert limiter.limit == 8
+    limiter.on_throttled()
+    assert limiter.limit == 4
+    limiter.on_throttled()
+    limiter.on_throttled()
+    limiter.on_throttled()
+    assert limiter.limit == 1
+    assert limiter.nb_throttled == 4
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+
+def test_aimd_limiter_decreases_once_per_interval():
+    limiter = AIMDLimiter(maximum=8, decrease_interval=60)
+    limiter.on_throttled()
+    limiter.on_throttled()
+    assert limiter.limit == 4
+    assert limiter.nb_throttled == 2
+
+
+def test_aimd_limiter_slots():
+    limiter = AIMDLimiter(maximum=2)
+    with limiter.slot(), limiter.slot():
+        assert limiter.in_flight == 2
+        acquired = threading.Event()
+
+        def acquire():
+            with limiter.slot():
+                acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.1)
+    thread.join()
+    assert acquired.is_set()
+    assert limiter.in_flight == 0
+
+
+def test_retry_scheduler_runs_in_order():
+    scheduler = RetryScheduler()
+    calls = []
+    done = threading.Event()
+    scheduler.schedule(0.2, lambda: (calls.append("late"), done.set()))
+    scheduler.schedule(0.05, lambda: calls.append("early"))
+    assert done.wait(2)
+    assert calls == ["early", "late"]
+    scheduler.shutdown()
+
+
+def test_retry_scheduler_shutdown_drops_pending():
+    scheduler = RetryScheduler()
+    calls = []
+    scheduler.schedule(60, lambda: calls.append("never"))
+    assert len(scheduler) == 1
+    scheduler.shutdown()
+    assert len(scheduler) == 0
+    assert calls == []
+
+
+def test_find_transient_error():
+    transient = TransientDownloadError("HTTP 503", retry_after=3)
+    try:
+        try:
+            raise transient
+        except TransientDownloadError as exc:
+            raise RuntimeError("Failed to process video node abcd") from exc
+    except RuntimeError as exc:
+        assert find_transient_error(exc) is transient
+    assert find_transient_error(ValueError("nope")) is None
+
+
+def test_find_transient_error_ignores_implicit_context():
+    try:
+        try:
+            raise TransientDownloadError("HTTP 503")
+        except TransientDownloadError:
+            # a bug while handling the transient error
+            raise KeyError("cleanup")  # noqa: B904
+    except KeyError as exc:
+        assert isinstance(exc.__context__, TransientDownloadError)
+        assert find_transient_error(exc) is None
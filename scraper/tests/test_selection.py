@@ -0,0 +1,192 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+from benchmarks.synthetic import generate_channel
+
+from kolibri2zim.database import KolibriDB
+from kolibri2zim.scraper import Kolibri2Zim
+from kolibri2zim.selection import NodeSelection, split_list
+
+
+@pytest.fixture
+def db(tmp_path):
+    channel = generate_channel(
+        tmp_path, depth=3, fanout=2, kinds={"video": 1, "document": 1}, seed=3
+    )
+    # half of the leaves in french
+    conn = sqlite3.connect(channel.db_path)
+    with conn:
+        conn.execute(
+            "UPDATE content_contentnode SET lang_id = "
+            "CASE WHEN sort_order = 0 THEN 'fr' ELSE 'en' END WHERE kind != 'topic'"
+        )
+    conn.close()
+    return KolibriDB(channel.db_path)
+
+
+def select(db, selection):
+    return {node.id for node in db.get_selected_descendants(*selection.compile(db))}
+
+
+def with_ancestors(db, node_ids):
+    """node_ids and their ancestors, except root"""
+    return set(node_ids) | {
+        parent.id
+        for node_id in node_ids
+        for parent in db.get_node_parents(node_id)
+        if parent.id != db.root_id
+    }
+
+
+def test_split_list():
+    assert split_list(None) is None
+    assert split_list(" a, b,,c ") == ["a", "b", "c"]
+
+
+def test_no_selection(db):
+    assert not NodeSelection()
+    assert select(db, NodeSelection()) == {
+        node.id for node in db.get_node_descendants(db.root_id)
+    }
+
+
+def test_node_ids(db):
+    leaves = [
+        node.id for node in db.get_node_descendants(db.root_id) if node.kind != "topic"
+    ]
+    assert select(db, NodeSelection(node_ids=leaves[:3])) == set(leaves[:3])
+
+
+def test_subtree_ids(db):
+    topic = next(db.get_node_children(db.root_id))
+    subtopic = next(db.get_node_children(topic.id))
+    expected = {topic.id, subtopic.id} | {
+        node.id for node in db.get_node_descendants(subtopic.id)
+    }
+    assert select(db, NodeSelection(subtree_ids=[subtopic.id])) == expected
+
+    # combined with nodes
+    other = list(db.get_node_children(db.root_id))[1]
+    assert select(
+        db, NodeSelection(node_ids=[other.id], subtree_ids=[subtopic.id])
+    ) == (expected | {other.id})
+
+
+def test_kinds_and_languages(db):
+    nodes = list(db.get_node_descendants(db.root_id))
+    videos = {node.id for node in nodes if node.kind == "video"}
+    # only topics leading to selected nodes
+    assert select(db, NodeSelection(kinds=["video"])) == with_ancestors(db, videos)
+
+    french = {
+        node.id
+        for node in nodes
+        if node.kind != "topic"
+        and db.get_cell(
+            "SELECT lang_id FROM content_contentnode WHERE id=?", (node.id,)
+        )
+        == "fr"
+    }
+    assert french
+    assert select(db, NodeSelection(languages=["fr"])) == with_ancestors(db, french)
+    assert select(
+        db, NodeSelection(kinds=["video"], languages=["fr"])
+    ) == with_ancestors(db, videos & french)
+
+
+def test_empty_topics_not_selected(db):
+    topic = next(db.get_node_children(db.root_id))
+    subtopic = next(db.get_node_children(topic.id))
+    leaves = {node.id for node in db.get_node_descendants(subtopic.id)}
+    conn = sqlite3.connect(db.fpath)
+    with conn:
+        conn.executemany(
+            "UPDATE content_contentnode SET kind = 'audio' WHERE id=?",
+            [(leaf,) for leaf in leaves],
+        )
+    conn.close()
+
+    selected = select(db, NodeSelection(kinds=["video", "document"]))
+    assert subtopic.id not in selected
+    assert not selected & leaves
+    # subtree without selected content: nothing to reach
+    assert (
+        select(db, NodeSelection(subtree_ids=[subtopic.id], kinds=["video"])) == set()
+    )
+    # topics listed as nodes are built anyway
+    assert select(db, NodeSelection(node_ids=[subtopic.id], kinds=["video"])) == {
+        subtopic.id
+    }
+
+
+def test_unknown_kinds():
+    with pytest.raises(ValueError, match="vidoe"):
+        NodeSelection(kinds=["video", "vidoe"])
+
+
+def test_unknown_subtree(db):
+    with pytest.raises(ValueError, match="missing"):
+        NodeSelection(subtree_ids=["missing"]).compile(db)
+
+
+def test_languages_inherited_from_channel(db):
+    nodes = list(db.get_node_descendants(db.root_id))
+    untagged = next(node.id for node in nodes if node.kind != "topic")
+    conn = sqlite3.connect(db.fpath)
+    with conn:
+        conn.execute(
+            "UPDATE content_contentnode SET lang_id = NULL WHERE id=?", (untagged,)
+        )
+    conn.close()
+
+    # synthetic channel is in english
+    assert db.get_channel_language() == "en"
+    assert untagged in select(db, NodeSelection(languages=["en"]))
+    assert untagged not in select(db, NodeSelection(languages=["fr"]))
+
+
+def test_nodes_files_size_of_selection(db):
+    selection = NodeSelection(kinds=["document"])
+    sizes = db.get_nodes_files_size(*selection.compile(db))
+    documents = {
+        node.id
+        for node in db.get_node_descendants(db.root_id)
+        if node.kind == "document"
+    }
+    assert set(sizes) == documents
+    assert set(db.get_nodes_files_size()) >= documents
+
+
+def test_topic_sections_of_selection(db, scraper_generator):
+    scraper: Kolibri2Zim = scraper_generator(additional_options={"kinds": "video"})
+    scraper.db = db
+    scraper.creator_lock = threading.Lock()
+    topics = {}
+
+    class Creator:
+        def add_item_for(self, path, content, **kwargs):  # noqa: ARG002
+            topics[path] = json.loads(content)
+
+    scraper.creator = Creator()
+    for node_id, kind in scraper.iter_nodes():
+        assert kind in ("topic", "video")
+        if kind == "topic":
+            scraper.add_topic_node(node_id)
+
+    # a topic has only documents below it: it is skipped (root is always built)
+    all_topics = [
+        node for node in db.get_node_descendants(db.root_id) if node.kind == "topic"
+    ]
+    assert len(topics) == len(all_topics)
+    for topic in topics.values():
+        # topics only link to built nodes, and only to topics leading to some
+        assert topic["sections"]
+        for section in topic["sections"]:
+            assert section["kind"] in ("topic", "video")
+            if section["kind"] == "topic":
+                assert f"topics/{section['slug']}.json" in topics
+                assert section["subsections"]
+            for subsection in section["subsections"]:
+                assert subsection["kind"] in ("topic", "video")
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from kolibri2zim.storage import (
+    ContentStorage,
+    LocalStorage,
+    StudioStorage,
+    get_content_storage,
+)
+
+FILE_ID = "abcdef0123456789abcdef0123456789"
+
+
+@pytest.fixture
+def content_dir(tmp_path):
+    (tmp_path / "content" / "databases").mkdir(parents=True)
+    (tmp_path / "content" / "databases" / "channel.sqlite3").write_bytes(b"db")
+    fpath = tmp_path / "content" / "storage" / "a" / "b" / f"{FILE_ID}.mp4"
+    fpath.parent.mkdir(parents=True)
+    fpath.write_bytes(b"video")
+    return tmp_path
+
+
+def test_get_content_storage(content_dir, tmp_path):
+    assert isinstance(get_content_storage(None), StudioStorage)
+    assert isinstance(get_content_storage(str(content_dir)), LocalStorage)
+    with pytest.raises(ValueError, match="no content/databases"):
+        get_content_storage(str(tmp_path / "missing"))
+
+
+def test_studio_url_for():
+    assert (
+        StudioStorage("http://studio").url_for(FILE_ID, "mp4")
+        == f"http://studio/content/storage/a/b/{FILE_ID}.mp4"
+    )
+    assert (
+        StudioStorage("http://studio").db_url_for("channel")
+        == "http://studio/content/databases/channel.sqlite3"
+    )
+
+
+def test_local_storage(content_dir, tmp_path):
+    storage = LocalStorage(content_dir)
+    src = storage.get_local_path(FILE_ID, "mp4")
+    assert src.read_bytes() == b"video"
+    with pytest.raises(FileNotFoundError):
+        storage.get_local_path(FILE_ID, "webm")
+
+    assert storage.get_size_and_mime(FILE_ID, "mp4")[0] == len(b"video")
+
+    with storage.open(FILE_ID, "mp4") as fh:
+        assert fh.read() == b"video"
+
+    byte_stream = io.BytesIO()
+    storage.download_to(FILE_ID, "mp4", byte_stream=byte_stream)
+    assert byte_stream.getvalue() == b"video"
+
+    # scraper deletes files it downloaded: storage must be left untouched
+    fpath = tmp_path / "build" / "video.mp4"
+    fpath.parent.mkdir()
+    fpath.write_bytes(b"")
+    storage.download_to(FILE_ID, "mp4", fpath=fpath)
+    assert fpath.read_bytes() == b"video"
+    fpath.unlink()
+    assert src.read_bytes() == b"video"
+
+    storage.download_db("channel", tmp_path / "db.sqlite3")
+    assert (tmp_path / "db.sqlite3").read_bytes() == b"db"
+
+
+def test_partial_storage():
+    class PartialStorage(ContentStorage):
+        def download_db(self, channel_id, fpath):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialStorage()  # pyright: ignore[reportAbstractUsage]
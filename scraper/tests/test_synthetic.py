@@ -0,0 +1,40 @@
+import pytest
+from benchmarks.synthetic import generate_channel, parse_kinds
+
+from kolibri2zim.database import KolibriDB
+
+
+def test_generate_channel_tree(tmp_path):
+    channel = generate_channel(tmp_path, depth=2, fanout=3, with_files=False)
+    assert channel.nb_nodes == 1 + 3 + 9
+    db = KolibriDB(channel.db_path)
+    assert db.root.kind == "topic"
+    assert len(list(db.get_node_descendants(db.root_id))) == channel.nb_nodes - 1
+    assert len(list(db.get_node_children(db.root_id))) == 3
+    assert not list(channel.root.glob("content/storage/**/*.*"))
+    sizes = db.get_nodes_files_size()
+    assert sum(sizes.values()) == channel.total_bytes
+
+
+def test_generate_channel_files(tmp_path):
+    channel = generate_channel(
+        tmp_path, depth=1, fanout=2, kinds={"document": 1}, with_thumbnails=False
+    )
+    db = KolibriDB(channel.db_path)
+    for child in db.get_node_children(db.root_id):
+        file = db.get_node_file(child.id)
+        fpath = channel.storage_path(file.id, file.ext)
+        assert fpath.read_bytes().startswith(b"%PDF")
+
+
+def test_generate_channel_is_reproducible(tmp_path):
+    first = generate_channel(tmp_path / "a", depth=1, fanout=4, with_files=False)
+    second = generate_channel(tmp_path / "b", depth=1, fanout=4, with_files=False)
+    assert first.channel_id == second.channel_id
+    assert first.total_bytes == second.total_bytes
+
+
+def test_parse_kinds():
+    assert parse_kinds("video=4,html5=1") == {"video": 4, "html5": 1}
+    with pytest.raises(ValueError, match="Unsupported kind"):
+        parse_kinds("exercise=1")
@@ -0,0 +1,66 @@
+import concurrent.futures as cf
+from collections.abc import Callable
+
+from zimscraperlib.video.presets import VideoWebmHigh, VideoWebmLow
+
+from kolibri2zim.database import File
+from kolibri2zim.scraper import Kolibri2Zim
+
+
+def test_claim_video_once_per_preset(scraper_generator: Callable[..., Kolibri2Zim]):
+    scraper = scraper_generator()
+    first = scraper.claim_video("abcd", VideoWebmLow())
+    assert first is not None
+    # same video and preset, while being produced or once produced
+    assert scraper.claim_video("abcd", VideoWebmLow()) is None
+    first.set_result(None)
+    assert scraper.claim_video("abcd", VideoWebmLow()) is None
+    # other preset or other video
+    assert scraper.claim_video("abcd", VideoWebmHigh()) is not None
+    assert scraper.claim_video("efgh", VideoWebmLow()) is not None
+    assert scraper.nb_videos_deduplicated == 2
+
+
+def test_claim_video_after_failure(scraper_generator: Callable[..., Kolibri2Zim]):
+    scraper = scraper_generator()
+    first = scraper.claim_video("abcd", VideoWebmLow())
+    assert first is not None
+    first.set_exception(OSError("download failed"))
+    second = scraper.claim_video("abcd", VideoWebmLow())
+    assert second is not None
+    assert scraper.videos_registry[("abcd", "VideoWebmLow")] is second
+
+
+def test_reencoded_video_progress(scraper_generator: Callable[..., Kolibri2Zim]):
+    scraper = scraper_generator()
+    scraper.db.get_local_file_size = lambda local_file_id: 100  # noqa: ARG005
+    scraper.nodes_sizes = {"node": 150}
+    scraper.nodes_futures = set()
+    scraper.nodes_executor = cf.ThreadPoolExecutor(max_workers=1)
+    jobs = []
+    scraper.convert_and_add_video_aside = (
+        lambda video_file, path, preset, future: jobs.append(future)  # noqa: ARG005
+    )
+    video_file = File(
+        fid="fid",
+        id="abcd",
+        ext="mp4",
+        prio=1,
+        supp=0,
+        checksum="abcd",
+        lang=None,
+        preset="high_res_video",
+    )
+    scraper.add_node = lambda item: scraper.add_reencoded_video(
+        video_file, "abcd.webm", VideoWebmLow(), item[0]
+    )
+
+    scraper.schedule_node(("node", "video")).result()
+    scraper.nodes_executor.shutdown()
+    # node is done but not its video, still being re-encoded
+    assert (scraper.progress.done, scraper.progress.total) == (1, 2)
+    assert scraper.progress.done_bytes == 50
+    assert scraper.progress.total_bytes == 150
+    jobs[0].set_result(None)
+    assert scraper.progress.done == 2
+    assert scraper.progress.done_bytes == 150